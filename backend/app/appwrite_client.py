@@ -1,12 +1,44 @@
 from appwrite.client import Client
 from appwrite.services.databases import Databases
 from appwrite.services.account import Account
+import appwrite.client
 import os
+from http.cookiejar import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from appwrite.services.storage import Storage
 
 load_dotenv()
 
+# Connections kept open to Appwrite, and threads that call it (see app/repository.py)
+APPWRITE_POOL_SIZE = int(os.getenv("APPWRITE_POOL_SIZE", "16"))
+
+
+class PooledRequests:
+    """
+    Stands in for the requests module inside the Appwrite SDK, which sends every
+    call through requests.request and so opens (and TLS-handshakes) a new
+    connection each time. Calls go through one Session instead, reusing kept-alive
+    connections from a pool of pool_size.
+    """
+
+    def __init__(self, pool_size: int):
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))  # Shared by all calls: keep no cookies
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+appwrite.client.requests = PooledRequests(APPWRITE_POOL_SIZE)
+
 client = Client()
 client.set_endpoint(os.getenv("APPWRITE_ENDPOINT"))
 client.set_project(os.getenv("APPWRITE_PROJECT_ID"))
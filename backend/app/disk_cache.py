@@ -0,0 +1,63 @@
+# Size-capped directories of cache files, evicted least recently used first.
+# A file's mtime is its last use: readers touch it and writers replace it.
+
+import os
+import tempfile
+import threading
+
+_lock = threading.Lock()
+
+
+def touch(path: str) -> bool:
+    """
+    Mark a cached file as recently used; False if it isn't cached.
+    """
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def write(directory: str, name: str, data: bytes) -> str:
+    """
+    Atomically write a file into the cache directory and return its path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, path)
+    return path
+
+
+def evict(directory: str, suffix: str, max_bytes: int, keep: str | None = None) -> int:
+    """
+    Remove the least recently used files ending in suffix until the rest fit in
+    max_bytes, never the file at keep. Returns the number of files removed.
+    """
+    with _lock:
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(suffix):
+                try:
+                    st = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            path = os.path.join(directory, name)
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        return evicted
@@ -0,0 +1,264 @@
+# Background ingest pipeline: chunk, embed and index transcripts after they are saved
+#
+# Every session has its own vector store, and every user has one more holding the
+# chunks of all their sessions for cross-session questions. Both are addressed by a
+# scope key: the session id itself, or "user:<user_id>". Embedding records of user
+# stores use the scope key as their session_id.
+
+import os
+import queue
+import threading
+from uuid import uuid4
+
+from appwrite.input_file import InputFile
+from appwrite.query import Query
+
+from app.appwrite_client import databases, storage
+from app.listing import list_all
+from app.metrics import span
+from app.segments import load_segments
+from app.rag.vector_store import TranscriptVectorStore
+from app.rag.indexer import sync_vector_store, transcript_version, transcripts_fingerprint
+from app.rag.store_cache import session_stores
+from app.rag.persistence import (
+    StaleIndexError,
+    get_cached,
+    open_store,
+    put_cached,
+    serialize_store,
+)
+
+# Per-transcript indexing states
+QUEUED = "queued"
+INDEXING = "indexing"
+INDEXED = "indexed"
+FAILED = "failed"
+
+_jobs: "queue.Queue[str]" = queue.Queue()
+_pending: dict[str, threading.Event] = {}  # scope -> set once its queued job finishes
+_status: dict[str, str] = {}  # transcript_id -> indexing state of its session store
+_owner: dict[str, str] = {}  # transcript_id -> session_id
+_lock = threading.Lock()
+_worker: threading.Thread | None = None
+
+
+USER_SCOPE_PREFIX = "user:"
+
+
+def user_scope(user_id: str) -> str:
+    return f"{USER_SCOPE_PREFIX}{user_id}"
+
+
+def is_user_scope(scope: str) -> bool:
+    return scope.startswith(USER_SCOPE_PREFIX)
+
+
+def scope_filter(scope: str) -> tuple[str, str]:
+    """
+    Transcript attribute and value selecting the transcripts of a scope.
+    """
+    if is_user_scope(scope):
+        return "user_id", scope[len(USER_SCOPE_PREFIX):]
+    return "session_id", scope
+
+
+def get_session_transcripts(session_id: str) -> list[dict]:
+    return list_all(os.getenv("APPWRITE_COLLECTION_ID"), "session_id", session_id)
+
+
+def get_scope_transcripts(scope: str) -> list[dict]:
+    """
+    Transcripts of a session, or of every session of a user for a user scope.
+    """
+    return list_all(os.getenv("APPWRITE_COLLECTION_ID"), *scope_filter(scope))
+
+
+def get_scope_fingerprint(scope: str) -> str:
+    """
+    transcripts_fingerprint of a scope, from the transcript count and the most
+    recently updated transcript instead of listing them all.
+    """
+    field, value = scope_filter(scope)
+    response = databases.list_documents(
+        database_id=os.getenv("APPWRITE_DATABASE_ID"),
+        collection_id=os.getenv("APPWRITE_COLLECTION_ID"),
+        queries=[
+            Query.equal(field, value),
+            Query.order_desc("$updatedAt"),
+            Query.limit(1),
+            Query.select(["$id", "$updatedAt"]),
+        ]
+    )
+    latest = transcript_version(response["documents"][0]) if response["documents"] else ""
+    return f"{response['total']}:{latest}"
+
+
+def get_embedding_record(scope: str) -> dict | None:
+    response = databases.list_documents(
+        database_id=os.getenv("APPWRITE_DATABASE_ID"),
+        collection_id=os.getenv("APPWRITE_EMBEDDING_COLLECTION_ID"),
+        queries=[Query.equal("session_id", scope)]
+    )
+    return response["documents"][0] if response["documents"] else None
+
+
+def load_vector_store(record: dict | None) -> TranscriptVectorStore | None:
+    """
+    Open the vector store referenced by an embedding record,
+    downloading it only if it is not in the local cache yet.
+    Returns None if there is no store or it is stale and has to be rebuilt.
+    """
+    if not record:
+        return None
+
+    file_id = record["vector_file_id"]
+    path = get_cached(file_id)
+    if path is None:
+        with span("download_store"):
+            vector_file = storage.get_file_download(
+                bucket_id=os.getenv("APPWRITE_BUCKET_ID"),
+                file_id=file_id
+            )
+            path = put_cached(file_id, vector_file)
+
+    try:
+        with span("open_store"):
+            return open_store(path)
+    except StaleIndexError as e:
+        print(f"[Ingest] Ignoring stored index {file_id}: {e}")
+        return None
+
+
+def save_vector_store(scope: str, record: dict | None, vector_store: TranscriptVectorStore):
+    """
+    Upload the vector store and point the scope's embedding record at it.
+    """
+    file_id = str(uuid4())
+    store_bytes = serialize_store(vector_store)
+    storage.create_file(
+        bucket_id=os.getenv("APPWRITE_BUCKET_ID"),
+        file_id=file_id,
+        file=InputFile.from_bytes(store_bytes, filename="vector_store.ssvs")
+    )
+    put_cached(file_id, store_bytes)
+
+    data = {
+        "vector_file_id": file_id,
+        "number_of_transcripts": len(vector_store.doc_versions)
+    }
+    if record:
+        databases.update_document(
+            database_id=os.getenv("APPWRITE_DATABASE_ID"),
+            collection_id=os.getenv("APPWRITE_EMBEDDING_COLLECTION_ID"),
+            document_id=record["$id"],
+            data=data
+        )
+    else:
+        databases.create_document(
+            database_id=os.getenv("APPWRITE_DATABASE_ID"),
+            collection_id=os.getenv("APPWRITE_EMBEDDING_COLLECTION_ID"),
+            document_id=str(uuid4()),
+            data={"session_id": scope, **data}
+        )
+
+
+def transcript_segments(doc: dict) -> list[dict] | None:
+    try:
+        columns = load_segments(doc["$id"])
+    except Exception as e:
+        print(f"[Ingest] Could not load segments of {doc['$id']}: {e}")
+        return None
+    return columns.to_list() if columns is not None else None
+
+
+def index_scope(scope: str):
+    """
+    Bring the stored vector store of a session or user up to date with its transcripts.
+    """
+    transcripts = get_scope_transcripts(scope)
+    record = get_embedding_record(scope)
+    vector_store = load_vector_store(record) or TranscriptVectorStore(dim=384)
+    track = not is_user_scope(scope)  # Transcript states follow their session store
+
+    if track:
+        with _lock:
+            for doc in transcripts:
+                _owner[doc["$id"]] = scope
+                if not vector_store.has_document(doc["$id"], transcript_version(doc)):
+                    _status[doc["$id"]] = INDEXING
+
+    if sync_vector_store(vector_store, transcripts, transcript_segments):
+        save_vector_store(scope, record, vector_store)
+        session_stores.put(scope, transcripts_fingerprint(transcripts), vector_store)
+
+    if track:
+        with _lock:
+            for doc in transcripts:
+                indexed = vector_store.has_document(doc["$id"], transcript_version(doc))
+                _status[doc["$id"]] = INDEXED if indexed else FAILED
+
+
+def _run():
+    while True:
+        scope = _jobs.get()
+        with _lock:
+            done = _pending.pop(scope, None)
+        try:
+            index_scope(scope)
+        except Exception as e:
+            print(f"[Ingest] Failed to index {scope}: {e}")
+            with _lock:
+                for transcript_id, state in _status.items():
+                    if _owner.get(transcript_id) == scope and state in (QUEUED, INDEXING):
+                        _status[transcript_id] = FAILED
+        finally:
+            if done:
+                done.set()
+            _jobs.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="ingest-worker", daemon=True)
+            _worker.start()
+
+
+def enqueue_scope(scope: str, transcript_ids: list[str] = ()) -> threading.Event:
+    """
+    Schedule a session (or user scope) for indexing. Jobs for a scope that is
+    already waiting in the queue are merged into the pending one.
+    Returns an event that is set once the job has run.
+    """
+    _ensure_worker()
+    with _lock:
+        if not is_user_scope(scope):
+            for transcript_id in transcript_ids:
+                _owner[transcript_id] = scope
+                _status[transcript_id] = QUEUED
+        done = _pending.get(scope)
+        if done is None:
+            done = _pending[scope] = threading.Event()
+            _jobs.put(scope)
+    return done
+
+
+def enqueue_session(session_id: str, transcript_ids: list[str] = (), user_id: str | None = None) -> threading.Event:
+    """
+    Schedule a session for indexing, and its user's cross-session store if user_id is given.
+    Returns the session job's event.
+    """
+    done = enqueue_scope(session_id, transcript_ids)
+    if user_id:
+        enqueue_scope(user_scope(user_id))
+    return done
+
+
+def get_status(transcript_id: str) -> str | None:
+    with _lock:
+        return _status.get(transcript_id)
+
+
+def queue_depth() -> int:
+    return _jobs.qsize()
@@ -0,0 +1,183 @@
+# Paginated, projected listings of Appwrite collections, with a short-lived
+# in-process cache and ETags so unchanged pages are answered with 304.
+#
+# Each cached page is tagged with the filter it was listed by (e.g. the user of a
+# sessions page); writes invalidate that tag. Other API workers cannot invalidate
+# this process' cache, so pages also expire after LIST_CACHE_TTL seconds.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from appwrite.query import Query
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from app.appwrite_client import databases
+
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "5"))
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 500
+
+
+class ListingCache:
+    """
+    LRU of listing pages with their ETags, bounded by the size of the pages'
+    JSON and expiring after ttl seconds.
+    """
+
+    def __init__(self, max_bytes: int = LIST_CACHE_MAX_BYTES, ttl: float = LIST_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (tag, etag, page, size, added)
+        self._entries: "OrderedDict[tuple, tuple[str, str, dict, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> tuple[str, dict] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[4] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: tuple, tag: str, etag: str, page: dict, size: int):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (tag, etag, page, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tag: str):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0] == tag]:
+                self._drop(key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: tuple):
+        self._bytes -= self._entries.pop(key)[3]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+listing_cache = ListingCache()
+
+
+def _tag(collection_id: str, field: str, value: str) -> str:
+    return f"{collection_id}:{field}={value}"
+
+
+def invalidate_listing(collection_id: str, field: str, value: str | None):
+    """
+    Drop cached pages of a collection listed by field == value, after a write to it.
+    """
+    if value:
+        listing_cache.invalidate(_tag(collection_id, field, value))
+
+
+def parse_fields(fields: str | None, default: list[str] | None = None) -> list[str] | None:
+    """
+    Attributes to select from a comma-separated ?fields= value; "*" selects all (None).
+    """
+    if fields is None:
+        return default
+    if fields.strip() == "*":
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return ["$id"] + [name for name in names if name != "$id"]
+
+
+def _fetch_page(collection_id: str, field: str, value: str, limit: int, cursor: str | None, select: list[str] | None) -> dict:
+    queries = [Query.equal(field, value), Query.limit(limit)]
+    if cursor:
+        queries.append(Query.cursor_after(cursor))
+    if select:
+        queries.append(Query.select(select))
+    response = databases.list_documents(
+        database_id=os.getenv("APPWRITE_DATABASE_ID"),
+        collection_id=collection_id,
+        queries=queries
+    )
+
+    documents = response["documents"]
+    return {
+        "documents": documents,
+        "total": response["total"],
+        "next_cursor": documents[-1]["$id"] if len(documents) == limit else None,
+    }
+
+
+def list_page(collection_id: str, field: str, value: str, limit: int = LIST_DEFAULT_LIMIT,
+              cursor: str | None = None, select: list[str] | None = None) -> tuple[str, dict]:
+    """
+    One page of documents where field == value, as (etag, page). The page holds
+    the documents, the total count and next_cursor, the id to pass as cursor for
+    the following page (None on the last page).
+    """
+    key = (collection_id, field, value, limit, cursor, tuple(select) if select else None)
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return cached
+
+    page = _fetch_page(collection_id, field, value, limit, cursor, select)
+    encoded = json.dumps(page, sort_keys=True, default=str).encode("utf-8")
+    etag = f'W/"{hashlib.sha1(encoded).hexdigest()}"'
+    listing_cache.put(key, _tag(collection_id, field, value), etag, page, len(encoded))
+    return etag, page
+
+
+def list_all(collection_id: str, field: str, value: str, select: list[str] | None = None) -> list[dict]:
+    """
+    Every document where field == value, page by page (a single list call stops
+    at Appwrite's page limit). Not cached: callers need the current documents.
+    """
+    documents, cursor = [], None
+    while True:
+        page = _fetch_page(collection_id, field, value, LIST_MAX_LIMIT, cursor, select)
+        documents.extend(page["documents"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return documents
+
+
+def listing_response(request: Request, etag: str, body: dict) -> Response:
+    """
+    304 if the client already holds this version of the page, otherwise the page with its ETag.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
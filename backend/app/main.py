@@ -1,27 +1,86 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.appwrite_client import databases, storage
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from app.appwrite_client import databases
 import os
 from uuid import uuid4
 from datetime import datetime
 import json
 from fastapi import Query as FastAPIQuery
-from appwrite.query import Query
 from fastapi import File, Form, UploadFile
-from app.summarizer import transcribe_file, transcribe_youtube
+from app import repository, transcript_cache
+from app.segments import load_segments, save_segments
+from app.listing import (
+    LIST_DEFAULT_LIMIT,
+    LIST_MAX_LIMIT,
+    invalidate_listing,
+    list_page,
+    listing_cache,
+    listing_response,
+    parse_fields,
+)
+from app.models import APP_ROLE, MODEL_WARMUP, models
+from app.metrics import MetricsMiddleware, components, observe, span
+from app.profiler import profiler
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.transcription_jobs import (
+    QueueFullError,
+    get_job,
+    pool_stats,
+    spool_upload,
+    start_job,
+    transcribe_segments,
+    transcribe_stream,
+    shutdown as shutdown_transcription_workers,
+    warm_up as warm_up_transcription_workers,
+)
 # Importing RAG components
-from app.rag.chunker import chunk_transcript
-from app.rag.embedder import get_embeddings
-from app.rag.vector_store import TranscriptVectorStore
-from app.rag.responder import answer_question
-from appwrite.input_file import InputFile
-import base64, pickle
-from io import BytesIO
+from app.rag.indexer import transcript_version, transcripts_fingerprint
+from app.rag.store_cache import session_stores
+from app.rag.answer_cache import answer_cache
+from app.ingest import (
+    queue_depth as ingest_queue_depth,
+    QUEUED,
+    INDEXING,
+    INDEXED,
+    enqueue_scope,
+    enqueue_session,
+    get_embedding_record,
+    get_scope_fingerprint,
+    get_scope_transcripts,
+    get_session_transcripts,
+    get_status,
+    load_vector_store,
+    user_scope,
+)
+from app.rag.responder import GenerationQueueFullError, answer_question_async, generator_backend, prepare_answer, stream_prepared
+from app.stats import LatencyWindow
+from app.rag.embedder import embedding_service, get_embedding_cache
 from pydantic import BaseModel
+import asyncio
+import threading
+import time
 
 
 app = FastAPI()
 
+# Token required by the /debug/profiler endpoints; without one they are disabled
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+
+# Seconds /talk waits for a session's first index to be built
+INDEX_WAIT_TIMEOUT = float(os.getenv("INDEX_WAIT_TIMEOUT", "300"))
+
+# Models (or "whisper" for the transcription workers) loaded at startup, in the background
+WARMUP = {
+    "all": MODEL_WARMUP,
+    "api": [],
+    "inference": list(models.status()) + ["whisper"],
+}[APP_ROLE]
+warmup_pending = set(WARMUP)
+
+ttft_latency = LatencyWindow()  # Request start to first streamed answer token
+stream_latency = LatencyWindow()  # Request start to last streamed answer token
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,12 +88,106 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 def root():
     return {"message": "SmartScribe backend is up!"}
 
+async def read_transcript_input(request: Request, file, title, user_id, session_id) -> dict:
+    """
+    Collect transcript fields from a multipart upload or a JSON body.
+    Media that still needs transcribing is returned as a (kind, source, digest) tuple.
+    """
+    original_text = None
+    media = None
+
+    # File Upload
+    if file:
+        if not title:
+            title = file.filename
+        if user_id:
+            path, digest = await spool_upload(file)
+            media = ("file", path, digest)
+
+    # JSON Fallback (for YouTube and raw JSON)
+    else:
+        body = await request.json()
+        title = title or body.get("title")
+        user_id = user_id or body.get("user_id")
+        session_id = session_id or body.get("session_id")
+        youtube_url = body.get("youtube_url")
+        original_text = body.get("original_text")
+
+        if youtube_url:
+            if not title:
+                title = youtube_url
+            media = ("youtube", youtube_url, None)
+
+    return {
+        "title": title,
+        "user_id": user_id,
+        "session_id": session_id,
+        "original_text": original_text,
+        "media": media,
+    }
+
+
+def save_transcript(title: str, original_text: str, user_id: str, session_id: str | None, segments: list[dict] | None = None) -> dict:
+    """
+    Store a transcript document (and its Whisper segments, if any) and queue its session for indexing.
+    """
+    data = {
+        "title": title,
+        "original_text": original_text,
+        "user_id": user_id,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    if session_id:
+        data["session_id"] = session_id
+
+    # Segments go first so the indexer finds them as soon as the transcript exists
+    transcript_id = str(uuid4())
+    if segments:
+        try:
+            save_segments(transcript_id, segments)
+        except Exception as e:
+            print(f"[Segments] Could not store segments of {transcript_id}: {e}")
+
+    response = databases.create_document(
+        database_id=os.getenv("APPWRITE_DATABASE_ID"),
+        collection_id=os.getenv("APPWRITE_COLLECTION_ID"),
+        document_id=transcript_id,
+        data=data
+    )
+    invalidate_listing(os.getenv("APPWRITE_COLLECTION_ID"), "user_id", user_id)
+    invalidate_listing(os.getenv("APPWRITE_COLLECTION_ID"), "session_id", session_id)
+
+    # Chunk, embed and index in the background. API-only workers leave it to the
+    # inference workers: the new transcript changes the scope's fingerprint, so
+    # their cached stores are dropped and the transcript is indexed on the next /talk
+    session_stores.invalidate(user_scope(user_id))
+    if session_id:
+        session_stores.invalidate(session_id)
+    if APP_ROLE == "api":
+        return response
+    if session_id:
+        enqueue_session(session_id, [response["$id"]], user_id=user_id)
+    else:
+        enqueue_scope(user_scope(user_id))
+    return response
+
+
+def require_models():
+    """
+    Dependency of endpoints that run a model; API-only workers refuse them.
+    """
+    if APP_ROLE == "api":
+        raise HTTPException(status_code=503, detail="This worker does not serve model endpoints (APP_ROLE=api)")
+
+
 @app.post("/transcripts")
 async def create_transcript(
     request: Request,
@@ -44,62 +197,182 @@ async def create_transcript(
     session_id: str = Form(None),
 ):
     try:
-        # File Upload
-        if file:
-            file_bytes = await file.read()
-            if not title:
-                title = file.filename
-            original_text = transcribe_file(file_bytes, file.filename)
-
-        # JSON Fallback (for YouTube and raw JSON)
-        else:
-            body = await request.json()
-            title = title or body.get("title")
-            user_id = user_id or body.get("user_id")
-            session_id = session_id or body.get("session_id")
-            youtube_url = body.get("youtube_url")
-            original_text = body.get("original_text")
-
-            if youtube_url:
-                if not title:
-                    title = youtube_url
-                original_text = transcribe_youtube(youtube_url)
+        with span("read_upload"):
+            fields = await read_transcript_input(request, file, title, user_id, session_id)
+        original_text = fields["original_text"]
+        segments = None
+        if fields["media"] and APP_ROLE == "api":
+            kind, source, _ = fields["media"]
+            if kind == "file":
+                os.remove(source)
+            require_models()
+        if fields["media"]:
+            with span("transcribe"):
+                segments = await transcribe_segments(*fields["media"])
+            original_text = "".join(seg["text"] for seg in segments)
 
         # Final validation
-        if not (title and original_text and user_id):
+        if not (fields["title"] and original_text and fields["user_id"]):
             raise HTTPException(status_code=400, detail="Missing required fields")
 
-        data = {
-            "title": title,
-            "original_text": original_text,
-            "user_id": user_id,
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        if session_id:
-            data["session_id"] = session_id
-
-        response = databases.create_document(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_COLLECTION_ID"),
-            document_id=str(uuid4()),
-            data=data
-        )
-
+        with span("store"):
+            response = await repository.run(save_transcript, fields["title"], original_text, fields["user_id"], fields["session_id"], segments)
         return {"message": "Transcript saved", "id": response["$id"]}
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except HTTPException:
+        raise
     except Exception as e:
         print("Transcript Error:", e)
         return {"error": str(e)}
 
 
+@app.post("/transcription-jobs", status_code=202, dependencies=[Depends(require_models)])
+async def create_transcription_job(
+    request: Request,
+    file: UploadFile = File(None),
+    title: str = Form(None),
+    user_id: str = Form(None),
+    session_id: str = Form(None),
+):
+    fields = await read_transcript_input(request, file, title, user_id, session_id)
+    if not (fields["title"] and fields["user_id"] and fields["media"]):
+        raise HTTPException(status_code=400, detail="Missing required fields")
+
+    def on_done(segments: list[dict]) -> dict:
+        original_text = "".join(seg["text"] for seg in segments)
+        response = save_transcript(fields["title"], original_text, fields["user_id"], fields["session_id"], segments)
+        return {"transcript_id": response["$id"]}
+
+    try:
+        kind, source, digest = fields["media"]
+        job_id = await start_job(kind, source, on_done, digest)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return {"job_id": job_id, "status": "queued"}
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/transcripts/stream", dependencies=[Depends(require_models)])
+async def create_transcript_stream(
+    file: UploadFile = File(...),
+    title: str = Form(None),
+    user_id: str = Form(...),
+    session_id: str = Form(None),
+):
+    """
+    Transcribe an upload window by window, pushing each segment to the client
+    as Server-Sent Events, then store the transcript like POST /transcripts.
+    """
+    title = title or file.filename
+    path, digest = await spool_upload(file)
+
+    async def events():
+        segments = []
+        try:
+            async for segment in transcribe_stream(path, digest):
+                segments.append(segment)
+                yield sse_event("segment", segment)
+
+            original_text = "".join(seg["text"] for seg in segments)
+            if not original_text:
+                yield sse_event("error", {"error": "No speech found"})
+                return
+            response = await repository.run(save_transcript, title, original_text, user_id, session_id, segments)
+            yield sse_event("done", {"message": "Transcript saved", "id": response["$id"]})
+        except QueueFullError as e:
+            yield sse_event("error", {"error": str(e), "retry_after": 30})
+        except Exception as e:
+            print("Transcript Stream Error:", e)
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/transcription-jobs/{job_id}")
+def get_transcription_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def run_warm_up():
+    for name in WARMUP:
+        try:
+            if name == "whisper":
+                warm_up_transcription_workers()
+            else:
+                models.warm_up([name])
+        except Exception as e:
+            print(f"[Models] Warm-up of {name} failed: {e}")
+        warmup_pending.discard(name)
+
+
+@app.on_event("startup")
+def start_warm_up():
+    if WARMUP:
+        threading.Thread(target=run_warm_up, name="model-warm-up", daemon=True).start()
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "role": APP_ROLE}
+
+
+@app.get("/ready")
+def ready():
+    """
+    Ready once startup warm-up has finished; reports which models are loaded.
+    """
+    body = {
+        "ready": not warmup_pending,
+        "role": APP_ROLE,
+        "warming_up": sorted(warmup_pending),
+        "models": models.status(),
+        "transcription_workers": pool_stats(),
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.on_event("shutdown")
+def shutdown_transcription_pool():
+    shutdown_transcription_workers()
+
+
+@app.on_event("shutdown")
+def close_generator_backend():
+    generator_backend.close()
+
+
+@app.on_event("shutdown")
+def flush_appwrite_writes():
+    repository.shutdown()
+
+
+# List views leave out transcript bodies unless asked for with ?fields=*
+TRANSCRIPT_LIST_FIELDS = ["$id", "$createdAt", "$updatedAt", "title", "session_id", "user_id", "created_at"]
+
+
 @app.get("/transcripts")
-def get_transcripts(user_id: str = FastAPIQuery(...)):
+def get_transcripts(
+    request: Request,
+    user_id: str = FastAPIQuery(...),
+    limit: int = FastAPIQuery(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: str | None = None,
+    fields: str | None = None,
+):
     try:
-        response = databases.list_documents(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_COLLECTION_ID"),
-            queries=[Query.equal("user_id", user_id)]
-        )
-        return {"transcripts": response["documents"]}
+        select = parse_fields(fields, TRANSCRIPT_LIST_FIELDS)
+        etag, page = list_page(os.getenv("APPWRITE_COLLECTION_ID"), "user_id", user_id, limit, cursor, select)
+        return listing_response(request, etag, {
+            "transcripts": page["documents"],
+            "total": page["total"],
+            "next_cursor": page["next_cursor"],
+        })
     except Exception as e:
         print("Appwrite Fetch Error:", e)
         return {"error": str(e)}
@@ -114,7 +387,8 @@ async def create_session(request: Request):
         raise HTTPException(status_code=400, detail="Missing fields")
 
     try:
-        response = databases.create_document(
+        response = await repository.run(
+            databases.create_document,
             database_id=os.getenv("APPWRITE_DATABASE_ID"),
             collection_id=os.getenv("APPWRITE_SESSION_COLLECTION_ID"),
             document_id=str(uuid4()),
@@ -124,6 +398,7 @@ async def create_session(request: Request):
                 "created_at": datetime.utcnow().isoformat()
             }
         )
+        invalidate_listing(os.getenv("APPWRITE_SESSION_COLLECTION_ID"), "user_id", user_id)
         return {"message": "Session created", "session": response}
     except Exception as e:
         import traceback
@@ -131,14 +406,20 @@ async def create_session(request: Request):
         return {"error": str(e)}
 
 @app.get("/sessions")
-def get_sessions(user_id: str = Query(...)):
+def get_sessions(
+    request: Request,
+    user_id: str = FastAPIQuery(...),
+    limit: int = FastAPIQuery(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: str | None = None,
+    fields: str | None = None,
+):
     try:
-        response = databases.list_documents(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_SESSION_COLLECTION_ID"),
-            queries=[Query.equal("user_id", user_id)]
-        )
-        return {"sessions": response["documents"]}
+        etag, page = list_page(os.getenv("APPWRITE_SESSION_COLLECTION_ID"), "user_id", user_id, limit, cursor, parse_fields(fields))
+        return listing_response(request, etag, {
+            "sessions": page["documents"],
+            "total": page["total"],
+            "next_cursor": page["next_cursor"],
+        })
     except Exception as e:
         return {"error": str(e)}
 
@@ -164,12 +445,14 @@ async def update_session(session_id: str, request: Request):
         raise HTTPException(status_code=400, detail="Missing title")
 
     try:
-        updated = databases.update_document(
+        updated = await repository.run(
+            databases.update_document,
             database_id=os.getenv("APPWRITE_DATABASE_ID"),
             collection_id=os.getenv("APPWRITE_SESSION_COLLECTION_ID"),
             document_id=session_id,
             data={"title": new_title}
         )
+        invalidate_listing(os.getenv("APPWRITE_SESSION_COLLECTION_ID"), "user_id", updated.get("user_id"))
         return {"message": "Session updated", "session": updated}
     except Exception as e:
         import traceback
@@ -188,7 +471,8 @@ async def create_message(request: Request):
         raise HTTPException(status_code=400, detail="Missing fields")
 
     try:
-        response = databases.create_document(
+        response = await repository.run(
+            databases.create_document,
             database_id=os.getenv("APPWRITE_DATABASE_ID"),
             collection_id=os.getenv("APPWRITE_MESSAGES_COLLECTION_ID"),
             document_id=str(uuid4()),
@@ -199,123 +483,252 @@ async def create_message(request: Request):
                 "timestamp": datetime.utcnow().isoformat()
             }
         )
+        invalidate_listing(os.getenv("APPWRITE_MESSAGES_COLLECTION_ID"), "session_id", session_id)
         return {"message": "Message stored", "message_doc": response}
     except Exception as e:
         print("Error creating message:", e)
         return {"error": str(e)}
 
 @app.get("/messages")
-def get_messages(session_id: str = Query(...)):
+def get_messages(
+    request: Request,
+    session_id: str = FastAPIQuery(...),
+    limit: int = FastAPIQuery(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: str | None = None,
+    fields: str | None = None,
+):
     try:
-        res = databases.list_documents(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_MESSAGES_COLLECTION_ID"),
-            queries=[Query.equal("session_id", session_id)],
-        )
-        return {"messages": res["documents"]}
+        etag, page = list_page(os.getenv("APPWRITE_MESSAGES_COLLECTION_ID"), "session_id", session_id, limit, cursor, parse_fields(fields))
+        return listing_response(request, etag, {
+            "messages": page["documents"],
+            "total": page["total"],
+            "next_cursor": page["next_cursor"],
+        })
     except Exception as e:
         return {"error": str(e)}    
            
 
 @app.get("/transcripts/by-session")
-def get_transcripts_by_session(session_id: str = Query(...)):
+def get_transcripts_by_session(
+    request: Request,
+    session_id: str = FastAPIQuery(...),
+    limit: int = FastAPIQuery(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: str | None = None,
+    fields: str | None = None,
+):
+    # The session view shows transcript bodies, so they are included unless ?fields= says otherwise
     try:
-        response = databases.list_documents(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_COLLECTION_ID"),
-            queries=[Query.equal("session_id", session_id)]
-        )
-        return {"transcripts": response["documents"]}
+        etag, page = list_page(os.getenv("APPWRITE_COLLECTION_ID"), "session_id", session_id, limit, cursor, parse_fields(fields))
+        return listing_response(request, etag, {
+            "transcripts": page["documents"],
+            "total": page["total"],
+            "next_cursor": page["next_cursor"],
+        })
     except Exception as e:
         print("Transcript Fetch Error:", e)
         return {"error": str(e)}
 
-# Pydantic based style
-class TalkRequest(BaseModel):
-    session_id: str
-    prompt: str
-
-# RAG endpoint to answer questions based on session transcripts
-@app.post("/talk")
-async def talk(data: TalkRequest):
+@app.get("/transcripts/{transcript_id}/segments")
+def get_transcript_segments(transcript_id: str, start: float | None = None, end: float | None = None):
+    """
+    Timestamped segments of a transcribed recording, optionally only those
+    overlapping [start, end] seconds (e.g. the time range of a /talk source).
+    """
     try:
-        session_id = data.session_id
-
-        # 1. Fetch all transcripts for this session
-        transcript_response = databases.list_documents(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_COLLECTION_ID"),
-            queries=[Query.equal("session_id", session_id)]
-        )
-        transcripts = transcript_response["documents"]
-
-        if not transcripts:
-            raise HTTPException(status_code=404, detail="No transcripts found for this session.")
-
-        num_transcripts = len(transcripts)
+        columns = load_segments(transcript_id)
+        if columns is None:
+            raise HTTPException(status_code=404, detail="No segments stored for this transcript")
+        return {"transcript_id": transcript_id, "segments": columns.between(start, end)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("Segments Fetch Error:", e)
+        return {"error": str(e)}
 
-        # 2. Check if vector store is cached
-        embedding_response = databases.list_documents(
-            database_id=os.getenv("APPWRITE_DATABASE_ID"),
-            collection_id=os.getenv("APPWRITE_EMBEDDING_COLLECTION_ID"),
-            queries=[Query.equal("session_id", session_id)]
-        )
+@app.get("/sessions/{session_id}/index-status")
+def get_index_status(session_id: str):
+    try:
+        transcripts = repository.submit(get_session_transcripts, session_id)
+        vector_store = load_vector_store(get_embedding_record(session_id))
+        transcripts = transcripts.result()
+
+        statuses = []
+        for doc in transcripts:
+            if vector_store is not None and vector_store.has_document(doc["$id"], transcript_version(doc)):
+                state = INDEXED
+            else:
+                state = get_status(doc["$id"]) or "not_indexed"
+            statuses.append({"transcript_id": doc["$id"], "title": doc.get("title"), "status": state})
+        return {"session_id": session_id, "transcripts": statuses}
+    except Exception as e:
+        print("Index Status Error:", e)
+        return {"error": str(e)}
 
-        cached = embedding_response["documents"][0] if embedding_response["documents"] else None
+@app.get("/cache-stats")
+def get_cache_stats():
+    return {
+        "vector_stores": session_stores.stats(),
+        "embedding_service": embedding_service.stats(),
+        "answers": answer_cache.stats(),
+        "listings": listing_cache.stats(),
+        "appwrite": repository.stats(),
+        "generator": generator_backend.stats(),
+        "embeddings": get_embedding_cache().stats(),
+        "transcripts": transcript_cache.stats(),
+    }
+
+
+def generator_queue_depth() -> int:
+    stats = generator_backend.stats()
+    return stats.get("queue_depth", stats.get("in_flight", 0))  # In-process batch queue, or requests out to the LLM server
+
+
+components.queues.update({
+    "embedding": lambda: embedding_service.stats()["queue_depth"],
+    "generation": generator_queue_depth,
+    "ingest": ingest_queue_depth,
+    "transcription": lambda: max(0, pool_stats()["active"] - pool_stats()["workers"]),
+    "appwrite_writes": lambda: repository.stats()["pending_writes"],
+})
+components.caches.update({
+    "vector_stores": session_stores.stats,
+    "answers": answer_cache.stats,
+    "listings": listing_cache.stats,
+    "embeddings": lambda: get_embedding_cache().stats(),
+    "transcripts": transcript_cache.stats,
+})
+
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def require_profiler_token(request: Request):
+    """
+    Dependency of the profiler endpoints: they need PROFILER_TOKEN set and sent as X-Profiler-Token.
+    """
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if request.headers.get("x-profiler-token") != PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+
+@app.post("/debug/profiler/start", dependencies=[Depends(require_profiler_token)])
+def start_profiler(interval_ms: float = FastAPIQuery(5, gt=0)):
+    if not profiler.start(interval_ms / 1000):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return profiler.status()
+
+
+@app.post("/debug/profiler/stop", dependencies=[Depends(require_profiler_token)])
+def stop_profiler():
+    """
+    Stop sampling and return the stacks in folded format (for flamegraph.pl or speedscope).
+    """
+    return PlainTextResponse(profiler.stop())
+
+
+@app.get("/debug/profiler", dependencies=[Depends(require_profiler_token)])
+def get_profiler_status():
+    return profiler.status()
+
+def open_scope_store(scope: str):
+    """
+    Vector store the ingest worker built for a scope, or None.
+    """
+    return load_vector_store(get_embedding_record(scope))
+
+async def hot_scope_store(scope: str):
+    """
+    The cached store of a scope if its transcripts have not changed since it
+    was built, including changes saved by other workers; otherwise None.
+    """
+    if not session_stores.contains(scope):
+        return None
+    fingerprint = await repository.run(get_scope_fingerprint, scope)
+    return session_stores.get(scope, fingerprint)
+
+async def load_scope_store(scope: str):
+    """
+    Vector store of a session or user scope: from memory if hot, otherwise the
+    one built by the ingest worker (waiting for its first build if needed).
+    """
+    # Hot scopes are served from memory once one small query shows their transcripts are unchanged
+    vector_store = await hot_scope_store(scope)
+    if vector_store is not None:
+        return vector_store
+
+    # Fetch all transcripts in scope and the stored vector store at the same time
+    transcripts, vector_store = await asyncio.gather(
+        repository.run(get_scope_transcripts, scope),
+        repository.run(open_scope_store, scope),
+    )
+
+    if not transcripts:
+        raise HTTPException(status_code=404, detail="No transcripts found for this session.")
+
+    missing = [
+        doc["$id"] for doc in transcripts
+        if vector_store is None or not vector_store.has_document(doc["$id"], transcript_version(doc))
+    ]
+    if missing:
+        # Transcripts saved before the ingest pipeline, or still in the queue
+        done = enqueue_scope(scope, [t for t in missing if get_status(t) not in (QUEUED, INDEXING)])
+        if vector_store is None or not vector_store.chunks:
+            # Nothing to answer from yet: wait for the index to be built
+            await asyncio.to_thread(done.wait, INDEX_WAIT_TIMEOUT)
+            vector_store = await repository.run(open_scope_store, scope)
+            if vector_store is None:
+                raise HTTPException(status_code=409, detail="Transcripts are still being indexed.")
+    else:
+        session_stores.put(scope, transcripts_fingerprint(transcripts), vector_store)
+    return vector_store
+
+async def load_talk_store(data: "TalkRequest", scope: str):
+    """
+    Vector store answering a /talk request, the answer cache scope for it and
+    the session to filter its search to. A session question is answered from
+    its user's cross-session store when that one is in memory and the session's
+    own store is not; its answers are then cached apart from the session store's,
+    at the user store's version, so switching stores doesn't drop either.
+    """
+    if data.scope == "session" and data.user_id and not session_stores.contains(scope):
+        store_scope = user_scope(data.user_id)
+        user_store = await hot_scope_store(store_scope)
+        if user_store is not None and user_store.has_session(scope):
+            return user_store, f"{store_scope}/{scope}", scope
+    return await load_scope_store(scope), scope, None
 
-        if cached and cached["number_of_transcripts"] == num_transcripts:
-            # ✅ Load vector store from Appwrite Storage
-            vector_file = storage.get_file_download(
-                bucket_id=os.getenv("APPWRITE_BUCKET_ID"),
-                file_id=cached["vector_file_id"]
-            )
-            vector_store = pickle.loads(vector_file)
-
-        else:
-            # 🛠 Rebuild vector store
-            vector_store = TranscriptVectorStore(dim=384)
-            for doc in transcripts:
-                chunks = chunk_transcript(doc["original_text"])
-                embeddings = get_embeddings(chunks)
-                vector_store.add_embeddings(embeddings, chunks)
-
-            # 🔐 Pickle and upload to Appwrite Storage
-            pickle_bytes = pickle.dumps(vector_store)
-            file_id = str(uuid4())
-
-            storage_res = storage.create_file(
-                bucket_id=os.getenv("APPWRITE_BUCKET_ID"),
-                file_id=file_id,
-                file=InputFile.from_bytes(pickle_bytes, filename="vector_store.pkl")
+# Pydantic based style
+class TalkRequest(BaseModel):
+    session_id: str
+    prompt: str
+    scope: str = "session"  # "session", or "user" to search all of the user's transcripts
+    user_id: str | None = None
+
+async def talk_scope(data: TalkRequest) -> str:
+    """
+    Scope key (session id or user scope) a /talk request searches.
+    """
+    if data.scope == "session":
+        return data.session_id
+    if data.scope == "user":
+        user_id = data.user_id
+        if not user_id:
+            session = await repository.run(
+                databases.get_document,
+                database_id=os.getenv("APPWRITE_DATABASE_ID"),
+                collection_id=os.getenv("APPWRITE_SESSION_COLLECTION_ID"),
+                document_id=data.session_id
             )
+            user_id = session["user_id"]
+        return user_scope(user_id)
+    raise HTTPException(status_code=400, detail="scope must be 'session' or 'user'")
 
-            # 🔁 Update or insert vector store record
-            if cached:
-                databases.update_document(
-                    database_id=os.getenv("APPWRITE_DATABASE_ID"),
-                    collection_id=os.getenv("APPWRITE_EMBEDDING_COLLECTION_ID"),
-                    document_id=cached["$id"],
-                    data={
-                        "vector_file_id": file_id,
-                        "number_of_transcripts": num_transcripts
-                    }
-                )
-            else:
-                databases.create_document(
-                    database_id=os.getenv("APPWRITE_DATABASE_ID"),
-                    collection_id=os.getenv("APPWRITE_EMBEDDING_COLLECTION_ID"),
-                    document_id=str(uuid4()),
-                    data={
-                        "session_id": session_id,
-                        "vector_file_id": file_id,
-                        "number_of_transcripts": num_transcripts
-                    }
-                )
-
-        # 3. Generate answer using RAG
-        answer = answer_question(data.prompt, vector_store)
-
-        # 4. Store assistant response in messages collection
+
+def store_assistant_message(session_id: str, text: str):
+    with span("persist"):
         databases.create_document(
             database_id=os.getenv("APPWRITE_DATABASE_ID"),
             collection_id=os.getenv("APPWRITE_MESSAGES_COLLECTION_ID"),
@@ -323,14 +736,95 @@ async def talk(data: TalkRequest):
             data={
                 "session_id": session_id,
                 "sender": "assistant",
-                "text": answer,
+                "text": text,
                 "timestamp": datetime.utcnow().isoformat()
             }
         )
+    invalidate_listing(os.getenv("APPWRITE_MESSAGES_COLLECTION_ID"), "session_id", session_id)
+
+# RAG endpoint to answer questions based on session transcripts
+@app.post("/talk", dependencies=[Depends(require_models)])
+async def talk(data: TalkRequest):
+    try:
+        session_id = data.session_id
+        with span("fetch"):
+            scope = await talk_scope(data)
+            vector_store, answer_scope, session_filter = await load_talk_store(data, scope)
+
+        # 4. Generate answer using RAG (repeated questions come from the answer cache)
+        result = await answer_question_async(data.prompt, vector_store, answer_scope, session_filter)
 
-        return {"response": answer}
+        # 5. Store assistant response in messages collection, after the response is sent
+        repository.write_behind(store_assistant_message, session_id, result["response"])
 
+        return {"response": result["response"], "sources": result["sources"]}
+
+    except GenerationQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Streaming variant of /talk: answer tokens are pushed as Server-Sent Events while they are decoded
+@app.post("/talk/stream", dependencies=[Depends(require_models)])
+async def talk_stream(data: TalkRequest):
+    started = time.perf_counter()
+    with span("fetch"):
+        scope = await talk_scope(data)
+        vector_store, answer_scope, session_filter = await load_talk_store(data, scope)
+
+    def prepare():
+        prepared = prepare_answer(data.prompt, vector_store, answer_scope, session_filter)
+        return prepared, stream_prepared(prepared)
+
+    # The prompt is queued before the response starts, so a full generation queue is a 429 like on /talk
+    try:
+        prepared, stream = await asyncio.to_thread(prepare)
+    except GenerationQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+    def events():
+        pieces = []
+        first_token_ms = None
+        try:
+            yield sse_event("sources", {"sources": prepared["sources"]})
+            for piece in stream:
+                if not piece:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                    ttft_latency.record(first_token_ms)
+                    observe("first_token", first_token_ms / 1000)
+                pieces.append(piece)
+                yield sse_event("token", {"text": piece})
+
+            answer = "".join(pieces).strip()
+            total_ms = (time.perf_counter() - started) * 1000
+            stream_latency.record(total_ms)
+            observe("stream_total", total_ms / 1000)
+            repository.write_behind(store_assistant_message, data.session_id, answer)
+            yield sse_event("done", {
+                "response": answer,
+                "sources": prepared["sources"],
+                "ttft_ms": round(first_token_ms or total_ms, 1),
+                "total_ms": round(total_ms, 1),
+            })
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse_event("error", {"error": str(e)})
+
+    # A sync iterator: Starlette runs it in its threadpool, off the event loop
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/talk/stats")
+def get_talk_stats():
+    return {
+        "time_to_first_token": ttft_latency.summary(),
+        "stream_total": stream_latency.summary(),
+    }
@@ -0,0 +1,156 @@
+# Prometheus metrics and per-request timing spans
+#
+# span("embed") times one stage of the request being served: the stage is observed
+# in the smartscribe_stage_seconds histogram, labelled with the endpoint, and listed
+# in the response's Server-Timing header when SERVER_TIMING is on. Spans work in
+# threads started with asyncio.to_thread or app.repository, which carry the
+# request's context along; anywhere else they are labelled "background".
+#
+# Model load times, queue depths and cache hit rates are read from the components
+# registered with `components` each time /metrics is scraped. Every API worker
+# process exports its own metrics.
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+from prometheus_client import Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from prometheus_client.registry import Collector
+from starlette.datastructures import MutableHeaders
+
+from app.models import models
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+# From a cache hit (milliseconds) to transcribing a long recording (minutes)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_SECONDS = Histogram(
+    "smartscribe_request_seconds", "Time from request to end of response",
+    ["method", "route", "status"], buckets=BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "smartscribe_stage_seconds", "Time spent in each stage of a request",
+    ["endpoint", "stage"], buckets=BUCKETS,
+)
+
+
+class RequestTimings:
+    """
+    Stages timed while serving one request.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope  # The router adds the matched endpoint to it
+        self.started = time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+
+    @property
+    def endpoint(self) -> str:
+        endpoint = self.scope.get("endpoint")
+        return getattr(endpoint, "__name__", "unmatched")
+
+    def header(self) -> str:
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def observe(stage: str, seconds: float, endpoint: str | None = None):
+    """
+    Record a stage duration measured elsewhere (e.g. time to first streamed token).
+    """
+    timings = _current.get()
+    if endpoint is None:
+        endpoint = timings.endpoint if timings is not None else "background"
+    STAGE_SECONDS.labels(endpoint, stage).observe(seconds)
+    if timings is not None:
+        timings.stages.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str, endpoint: str | None = None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, endpoint)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request by route and status, collects its spans and,
+    with SERVER_TIMING on, adds them to the response as a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope)
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - timings.started)
+            _current.reset(token)
+
+
+class ComponentCollector(Collector):
+    """
+    Gauges read at scrape time: load time of each model, the depth of each
+    registered queue and the hit rate of each registered cache.
+    """
+
+    def __init__(self):
+        self.queues: dict[str, Callable[[], int]] = {}
+        self.caches: dict[str, Callable[[], dict]] = {}
+
+    def collect(self):
+        loaded = GaugeMetricFamily("smartscribe_model_loaded", "1 once a model is loaded", labels=["model"])
+        load_seconds = GaugeMetricFamily("smartscribe_model_load_seconds", "Time it took to load a model", labels=["model"])
+        for name, status in models.status().items():
+            loaded.add_metric([name], 1 if status["loaded"] else 0)
+            if status["load_seconds"] is not None:
+                load_seconds.add_metric([name], status["load_seconds"])
+
+        depth = GaugeMetricFamily("smartscribe_queue_depth", "Items waiting in a queue", labels=["queue"])
+        for name, get_depth in self.queues.items():
+            depth.add_metric([name], get_depth())
+
+        hit_rate = GaugeMetricFamily("smartscribe_cache_hit_ratio", "Hits per lookup since start", labels=["cache"])
+        entries = GaugeMetricFamily("smartscribe_cache_entries", "Entries held in a cache", labels=["cache"])
+        for name, get_stats in self.caches.items():
+            stats = get_stats()
+            hit_rate.add_metric([name], stats["hit_rate"])
+            if "entries" in stats:
+                entries.add_metric([name], stats["entries"])
+
+        yield from [loaded, load_seconds, depth, hit_rate, entries]
+
+
+components = ComponentCollector()
+REGISTRY.register(components)
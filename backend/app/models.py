@@ -0,0 +1,89 @@
+# Models are loaded on first use, not at import, so processes that never answer
+# questions or transcribe never pay for them. APP_ROLE picks what a process serves:
+#   all        every endpoint, models loaded lazily (or at startup via MODEL_WARMUP)
+#   api        sessions, messages and transcript storage only; model endpoints answer 503
+#   inference  every endpoint, with all models warmed up at startup
+
+import os
+import threading
+import time
+from typing import Any, Callable
+
+APP_ROLE = os.getenv("APP_ROLE", "all")
+# Comma-separated models to load at startup in the "all" role, e.g. "embedder,generator"
+MODEL_WARMUP = [name.strip() for name in os.getenv("MODEL_WARMUP", "").split(",") if name.strip()]
+
+if APP_ROLE not in ("all", "api", "inference"):
+    raise ValueError(f"Unknown APP_ROLE {APP_ROLE!r}, expected 'all', 'api' or 'inference'")
+
+
+class ModelRegistry:
+    """
+    Named model loaders. get() loads a model once, on first use, even when
+    several threads ask for it at the same time; other models load in parallel.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders: dict[str, Callable[[], Any]] = {}
+        self._models: dict[str, Any] = {}
+        self._model_locks: dict[str, threading.Lock] = {}
+        self._load_seconds: dict[str, float] = {}
+        self._errors: dict[str, str] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        with self._lock:
+            self._loaders[name] = loader
+            self._model_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"No model registered as {name!r}")
+            model_lock = self._model_locks[name]
+
+        with model_lock:
+            if name not in self._models:
+                started = time.perf_counter()
+                try:
+                    model = self._loaders[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._load_seconds[name] = round(time.perf_counter() - started, 2)
+                self._errors.pop(name, None)
+                self._models[name] = model
+                print(f"[Models] Loaded {name} in {self._load_seconds[name]}s")
+            return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warm_up(self, names: list[str]):
+        """
+        Load the given models now; a model that fails to load is reported by status().
+        """
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"[Models] Warm-up of {name} failed: {e}")
+
+    def status(self) -> dict:
+        with self._lock:
+            names = list(self._loaders)
+        return {
+            name: {
+                "loaded": name in self._models,
+                "load_seconds": self._load_seconds.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in names
+        }
+
+
+models = ModelRegistry()
@@ -0,0 +1,93 @@
+# Sampling profiler that can be switched on in a running worker
+#
+# While running, a background thread records the Python stack of every other
+# thread every interval seconds. The result is in "folded" format, one line per
+# distinct stack with its sample count, which flamegraph.pl and speedscope read.
+# Sampling costs roughly one stack walk per thread per interval, so it stops on
+# its own after max_seconds.
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stacks: Counter = Counter()
+        self.samples = 0
+        self.interval = 0.0
+        self.started_at: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.005, max_seconds: float = PROFILER_MAX_SECONDS) -> bool:
+        """
+        Start sampling from scratch; returns False if it is already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.interval = interval
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(max_seconds,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> str:
+        """
+        Stop sampling and return the folded stacks collected so far.
+        """
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.folded()
+
+    def _run(self, max_seconds: float):
+        own = threading.get_ident()
+        deadline = time.monotonic() + max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                sampled.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": round(self.interval * 1000, 2),
+                "samples": self.samples,
+                "stacks": len(self._stacks),
+                "started_at": self.started_at,
+            }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,135 @@
+# Step 9: per-scope cache of generated answers, matched by question similarity
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity above which two questions count as the same question
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    LRU of answers (the /talk result: response and sources) keyed by scope (session or user) and normalized question.
+    Each scope remembers the index version its answers were generated from;
+    a lookup or store with another version drops all of that scope's answers,
+    so new transcripts invalidate them automatically.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl: float = ANSWER_CACHE_TTL, threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # (scope, normalized question) -> (unit query embedding, answer, added, ms it took to answer)
+        self._entries: "OrderedDict[tuple[str, str], tuple[np.ndarray, dict, float, float]]" = OrderedDict()
+        self._scopes: dict[str, tuple[str, set]] = {}  # scope -> (index version, its entry keys)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_ms = 0.0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype="float32").ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scope_keys(self, scope: str, version: str) -> set:
+        current = self._scopes.get(scope)
+        if current is not None and current[0] != version:
+            for key in current[1]:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+            current = None
+        if current is None:
+            current = self._scopes[scope] = (version, set())
+        return current[1]
+
+    def _drop(self, key: tuple[str, str]):
+        self._entries.pop(key, None)
+        scope = self._scopes.get(key[0])
+        if scope is not None:
+            scope[1].discard(key)
+
+    def lookup(self, scope: str, version: str, question: str, query_embedding) -> dict | None:
+        """
+        Answer to the same question, or failing that the most similar one above
+        the threshold, asked in this scope at this index version.
+        """
+        key = (scope, normalize_question(question))
+        now = time.monotonic()
+        with self._lock:
+            keys = self._scope_keys(scope, version)
+            for expired in [k for k in keys if now - self._entries[k][2] > self.ttl]:
+                self._drop(expired)
+
+            if key in keys:
+                match = key
+                self.exact_hits += 1
+            else:
+                match, best = None, self.threshold
+                query = self._unit(query_embedding)
+                for candidate in keys:
+                    score = float(np.dot(self._entries[candidate][0], query))
+                    if score >= best:
+                        match, best = candidate, score
+                if match is None:
+                    self.misses += 1
+                    return None
+                self.similar_hits += 1
+
+            self._entries.move_to_end(match)
+            _, answer, _, cost_ms = self._entries[match]
+            self.saved_ms += cost_ms
+            return answer
+
+    def store(self, scope: str, version: str, question: str, query_embedding, answer: dict, cost_ms: float):
+        key = (scope, normalize_question(question))
+        with self._lock:
+            keys = self._scope_keys(scope, version)
+            self._entries[key] = (self._unit(query_embedding), answer, time.monotonic(), cost_ms)
+            self._entries.move_to_end(key)
+            keys.add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, scope: str):
+        with self._lock:
+            current = self._scopes.pop(scope, None)
+            if current is not None:
+                for key in current[1]:
+                    self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+answer_cache = AnswerCache()
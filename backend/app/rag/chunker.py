@@ -1,22 +1,114 @@
 # Step 1: chunk_transcript()
+#
+# Chunks are sized in the embedder's word-piece tokens: MiniLM truncates its input at
+# 256 tokens, so any text past that would be embedded for nothing. Chunks end on
+# sentence (or Whisper segment) boundaries and overlap by whole sentences.
 
-def chunk_transcript(text: str, max_chunk_size: int = 500, overlap: int = 100) -> list[str]:
+import re
+
+OVERLAP_TOKENS = 32
+_SENTENCE = re.compile(r"\S.*?(?:[.!?]+(?=\s|$)|$)", re.S)
+
+
+def _tokenizer():
+    # The embedding model's own tokenizer, so token counts match what gets embedded
+    from app.rag.embedder import get_embedder
+
+    embedder = get_embedder()
+    return embedder.tokenizer, embedder.max_seq_length - 2  # [CLS] and [SEP]
+
+
+def _units(text: str, segments: list[dict] | None) -> list[tuple[int, int, float | None, float | None]]:
     """
-    Splits a long transcript into overlapping chunks for RAG search.
+    (start, end, start_time, end_time) of each sentence, or of each Whisper
+    segment when the transcript is the concatenation of its segments.
     """
+    if segments and "".join(seg["text"] for seg in segments) == text:
+        units, pos = [], 0
+        for seg in segments:
+            start, end = pos, pos + len(seg["text"])
+            pos = end
+            while start < end and text[start].isspace():
+                start += 1
+            if start < end:
+                units.append((start, end, seg["start"], seg["end"]))
+        return units
+    return [(m.start(), m.end(), None, None) for m in _SENTENCE.finditer(text)]
+
+
+def _pack(text: str, units: list, encodings: list, max_tokens: int, overlap_tokens: int) -> list[dict]:
+    # Split units longer than the token budget at token boundaries
+    pieces = []
+    for (start, end, t0, t1), offsets in zip(units, encodings):
+        if len(offsets) <= max_tokens:
+            pieces.append((start, end, len(offsets), t0, t1))
+            continue
+        for i in range(0, len(offsets), max_tokens):
+            part = offsets[i:i + max_tokens]
+            pieces.append((start + part[0][0], start + part[-1][1], len(part), t0, t1))
+
     chunks = []
-    start = 0
-    text_length = len(text)
+    i = 0
+    while i < len(pieces):
+        j, tokens = i, 0
+        while j < len(pieces) and tokens + pieces[j][2] <= max_tokens:
+            tokens += pieces[j][2]
+            j += 1
+
+        start, end = pieces[i][0], pieces[j - 1][1]
+        chunk = {"text": text[start:end].strip(), "start": start, "end": end, "tokens": tokens}
+        if pieces[i][3] is not None:
+            chunk["start_time"], chunk["end_time"] = pieces[i][3], pieces[j - 1][4]
+        chunks.append(chunk)
+        if j == len(pieces):
+            break
 
-    while start < text_length:
-        end = min(start + max_chunk_size, text_length)
-        chunk = text[start:end]
-        chunks.append(chunk.strip())
-        start += max_chunk_size - overlap
+        # Start the next chunk with the last sentences of this one
+        k, overlap = j, 0
+        while k - 1 > i and overlap + pieces[k - 1][2] <= overlap_tokens:
+            k -= 1
+            overlap += pieces[k][2]
+        i = k
 
     return chunks
 
 
+def chunk_transcripts(
+    texts: list[str],
+    segments: list[list[dict] | None] | None = None,
+    max_tokens: int | None = None,
+    overlap_tokens: int = OVERLAP_TOKENS,
+) -> list[list[dict]]:
+    """
+    Chunk many transcripts with a single tokenizer call.
+    Each chunk is a dict with its text, [start, end) char offsets, token count and,
+    when Whisper segments are given, start_time/end_time in seconds.
+    """
+    tokenizer, model_max = _tokenizer()
+    max_tokens = max_tokens or model_max
+    segments = segments or [None] * len(texts)
+
+    units = [_units(text, segs) for text, segs in zip(texts, segments)]
+    flat = [text[start:end] for text, doc_units in zip(texts, units) for start, end, _, _ in doc_units]
+    if not flat:
+        return [[] for _ in texts]
+    encoded = tokenizer(flat, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+
+    results, pos = [], 0
+    for text, doc_units in zip(texts, units):
+        doc_encodings = encoded[pos:pos + len(doc_units)]
+        pos += len(doc_units)
+        results.append(_pack(text, doc_units, doc_encodings, max_tokens, overlap_tokens))
+    return results
+
+
+def chunk_transcript(text: str, max_tokens: int | None = None, overlap_tokens: int = OVERLAP_TOKENS) -> list[str]:
+    """
+    Splits a long transcript into overlapping chunks for RAG search.
+    """
+    return [chunk["text"] for chunk in chunk_transcripts([text], None, max_tokens, overlap_tokens)[0]]
+
+
 # Optional: run directly to test chunking
 
 # if __name__ == "__main__":
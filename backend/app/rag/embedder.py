@@ -1,31 +1,209 @@
 # Step 2: OpenAI embeddings
 
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import Future
+from typing import Callable
+import numpy as np
 import os
+import queue
+import threading
+import time
+from app.models import models
+from app.rag.embedding_cache import EmbeddingCache
 
-# Load embedding model (first time it will download and cache)
 model_name = "all-MiniLM-L6-v2"
-embedder = SentenceTransformer(model_name, device="cpu")
+EMBEDDING_DIM = 384  # Output size of model_name, known before the model is loaded
+
+# "torch" runs the model in fp32, "int8" with dynamically quantized linear layers,
+# "onnx" on ONNX Runtime
+EMBED_RUNTIME = os.getenv("EMBED_RUNTIME", "torch")
+
+# Vector space each runtime's embeddings live in, recorded in every stored index
+# and in the embedding cache. ONNX Runtime reproduces the fp32 embeddings up to
+# float rounding, so its indexes are interchangeable with torch's. int8 embeddings
+# drift further (benchmarks/bench_runtimes.py measures both), so int8 has a space
+# of its own and indexes built in another space are rebuilt.
+EMBEDDING_SPACES = {
+    "torch": model_name,
+    "onnx": model_name,
+    "int8": f"{model_name}+int8",
+}
+if EMBED_RUNTIME not in EMBEDDING_SPACES:
+    raise ValueError(f"Unknown EMBED_RUNTIME {EMBED_RUNTIME!r}, expected 'torch', 'int8' or 'onnx'")
+EMBEDDING_SPACE = EMBEDDING_SPACES[EMBED_RUNTIME]
+
+
+def load_embedder(runtime: str = EMBED_RUNTIME):
+    # Imported here: sentence-transformers pulls in torch, which alone takes seconds to import
+    from sentence_transformers import SentenceTransformer
+
+    # Load embedding model (first time it will download and cache)
+    if runtime == "onnx":
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    else:
+        model = SentenceTransformer(model_name, device="cpu")
+        if runtime == "int8":
+            import torch
+
+            torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if model.get_sentence_embedding_dimension() != EMBEDDING_DIM:
+        raise RuntimeError(f"{model_name} produces {model.get_sentence_embedding_dimension()}-d embeddings, expected {EMBEDDING_DIM}")
+    return model
+
+
+models.register("embedder", load_embedder)
+
+
+def get_embedder():
+    return models.get("embedder")
+
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingService:
+    """
+    Single owner of the embedding model. Encode requests from any thread are
+    collected for up to max_wait seconds into one batch, identical texts are
+    encoded once, and the model runs on a dedicated worker thread.
+    """
+
+    def __init__(self, get_model: Callable, dim: int, max_batch: int = EMBED_MAX_BATCH, max_wait: float = EMBED_MAX_WAIT_MS / 1000):
+        self.get_model = get_model  # Called on the worker thread, so the model loads on first use
+        self.dim = dim
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[tuple[list[str], Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+        self.requests = 0
+        self.texts = 0
+        self.encoded = 0
+        self.batches = 0
+
+    def submit(self, texts: list[str]) -> Future:
+        """
+        Queue texts for encoding; the future resolves to a float32 array (len(texts), dim).
+        """
+        future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, self.dim), dtype="float32"))
+            return future
+
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                self._worker.start()
+        self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def _collect(self) -> list[tuple[list[str], Future]]:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            try:
+                vectors = self.get_model().encode(
+                    unique,
+                    batch_size=self.max_batch,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                ).astype("float32")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.requests += len(batch)
+                self.texts += sum(len(texts) for texts, _ in batch)
+                self.encoded += len(unique)
+                self.batches += 1
+
+            position = {text: i for i, text in enumerate(unique)}
+            for texts, future in batch:
+                future.set_result(vectors[[position[text] for text in texts]])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "texts": self.texts,
+                "encoded": self.encoded,
+                "batches": self.batches,
+                "deduplicated": self.texts - self.encoded,
+                "avg_batch_size": round(self.encoded / self.batches, 2) if self.batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+embedding_service = EmbeddingService(get_embedder, EMBEDDING_DIM)
+_embedding_cache: EmbeddingCache | None = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    The embedding cache, mapped on first use so importing the app doesn't touch EMBED_CACHE_DIR.
+    """
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(EMBEDDING_SPACE, EMBEDDING_DIM)
+        return _embedding_cache
+
 
 def get_embeddings(chunks: list[str]) -> list[list[float]]:
     """
     Generate embeddings using Hugging Face's sentence-transformers.
+    Chunks seen before are served from the embedding cache; only misses are encoded.
     """
     try:
-        embeddings = embedder.encode(chunks, show_progress_bar=True)
+        cache = get_embedding_cache()
+        embeddings, missing = cache.lookup(chunks)
+        if missing:
+            texts = [chunks[i] for i in missing]
+            vectors = embedding_service.encode(texts)
+            cache.store(texts, vectors)
+            embeddings[missing] = vectors
         return embeddings
     except Exception as e:
         print(f"[Embedder] Error: {e}")
         return []
 
 
+def embed_query(question: str) -> np.ndarray:
+    """
+    Embed a single question; concurrent questions share one model batch.
+    """
+    return embedding_service.encode([question])[0]
+
+
 # Optional: test this module directly
 
 # if __name__ == "__main__":
 #     from app.rag.chunker import chunk_transcript
 #     import torch
 #     print("CUDA available:", torch.cuda.is_available())
-#     print("Device:", embedder.device)
+#     print("Device:", get_embedder().device)
 
 #     transcript = (
 #         "Today we're discussing how backpropagation works in neural networks, "
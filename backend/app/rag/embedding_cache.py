@@ -0,0 +1,165 @@
+# Step 8: persistent embedding cache keyed by (model name, hash of normalized chunk text)
+#
+# Per model the cache keeps three memory-mapped files of `capacity` rows:
+#   <model>.vectors  float32 embeddings
+#   <model>.keys     16-byte blake2b digest of the normalized text
+#   <model>.ticks    last-use counter of each row (0 = empty), for LRU eviction
+# API workers share the files: reads take a shared flock on <model>.lock, writes
+# an exclusive one. Each process maps keys to rows from what it has seen, so a
+# row is only trusted if its stored key still matches (another worker may have
+# evicted and reused it). Files of another capacity or dim are rebuilt under the
+# lock and renamed into place, never truncated while another worker maps them.
+
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smartscribe_embeddings"))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000"))
+
+
+def normalize_text(text: str) -> str:
+    # MiniLM's tokenizer is uncased and ignores whitespace runs, so this does not change the embedding
+    return " ".join(text.lower().split())
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, dim: int, directory: str = EMBED_CACHE_DIR, capacity: int = EMBED_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self._lock_fd = os.open(f"{base}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked(exclusive=True):
+            self._vectors = self._open(f"{base}.vectors", np.float32, (capacity, dim))
+            self._keys = self._open(f"{base}.keys", np.uint8, (capacity, 16))
+            self._ticks = self._open(f"{base}.ticks", np.int64, (capacity,))
+
+        self._slots = {
+            key.tobytes(): int(slot) for slot, key in enumerate(self._keys) if self._ticks[slot] > 0
+        }
+        self._tick = int(self._ticks.max()) if capacity else 0
+
+    @staticmethod
+    def _open(path: str, dtype, shape) -> np.memmap:
+        """
+        Map one of the cache files; called with the lock held exclusively.
+        """
+        expected = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not os.path.exists(path) or os.path.getsize(path) != expected:
+            # New cache, or capacity/dim changed: start empty in a new file, so
+            # workers still mapping the old one aren't cut off mid-read
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp")
+            try:
+                os.ftruncate(fd, expected)
+            finally:
+                os.close(fd)
+            os.replace(tmp, path)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _find(self, key: bytes) -> int | None:
+        """
+        Row holding key, or None. Forgets rows another process has reused.
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        if self._ticks[slot] == 0 or self._keys[slot].tobytes() != key:
+            del self._slots[key]
+            return None
+        return slot
+
+    def lookup(self, texts: list[str]) -> tuple[np.ndarray, list[int]]:
+        """
+        Returns a (len(texts), dim) array filled for cache hits and the
+        positions of the texts that still need embedding.
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        missing = []
+        with self._locked(exclusive=False):
+            self._tick = max(self._tick, int(self._ticks.max()))
+            for i, text in enumerate(texts):
+                slot = self._find(text_key(text))
+                if slot is None:
+                    missing.append(i)
+                    continue
+                vectors[i] = self._vectors[slot]
+                self._tick += 1
+                self._ticks[slot] = self._tick
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def store(self, texts: list[str], vectors: np.ndarray):
+        """
+        Add embeddings, evicting the least recently used rows when full.
+        """
+        with self._locked(exclusive=True):
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if self._find(key) is None:
+                    new[key] = vector
+            new = list(new.items())[:self.capacity]
+            if not new:
+                return
+
+            # Other workers advance the shared ticks too; keep evicting by global recency
+            self._tick = max(self._tick, int(self._ticks.max()))
+
+            free = np.flatnonzero(self._ticks == 0)[:len(new)]
+            if len(free) < len(new):
+                used = np.flatnonzero(self._ticks > 0)
+                oldest = used[np.argsort(self._ticks[used])[:len(new) - len(free)]]
+                for slot in oldest:
+                    self._slots.pop(self._keys[slot].tobytes(), None)
+                self.evictions += len(oldest)
+                free = np.concatenate([free, oldest])
+
+            for slot, (key, vector) in zip(free, new):
+                slot = int(slot)
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._tick += 1
+                self._ticks[slot] = self._tick
+                self._slots[key] = slot
+
+            for arr in (self._vectors, self._keys, self._ticks):
+                arr.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int(np.count_nonzero(self._ticks)),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
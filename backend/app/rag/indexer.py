@@ -0,0 +1,75 @@
+# Step 5: keep a session's (or user's) vector store in sync with its transcripts
+
+from typing import Callable
+
+from app.rag.chunker import chunk_transcripts
+from app.rag.embedder import get_embeddings
+from app.rag.vector_store import TranscriptVectorStore
+
+
+def transcript_version(doc: dict) -> str:
+    """
+    Version marker of a transcript document; changes whenever the document is edited.
+    """
+    return doc.get("$updatedAt") or doc.get("created_at") or ""
+
+
+def transcripts_fingerprint(transcripts: list[dict]) -> str:
+    """
+    Count and newest version of a scope's transcripts: changes whenever one is
+    added, edited or deleted, and can be read back with one small query
+    (see ingest.get_scope_fingerprint).
+    """
+    latest = max((transcript_version(doc) for doc in transcripts), default="")
+    return f"{len(transcripts)}:{latest}"
+
+
+def sync_vector_store(
+    vector_store: TranscriptVectorStore,
+    transcripts: list[dict],
+    load_segments: Callable[[dict], list[dict] | None] | None = None,
+) -> bool:
+    """
+    Embed only transcripts the store has not seen yet, and drop vectors of
+    transcripts that were deleted or edited since they were indexed.
+    load_segments returns the Whisper segments of a transcript, if it has any;
+    chunks then follow segment boundaries and carry start_time/end_time.
+    Returns True if the store changed.
+    """
+    current = {doc["$id"]: transcript_version(doc) for doc in transcripts}
+    stale = [
+        doc_id for doc_id, version in vector_store.doc_versions.items()
+        if current.get(doc_id) != version
+    ]
+    changed = bool(stale)
+    vector_store.remove_documents(stale)
+
+    new_docs = [doc for doc in transcripts if not vector_store.has_document(doc["$id"], current[doc["$id"]])]
+    if not new_docs:
+        return changed
+
+    # One tokenizer pass for all new transcripts
+    segments = [load_segments(doc) for doc in new_docs] if load_segments else None
+    all_chunks = chunk_transcripts([doc["original_text"] for doc in new_docs], segments)
+
+    for doc, doc_chunks in zip(new_docs, all_chunks):
+        doc_id = doc["$id"]
+        chunks = [chunk["text"] for chunk in doc_chunks]
+        embeddings = get_embeddings(chunks)
+        if len(embeddings) != len(chunks):
+            # Embedding failed, leave this transcript for the next sync
+            print(f"[Indexer] Skipping transcript {doc_id}: embedding failed")
+            continue
+
+        metadata = [
+            {
+                "session_id": doc.get("session_id"),
+                "user_id": doc.get("user_id"),
+                **{key: chunk[key] for key in ("start", "end", "start_time", "end_time") if key in chunk},
+            }
+            for chunk in doc_chunks
+        ]
+        vector_store.add_embeddings(embeddings, chunks, doc_id=doc_id, version=current[doc_id], metadata=metadata)
+        changed = True
+
+    return changed
@@ -0,0 +1,153 @@
+# Step 6: versioned on-disk format for TranscriptVectorStore plus a local file cache
+#
+# Layout of a store file (little endian):
+#   magic "SSVS" | format version (u32) | metadata length (u32)
+#   metadata JSON (embedding space, dim, counts, transcript ids)
+#   FAISS index bytes, exactly as faiss.write_index writes them
+#   chunk offsets (u64 x num_chunks + 1), relative to the text blob
+#   UTF-8 chunk text blob
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Sequence
+
+import faiss
+import numpy as np
+
+from app import disk_cache
+from app.rag.embedder import EMBEDDING_SPACE
+from app.rag.vector_store import TranscriptVectorStore
+
+MAGIC = b"SSVS"
+FORMAT_VERSION = 2  # 2: cosine/inner-product indexes with stable chunk ids
+_HEADER = struct.Struct("<4sII")
+
+CACHE_DIR = os.getenv("VECTOR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smartscribe_vectors"))
+CACHE_MAX_BYTES = int(os.getenv("VECTOR_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+
+class StaleIndexError(Exception):
+    """Raised when a stored index has an unknown format or was built with another embedding model."""
+
+
+class MappedChunks(Sequence):
+    """
+    Read-only list of chunk texts decoded on access from a memory-mapped blob.
+    """
+
+    def __init__(self, blob: memoryview, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def nbytes(self) -> int:
+        return len(self._blob) + self._offsets.nbytes
+
+
+def serialize_store(store: TranscriptVectorStore) -> bytes:
+    """
+    Encode a vector store into the versioned binary format.
+    """
+    index_bytes = faiss.serialize_index(store.index).tobytes()
+    encoded = [chunk.encode("utf-8") for chunk in store.chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype="<u8")
+
+    meta = json.dumps({
+        "embedding_model": EMBEDDING_SPACE,
+        "dim": store.dim,
+        "index_type": store.index_type,
+        "kind": store.kind,
+        "trained_size": store.trained_size,
+        "next_id": store.next_id,
+        "num_chunks": len(encoded),
+        "index_bytes": len(index_bytes),
+        "chunk_ids": store.chunk_ids,
+        "chunk_doc_ids": store.chunk_doc_ids,
+        "chunk_meta": store.chunk_meta,
+        "doc_versions": store.doc_versions,
+    }).encode("utf-8")
+
+    return b"".join([
+        _HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)),
+        meta,
+        index_bytes,
+        offsets.tobytes(),
+        *encoded,
+    ])
+
+
+def open_store(path: str) -> TranscriptVectorStore:
+    """
+    Load a store file. The chunk texts stay memory-mapped instead of being read into memory.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mm) < _HEADER.size:
+        raise StaleIndexError("Vector store file is truncated")
+    magic, version, meta_len = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise StaleIndexError(f"Unsupported vector store format (version {version})")
+
+    pos = _HEADER.size
+    meta = json.loads(bytes(mm[pos:pos + meta_len]))
+    pos += meta_len
+    if meta["embedding_model"] != EMBEDDING_SPACE:
+        raise StaleIndexError(f"Index was built with {meta['embedding_model']}, expected {EMBEDDING_SPACE}")
+
+    index = faiss.deserialize_index(np.frombuffer(mm, dtype="uint8", count=meta["index_bytes"], offset=pos))
+    pos += meta["index_bytes"]
+
+    num_chunks = meta["num_chunks"]
+    offsets = np.frombuffer(mm, dtype="<u8", count=num_chunks + 1, offset=pos)
+    pos += offsets.nbytes
+
+    store = TranscriptVectorStore(dim=meta["dim"], index_type=meta["index_type"])
+    store.index = index
+    store.kind = meta["kind"]
+    store.trained_size = meta["trained_size"]
+    store.next_id = meta["next_id"]
+    store.chunks = MappedChunks(memoryview(mm)[pos:], offsets)
+    store.chunk_ids = meta["chunk_ids"]
+    store.chunk_doc_ids = meta["chunk_doc_ids"]
+    store.chunk_meta = meta.get("chunk_meta") or [None] * num_chunks
+    store.doc_versions = meta["doc_versions"]
+    return store
+
+
+def cache_path(file_id: str) -> str:
+    return os.path.join(CACHE_DIR, f"{file_id}.ssvs")
+
+
+def get_cached(file_id: str) -> str | None:
+    """
+    Path of a cached store file, or None on a miss.
+    Storage file ids are never reused, so a cached file is never out of date.
+    """
+    path = cache_path(file_id)
+    return path if disk_cache.touch(path) else None
+
+
+def put_cached(file_id: str, data: bytes) -> str:
+    """
+    Write a store file into the cache and evict least recently used files over the size cap.
+    """
+    path = disk_cache.write(CACHE_DIR, os.path.basename(cache_path(file_id)), data)
+    disk_cache.evict(CACHE_DIR, ".ssvs", CACHE_MAX_BYTES, keep=path)
+    return path
@@ -1,40 +1,564 @@
 # Step 4: send to OpenAI GPT
 
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
+from concurrent.futures import Future
+import asyncio
+import httpx
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from app.metrics import span
+from app.models import models
+from app.rag.answer_cache import answer_cache
 from app.rag.vector_store import TranscriptVectorStore
 from app.rag.chunker import chunk_transcript
-from app.rag.embedder import get_embeddings
+from app.rag.embedder import get_embeddings, embed_query
 
-# Load embedding model
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# "hf" runs flan-t5 in this process; "http" calls a local LLM server
+GENERATOR_BACKEND = os.getenv("GENERATOR_BACKEND", "hf")
+# How the hf backend runs flan-t5: "torch" (fp32), "int8" (dynamically quantized
+# linear layers) or "onnx" (ONNX Runtime, exported once into ONNX_CACHE_DIR)
+GENERATE_RUNTIME = os.getenv("GENERATE_RUNTIME", "torch")
+GENERATE_RUNTIMES = ("torch", "int8", "onnx")
+GENERATOR_MODEL = "google/flan-t5-base"
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smartscribe_onnx"))
+LLM_SERVER_URL = os.getenv("LLM_SERVER_URL", "http://localhost:8888")
+LLM_MODEL = os.getenv("LLM_MODEL", "mistral:instruct")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_RETRY_BACKOFF = 0.2  # Seconds before the first retry, doubled for each one after
 
-# Load HF language model (replace with larger model later)
-generator = pipeline("text2text-generation", model="google/flan-t5-base", device=0 if embedder.device.type == "cuda" else -1)
+GENERATE_MAX_BATCH = int(os.getenv("GENERATE_MAX_BATCH", "8"))
+GENERATE_MAX_WAIT_MS = float(os.getenv("GENERATE_MAX_WAIT_MS", "10"))
+GENERATE_MAX_QUEUE = int(os.getenv("GENERATE_MAX_QUEUE", "64"))
+GENERATE_MAX_NEW_TOKENS = int(os.getenv("GENERATE_MAX_NEW_TOKENS", "256"))
 
 
-def build_context(vector_store: TranscriptVectorStore, question: str, top_k: int = 3) -> str:
+class GenerationQueueFullError(Exception):
+    """Raised when too many prompts are already waiting for the generator."""
+
+
+class GenerationService:
+    """
+    Single owner of the generation model. Prompts from any thread are collected
+    for up to max_wait seconds into one padded batch, identical prompts are
+    generated once, and the model runs on a dedicated worker thread.
+    Streamed prompts run on the same thread, one at a time between batches.
+    """
+
+    def __init__(self, tokenizer, model, max_batch: int = GENERATE_MAX_BATCH, max_wait: float = GENERATE_MAX_WAIT_MS / 1000,
+                 max_queue: int = GENERATE_MAX_QUEUE, max_new_tokens: int = GENERATE_MAX_NEW_TOKENS):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_new_tokens = max_new_tokens
+        # (prompt, future, streamer); streamer is None for prompts answered in batches
+        self._queue: "queue.Queue[tuple[str, Future, object]]" = queue.Queue(maxsize=max_queue)
+        self._held: tuple[str, Future, object] | None = None  # Streamed prompt that ended a batch
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+        self.requests = 0
+        self.generated = 0
+        self.batches = 0
+        self.streamed = 0
+        self.rejected = 0
+
+    def submit(self, prompt: str, streamer=None) -> Future:
+        """
+        Queue a prompt; the future resolves to the generated text. With a
+        streamer (a TextIteratorStreamer) the prompt is generated on its own and
+        its tokens are pushed to the streamer as they are decoded.
+        Raises GenerationQueueFullError when max_queue prompts are already waiting.
+        """
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="generation-service", daemon=True)
+                self._worker.start()
+
+        future = Future()
+        try:
+            self._queue.put_nowait((prompt, future, streamer))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise GenerationQueueFullError("Answer generation queue is full, try again later")
+        return future
+
+    def generate(self, prompt: str) -> str:
+        return self.submit(prompt).result()
+
+    def _collect(self) -> list[tuple[str, Future, object]]:
+        """
+        The next batch, or a streamed prompt on its own.
+        """
+        if self._held is not None:
+            item, self._held = self._held, None
+            return [item]
+
+        batch = [self._queue.get()]
+        if batch[0][2] is not None:
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item[2] is not None:
+                self._held = item  # Runs right after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _stream(self, prompt: str, future: Future, streamer):
+        import torch
+
+        try:
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+            with torch.inference_mode():
+                self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, streamer=streamer)
+        except Exception as e:
+            streamer.end()  # Unblock the reader, which then sees the error on the future
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            self.requests += 1
+            self.streamed += 1
+        future.set_result(None)
+
+    def _run(self):
+        import torch
+
+        while True:
+            batch = self._collect()
+            if batch[0][2] is not None:
+                self._stream(*batch[0])
+                continue
+
+            unique = list(dict.fromkeys(prompt for prompt, _, _ in batch))
+            try:
+                inputs = self.tokenizer(unique, padding=True, return_tensors="pt").to(self.model.device)
+                with torch.inference_mode():
+                    outputs = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+                texts = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.requests += len(batch)
+                self.generated += len(unique)
+                self.batches += 1
+
+            answers = dict(zip(unique, texts))
+            for prompt, future, _ in batch:
+                future.set_result(answers[prompt])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "generated": self.generated,
+                "batches": self.batches,
+                "streamed": self.streamed,
+                "rejected": self.rejected,
+                "avg_batch_size": round(self.generated / self.batches, 2) if self.batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+class HFGeneratorBackend:
+    """
+    flan-t5 in this process. Answers and streams both go through the
+    GenerationService, so they share its queue limit; streams are generated
+    one at a time with a TextIteratorStreamer.
+    """
+
+    name = "hf"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._service: GenerationService | None = None
+
+    @property
+    def generator(self):
+        return models.get("generator")
+
+    @property
+    def service(self) -> GenerationService:
+        with self._lock:
+            if self._service is None:
+                generator = self.generator
+                self._service = GenerationService(generator.tokenizer, generator.model)
+            return self._service
+
+    def submit(self, prompt: str) -> Future:
+        return self.service.submit(prompt)
+
+    def stream(self, prompt: str):
+        """
+        Queue a streamed prompt now (raising GenerationQueueFullError if the
+        queue is full) and return an iterator over its pieces.
+        """
+        from transformers import TextIteratorStreamer
+
+        streamer = TextIteratorStreamer(self.generator.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        future = self.service.submit(prompt, streamer)
+
+        def pieces():
+            yield from streamer
+            future.result()  # Raises if generation failed
+
+        return pieces()
+
+    def stats(self) -> dict:
+        if self._service is None:
+            return {"backend": self.name, "runtime": GENERATE_RUNTIME, "loaded": False}
+        return {"backend": self.name, "runtime": GENERATE_RUNTIME, "loaded": True, **self._service.stats()}
+
+    def close(self):
+        pass
+
+
+class HTTPGeneratorBackend:
+    """
+    A local LLM server (POST {url}/generate with prompt, model and max_tokens,
+    answering {"response": ...}; with "stream": true, one such JSON object per line).
+    Requests share one keep-alive connection pool on a private event loop thread,
+    so sync and async callers alike reuse connections. At most max_connections
+    requests are in flight; connection errors and 5xx answers are retried.
+    """
+
+    name = "http"
+
+    def __init__(self, url: str = LLM_SERVER_URL, model: str = LLM_MODEL, timeout: float = LLM_TIMEOUT,
+                 max_connections: int = LLM_MAX_CONNECTIONS, retries: int = LLM_RETRIES,
+                 max_new_tokens: int = GENERATE_MAX_NEW_TOKENS):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.retries = retries
+        self.max_new_tokens = max_new_tokens
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                self._client = httpx.AsyncClient(
+                    base_url=self.url,
+                    timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                )
+                self._slots = asyncio.Semaphore(self.max_connections)
+                self._loop = loop
+            return self._loop
+
+    def _payload(self, prompt: str, stream: bool) -> dict:
+        return {"prompt": prompt, "model": self.model, "max_tokens": self.max_new_tokens, "stream": stream}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    async def _backoff(self, attempt: int):
+        self._count(retried=1)
+        await asyncio.sleep(LLM_RETRY_BACKOFF * 2 ** attempt)
+
+    async def _generate(self, prompt: str) -> str:
+        async with self._slots:
+            self._count(requests=1, in_flight=1)
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        response = await self._client.post("/generate", json=self._payload(prompt, False))
+                        if response.status_code < 500 or attempt == self.retries:
+                            response.raise_for_status()
+                            return response.json().get("response", "")
+                    except httpx.TransportError:
+                        if attempt == self.retries:
+                            raise
+                    await self._backoff(attempt)
+            except Exception:
+                self._count(failed=1)
+                raise
+            finally:
+                self._count(in_flight=-1)
+
+    async def _stream(self, prompt: str, pieces: queue.Queue):
+        yielded = False
+        async with self._slots:
+            self._count(requests=1, in_flight=1)
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        async with self._client.stream("POST", "/generate", json=self._payload(prompt, True)) as response:
+                            if response.status_code < 500 or attempt == self.retries:
+                                response.raise_for_status()
+                                async for line in response.aiter_lines():
+                                    if not line.strip():
+                                        continue
+                                    data = json.loads(line)
+                                    if data.get("response"):
+                                        yielded = True
+                                        pieces.put(data["response"])
+                                    if data.get("done"):
+                                        break
+                                return
+                    except httpx.TransportError:
+                        # Text already sent to the client can't be taken back
+                        if yielded or attempt == self.retries:
+                            raise
+                    await self._backoff(attempt)
+            except Exception:
+                self._count(failed=1)
+                raise
+            finally:
+                self._count(in_flight=-1)
+
+    def submit(self, prompt: str) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._generate(prompt), self._get_loop())
+
+    def stream(self, prompt: str):
+        pieces: queue.Queue = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._stream(prompt, pieces), self._get_loop())
+        future.add_done_callback(lambda _: pieces.put(None))
+        try:
+            while (piece := pieces.get()) is not None:
+                yield piece
+            future.result()
+        finally:
+            future.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "url": self.url,
+                "max_connections": self.max_connections,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "retried": self.retried,
+                "failed": self.failed,
+            }
+
+    def close(self):
+        with self._lock:
+            loop, client, self._loop, self._client = self._loop, self._client, None, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+
+
+def load_hf_generator(runtime: str = GENERATE_RUNTIME):
+    import torch
+    from transformers import AutoTokenizer, pipeline
+
+    # Load HF language model (replace with larger model later)
+    if runtime == "torch":
+        return pipeline("text2text-generation", model=GENERATOR_MODEL, device=0 if torch.cuda.is_available() else -1)
+
+    tokenizer = AutoTokenizer.from_pretrained(GENERATOR_MODEL)
+    if runtime == "int8":
+        from transformers import AutoModelForSeq2SeqLM
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(GENERATOR_MODEL).eval()
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif runtime == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        # Exporting takes a while, so the exported model is kept for the next start
+        path = os.path.join(ONNX_CACHE_DIR, GENERATOR_MODEL.replace("/", "_"))
+        if os.path.isdir(path):
+            model = ORTModelForSeq2SeqLM.from_pretrained(path)
+        else:
+            model = ORTModelForSeq2SeqLM.from_pretrained(GENERATOR_MODEL, export=True)
+            model.save_pretrained(path)
+    else:
+        raise ValueError(f"Unknown GENERATE_RUNTIME {runtime!r}, expected one of {GENERATE_RUNTIMES}")
+    return pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+
+
+def create_generator_backend(kind: str = GENERATOR_BACKEND):
+    if kind == "hf":
+        if GENERATE_RUNTIME not in GENERATE_RUNTIMES:
+            raise ValueError(f"Unknown GENERATE_RUNTIME {GENERATE_RUNTIME!r}, expected one of {GENERATE_RUNTIMES}")
+        models.register("generator", load_hf_generator)
+        return HFGeneratorBackend()
+    if kind == "http":
+        return HTTPGeneratorBackend()
+    raise ValueError(f"Unknown GENERATOR_BACKEND {kind!r}, expected 'hf' or 'http'")
+
+
+generator_backend = create_generator_backend()
+
+
+def retrieve(vector_store: TranscriptVectorStore, question: str, top_k: int = 3, query_embedding=None,
+             session_id: str | None = None) -> list[dict]:
+    """
+    Embed question (unless already embedded) and return the top chunk hits with their metadata,
+    only from session_id's chunks if given (to answer a session from its user's store).
+    """
+    if query_embedding is None:
+        query_embedding = embed_query(question)
+    return vector_store.search_hits(query_embedding, top_k=top_k, session_id=session_id)
+
+
+def build_context(vector_store: TranscriptVectorStore, question: str, top_k: int = 3, query_embedding=None) -> str:
     """
     Embed question, search top chunks, and return context string.
     """
-    query_embedding = embedder.encode([question])[0]
-    top_chunks = vector_store.search(query_embedding, top_k=top_k)
-    context = "\n".join([chunk for chunk, _ in top_chunks])
-    return context
+    return "\n".join(hit["chunk"] for hit in retrieve(vector_store, question, top_k, query_embedding))
+
+
+def prompt_from_hits(question: str, hits: list[dict]) -> str:
+    context = "\n".join(hit["chunk"] for hit in hits)
+    return f"Answer the question based on the context.\n\nContext:\n{context}\n\nQuestion: {question}"
+
+
+def build_prompt(vector_store: TranscriptVectorStore, question: str, query_embedding=None) -> str:
+    return prompt_from_hits(question, retrieve(vector_store, question, query_embedding=query_embedding))
+
+
+def sources_from_hits(hits: list[dict]) -> list[dict]:
+    """
+    Where the retrieved context came from: transcript id and, for transcribed
+    recordings, the time range of the chunk in seconds.
+    """
+    return [
+        {
+            "transcript_id": hit["transcript_id"],
+            "score": round(hit["score"], 4),
+            "start_time": hit.get("start_time"),
+            "end_time": hit.get("end_time"),
+        }
+        for hit in hits
+    ]
+
+
+def prepare_answer(question: str, vector_store: TranscriptVectorStore, scope: str | None = None,
+                   session_id: str | None = None) -> dict:
+    """
+    Everything before generation: embed the question, then either find a cached
+    answer for the scope at the store's current version or retrieve context and
+    build the prompt. session_id limits retrieval to that session's chunks.
+    """
+    started = time.perf_counter()
+    with span("embed"):
+        query_embedding = embed_query(question)
+    with span("cache"):
+        version = vector_store.content_version() if scope is not None else None
+        cached = answer_cache.lookup(scope, version, question, query_embedding) if scope is not None else None
+    prepared = {
+        "question": question,
+        "scope": scope,
+        "version": version,
+        "query_embedding": query_embedding,
+        "cached": cached,
+        "prompt": None,
+        "sources": cached["sources"] if cached is not None else [],
+        "started": started,
+    }
+    if cached is None:
+        with span("search"):
+            hits = retrieve(vector_store, question, query_embedding=query_embedding, session_id=session_id)
+        prepared["prompt"] = prompt_from_hits(question, hits)
+        prepared["sources"] = sources_from_hits(hits)
+    return prepared
+
 
+def remember_answer(prepared: dict, answer: str):
+    if prepared["scope"] is not None and answer:
+        cost_ms = (time.perf_counter() - prepared["started"]) * 1000
+        result = {"response": answer, "sources": prepared["sources"]}
+        answer_cache.store(prepared["scope"], prepared["version"], prepared["question"], prepared["query_embedding"], result, cost_ms)
 
-def answer_question(question: str, vector_store: TranscriptVectorStore) -> str:
+
+def answer_question(question: str, vector_store: TranscriptVectorStore, scope: str | None = None) -> str:
     """
-    Build context and run local HF generation.
+    Build context and generate with the configured backend; concurrent questions share one model batch.
+    With a scope, repeated questions are answered from the answer cache.
     """
-    context = build_context(vector_store, question)
-    prompt = f"Answer the question based on the context.\n\nContext:\n{context}\n\nQuestion: {question}"
+    prepared = prepare_answer(question, vector_store, scope)
+    if prepared["cached"] is not None:
+        return prepared["cached"]["response"]
 
     try:
-        response = generator(prompt, max_new_tokens=256)
-        return response[0]["generated_text"].strip()
+        with span("generate"):
+            answer = generator_backend.submit(prepared["prompt"]).result().strip()
+    except GenerationQueueFullError:
+        raise
     except Exception as e:
         return f"[Generation error] {e}"
+    remember_answer(prepared, answer)
+    return answer
+
+
+async def answer_question_async(question: str, vector_store: TranscriptVectorStore, scope: str | None = None,
+                                session_id: str | None = None) -> dict:
+    """
+    answer_question for async endpoints: retrieval runs in a worker thread and the
+    generation result is awaited without holding a thread while it waits for its batch.
+    Returns the answer as "response" with the "sources" of its context.
+    """
+    prepared = await asyncio.to_thread(prepare_answer, question, vector_store, scope, session_id)
+    if prepared["cached"] is not None:
+        return prepared["cached"]
+
+    try:
+        with span("generate"):
+            answer = (await asyncio.wrap_future(generator_backend.submit(prepared["prompt"]))).strip()
+    except GenerationQueueFullError:
+        raise
+    except Exception as e:
+        return {"response": f"[Generation error] {e}", "sources": prepared["sources"]}
+    remember_answer(prepared, answer)
+    return {"response": answer, "sources": prepared["sources"]}
+
+
+def stream_prepared(prepared: dict):
+    """
+    Iterator over the answer to a prepared question, piece by piece as tokens are
+    decoded; a cached answer comes in one piece. The hf backend queues the prompt
+    right away, so GenerationQueueFullError is raised here, not while iterating.
+    """
+    if prepared["cached"] is not None:
+        return iter([prepared["cached"]["response"]])
+
+    def remembered(stream):
+        pieces = []
+        for piece in stream:
+            pieces.append(piece)
+            yield piece
+        remember_answer(prepared, "".join(pieces).strip())
+
+    return remembered(generator_backend.stream(prepared["prompt"]))
+
+
+def stream_answer(question: str, vector_store: TranscriptVectorStore, scope: str | None = None):
+    """
+    Like answer_question, but yields the answer text piece by piece as tokens are decoded.
+    """
+    yield from stream_prepared(prepare_answer(question, vector_store, scope))
 
 
 # 🧪 Optional test block
@@ -0,0 +1,103 @@
+# Step 7: in-process LRU cache of hot session vector stores, bounded by memory
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.rag.vector_store import TranscriptVectorStore
+
+STORE_CACHE_MAX_BYTES = int(os.getenv("STORE_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+# Entries are checked against a fingerprint of their transcripts on every get, and
+# also expire, so a store is reloaded from storage now and then
+STORE_CACHE_TTL = float(os.getenv("STORE_CACHE_TTL", "300"))
+
+
+class VectorStoreCache:
+    """
+    LRU of TranscriptVectorStore objects keyed by session id, evicting by total bytes
+    (index vectors plus chunk text) instead of entry count.
+    """
+
+    def __init__(self, max_bytes: int = STORE_CACHE_MAX_BYTES, ttl: float = STORE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[str, TranscriptVectorStore, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, session_id: str, fingerprint: str) -> TranscriptVectorStore | None:
+        """
+        Cached store of a session, if it was built from transcripts with this
+        fingerprint (transcripts_fingerprint). Transcripts saved by another
+        worker change the fingerprint, so a stale store is dropped here.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                cached_fingerprint, store, size, added = entry
+                if cached_fingerprint != fingerprint or time.monotonic() - added > self.ttl:
+                    self._drop(session_id)
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return store
+
+    def contains(self, session_id: str) -> bool:
+        """
+        True if the session's store is cached and not expired; not counted as a lookup.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry is not None and time.monotonic() - entry[3] <= self.ttl
+
+    def put(self, session_id: str, fingerprint: str, store: TranscriptVectorStore):
+        size = store.nbytes()
+        with self._lock:
+            if session_id in self._entries:
+                self._drop(session_id)
+            if size > self.max_bytes:
+                return
+
+            self._entries[session_id] = (fingerprint, store, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            if session_id in self._entries:
+                self._drop(session_id)
+                self.invalidations += 1
+
+    def _drop(self, session_id: str):
+        _, _, size, _ = self._entries.pop(session_id)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+session_stores = VectorStoreCache()
@@ -1,36 +1,260 @@
 # Step 3: FAISS logic
 
+import hashlib
+import json
+import os
 import faiss
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Index type chosen by corpus size when index_type="auto":
+#   up to FLAT_MAX_VECTORS            exact IndexFlatIP
+#   larger                            IVF-Flat, nprobe tuned to TARGET_RECALL
+#   larger than INDEX_MEMORY_BUDGET   IVF-PQ (compressed codes)
+FLAT_MAX_VECTORS = int(os.getenv("VECTOR_INDEX_FLAT_MAX", "20000"))
+INDEX_MEMORY_BUDGET = int(os.getenv("VECTOR_INDEX_MEMORY_BUDGET", str(256 * 1024 ** 2)))
+TARGET_RECALL = float(os.getenv("VECTOR_INDEX_TARGET_RECALL", "0.95"))
+MIN_TRAIN_VECTORS = {"ivf": 1000, "ivfpq": 10000}  # Below this an IVF index cannot be trained well
+RETRAIN_GROWTH = 4  # Retrain once the corpus has grown this many times past the training set
+MAX_TRAIN_VECTORS = 50000
+TUNE_QUERIES = 200
 
 
 class TranscriptVectorStore:
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, index_type: str = "auto"):
         self.dim = dim
-        self.index = faiss.IndexFlatL2(dim)  # L2 = Euclidean distance
-        self.chunks: List[str] = []  # Store the original text chunks in parallel
+        self.index_type = index_type  # "auto", "flat", "ivf" or "ivfpq"
+        self.kind = "flat"  # Type of the current index
+        self.index = self._new_flat()
+        self.trained_size = 0  # Vectors the current IVF index was trained on
+        self.next_id = 0
+        self.chunks: Sequence[str] = []  # Store the original text chunks in parallel
+        self.chunk_ids: List[int] = []  # FAISS id of each chunk, in parallel
+        self.chunk_doc_ids: List[Optional[str]] = []  # Transcript id of each chunk, in parallel
+        self.chunk_meta: List[Optional[dict]] = []  # session_id, user_id, char offsets of each chunk, in parallel
+        self.doc_versions: Dict[str, str] = {}  # Transcript id -> version it was embedded from
+        self._positions: Optional[Dict[int, int]] = None  # FAISS id -> chunk position
+        self._session_ids: Optional[Dict[str, np.ndarray]] = None  # session id -> FAISS ids of its chunks
+
+    def _new_flat(self):
+        # Vectors are L2-normalized, so inner product is cosine similarity
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    def _choose_kind(self, n: int) -> str:
+        kind = self.index_type
+        if kind == "auto":
+            if n <= FLAT_MAX_VECTORS:
+                return "flat"
+            kind = "ivfpq" if n * self.dim * 4 > INDEX_MEMORY_BUDGET else "ivf"
+        if kind != "flat" and n < MIN_TRAIN_VECTORS[kind]:
+            return "flat"
+        return kind
+
+    def _build(self, kind: str, vectors: np.ndarray, ids: np.ndarray):
+        """
+        Replace the index with a new one of the given type holding vectors,
+        training and tuning it first if it is an IVF index.
+        """
+        n = len(vectors)
+        if kind == "flat":
+            index = self._new_flat()
+            index.add_with_ids(vectors, ids)
+        else:
+            nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            if kind == "ivf":
+                index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                m = max(d for d in range(1, self.dim // 8 + 1) if self.dim % d == 0)
+                index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(n, min(n, MAX_TRAIN_VECTORS), replace=False)]
+            index.train(sample)
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)  # Enables remove_ids and reconstruct by id
+            index.add_with_ids(vectors, ids)
+            index.nprobe = self._tune_nprobe(index, vectors, ids)
+
+        self.index = index
+        self.kind = kind
+        self.trained_size = n if kind != "flat" else 0
+
+    @staticmethod
+    def _tune_nprobe(index, vectors: np.ndarray, ids: np.ndarray, k: int = 10) -> int:
+        """
+        Smallest nprobe whose recall@k against exact search reaches TARGET_RECALL,
+        or where more probes stop helping (PQ codes cap the reachable recall).
+        """
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(len(vectors), min(len(vectors), TUNE_QUERIES), replace=False)]
+        k = min(k, len(vectors))
+        _, truth = faiss.knn(queries, vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
+        truth = [set(ids[row]) for row in truth]
+
+        best_recall, nprobe = 0.0, 1
+        while nprobe <= index.nlist:
+            index.nprobe = nprobe
+            _, found = index.search(queries, k)
+            recall = np.mean([len(t.intersection(f)) / k for t, f in zip(truth, found)])
+            if recall >= TARGET_RECALL or recall - best_recall < 0.005:
+                return nprobe
+            best_recall = recall
+            nprobe *= 2
+        return index.nlist
+
+    def _normalize(self, embeddings) -> np.ndarray:
+        vectors = np.array(embeddings, dtype="float32").reshape(-1, self.dim)  # Copy, normalized in place
+        faiss.normalize_L2(vectors)
+        return vectors
 
-    def add_embeddings(self, embeddings: List[List[float]], chunks: List[str]):
+    def _all_vectors(self) -> np.ndarray:
+        return self.index.reconstruct_batch(np.array(self.chunk_ids, dtype="int64"))
+
+    def add_embeddings(
+        self,
+        embeddings: List[List[float]],
+        chunks: List[str],
+        doc_id: Optional[str] = None,
+        version: str = "",
+        metadata: Optional[List[dict]] = None,
+    ):
         """
         Add embeddings and their corresponding text chunks to the index.
+        When doc_id is given, the chunks are recorded as belonging to that transcript.
+        metadata holds one dict per chunk (session_id, user_id, char offsets) for filtered search.
+        The index is rebuilt as another type when the corpus outgrows the current one.
         """
-        np_embeddings = np.array(embeddings).astype("float32")
-        self.index.add(np_embeddings)
+        vectors = self._normalize(embeddings)
+        ids = np.arange(self.next_id, self.next_id + len(vectors), dtype="int64")
+
+        if len(vectors):
+            total = self.index.ntotal + len(vectors)
+            kind = self._choose_kind(total)
+            if kind != self.kind or (kind != "flat" and total > RETRAIN_GROWTH * self.trained_size):
+                existing = self._all_vectors() if self.chunk_ids else np.zeros((0, self.dim), dtype="float32")
+                self._build(
+                    kind,
+                    np.concatenate([existing, vectors]),
+                    np.concatenate([np.array(self.chunk_ids, dtype="int64"), ids]),
+                )
+            else:
+                self.index.add_with_ids(vectors, ids)
+
+        self.next_id += len(vectors)
+        if not isinstance(self.chunks, list):
+            self.chunks = list(self.chunks)  # Memory-mapped chunks are read-only
         self.chunks.extend(chunks)
+        self.chunk_ids.extend(ids.tolist())
+        self.chunk_doc_ids.extend([doc_id] * len(chunks))
+        self.chunk_meta.extend(metadata if metadata is not None else [None] * len(chunks))
+        self._positions = None
+        self._session_ids = None
+        if doc_id is not None:
+            self.doc_versions[doc_id] = version
+
+    def has_document(self, doc_id: str, version: str = "") -> bool:
+        """
+        True if the transcript is already indexed at the given version.
+        """
+        return self.doc_versions.get(doc_id) == version
+
+    def content_version(self) -> str:
+        """
+        Digest of what the store holds; changes whenever chunks are added or transcripts removed.
+        """
+        state = json.dumps([self.next_id, sorted(self.doc_versions.items())])
+        return hashlib.sha1(state.encode()).hexdigest()[:16]
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        Drop every vector and chunk that belongs to the given transcripts.
+        Returns the number of chunks removed.
+        """
+        doc_ids = set(doc_ids)
+        if not doc_ids:
+            return 0
+
+        positions = [i for i, d in enumerate(self.chunk_doc_ids) if d in doc_ids]
+        if positions:
+            self.index.remove_ids(np.array([self.chunk_ids[i] for i in positions], dtype="int64"))
+            keep = [i for i, d in enumerate(self.chunk_doc_ids) if d not in doc_ids]
+            self.chunks = [self.chunks[i] for i in keep]
+            self.chunk_ids = [self.chunk_ids[i] for i in keep]
+            self.chunk_doc_ids = [self.chunk_doc_ids[i] for i in keep]
+            self.chunk_meta = [self.chunk_meta[i] for i in keep]
+            self._positions = None
+            self._session_ids = None
+
+        for doc_id in doc_ids:
+            self.doc_versions.pop(doc_id, None)
+        return len(positions)
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the index vectors and chunk texts.
+        """
+        chunk_bytes = self.chunks.nbytes() if hasattr(self.chunks, "nbytes") else sum(len(c) for c in self.chunks)
+        code_size = self.index.code_size if self.kind != "flat" else self.dim * 4
+        return self.index.ntotal * (code_size + 8) + chunk_bytes
+
+    def _session_chunk_ids(self) -> Dict[str, np.ndarray]:
+        if self._session_ids is None:
+            by_session: Dict[str, List[int]] = {}
+            for chunk_id, meta in zip(self.chunk_ids, self.chunk_meta):
+                if meta and meta.get("session_id"):
+                    by_session.setdefault(meta["session_id"], []).append(chunk_id)
+            self._session_ids = {sid: np.array(ids, dtype="int64") for sid, ids in by_session.items()}
+        return self._session_ids
+
+    def has_session(self, session_id: str) -> bool:
+        """
+        True if the store holds chunks of the session (a user store can then answer it with search_hits(session_id=...)).
+        """
+        return session_id in self._session_chunk_ids()
 
     def search(self, query_embedding: List[float], top_k: int = 3) -> List[Tuple[str, float]]:
         """
-        Return top_k = 3 most similar chunks to the query embedding.
+        Return top_k = 3 most similar chunks to the query embedding, with their cosine similarity.
         """
-        query_vector = np.array([query_embedding]).astype("float32")
-        distances, indices = self.index.search(query_vector, top_k)
+        return [(hit["chunk"], hit["score"]) for hit in self.search_hits(query_embedding, top_k)]
+
+    def search_hits(self, query_embedding: List[float], top_k: int = 3, session_id: Optional[str] = None) -> List[dict]:
+        """
+        Like search, but each hit also carries its transcript id and metadata.
+        With session_id only that session's chunks are considered; the filter is
+        applied inside FAISS, so IVF indexes still scan only the probed lists.
+        """
+        if self.index.ntotal == 0:
+            return []
+
+        query_vector = self._normalize([query_embedding])
+        if session_id is None:
+            scores, ids = self.index.search(query_vector, top_k)
+        else:
+            allowed = self._session_chunk_ids().get(session_id)
+            if allowed is None:
+                return []
+            selector = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+            if self.kind == "flat":
+                params = faiss.SearchParameters(sel=selector)
+            else:
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe)
+            scores, ids = self.index.search(query_vector, top_k, params=params)
+
+        if self._positions is None:
+            self._positions = {chunk_id: i for i, chunk_id in enumerate(self.chunk_ids)}
 
-        results = []
-        for i, dist in zip(indices[0], distances[0]):
-            if i < len(self.chunks):
-                results.append((self.chunks[i], float(dist)))
-        return results
+        hits = []
+        for chunk_id, score in zip(ids[0], scores[0]):
+            i = self._positions.get(int(chunk_id))
+            if i is not None:
+                hits.append({
+                    "chunk": self.chunks[i],
+                    "score": float(score),
+                    "transcript_id": self.chunk_doc_ids[i],
+                    **(self.chunk_meta[i] or {}),
+                })
+        return hits
 
 
 # 🔍 Optional test
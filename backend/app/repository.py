@@ -0,0 +1,102 @@
+# Appwrite calls off the event loop
+#
+# The Appwrite SDK is synchronous, so calling it inline from an async endpoint
+# blocks every other request for the whole HTTP round trip. Async endpoints run
+# their Appwrite calls through run(), on a pool as large as the SDK's connection
+# pool, and can issue independent calls concurrently with asyncio.gather. Writes
+# a response does not depend on (the assistant message /talk stores) go to
+# write_behind() and complete after the response has been sent. All of them run
+# in a copy of the caller's context, so timing spans keep their request.
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.appwrite_client import APPWRITE_POOL_SIZE
+
+APPWRITE_WRITE_WORKERS = int(os.getenv("APPWRITE_WRITE_WORKERS", "4"))
+
+# Writes have their own threads so a backlog of them never delays reads
+_calls = ThreadPoolExecutor(max_workers=APPWRITE_POOL_SIZE, thread_name_prefix="appwrite")
+_writes = ThreadPoolExecutor(max_workers=APPWRITE_WRITE_WORKERS, thread_name_prefix="appwrite-write")
+_lock = threading.Lock()
+_in_flight = 0
+_pending_writes = 0
+_calls_done = 0
+_writes_done = 0
+_write_failures = 0
+
+
+def _call(fn, args, kwargs):
+    global _in_flight, _calls_done
+    with _lock:
+        _in_flight += 1
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        with _lock:
+            _in_flight -= 1
+            _calls_done += 1
+
+
+async def run(fn, *args, **kwargs):
+    """
+    Await a blocking Appwrite call (or a function making several) run on the pool.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_calls, functools.partial(context.run, _call, fn, args, kwargs))
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    """
+    Start a blocking Appwrite call on the pool from synchronous code.
+    """
+    return _calls.submit(contextvars.copy_context().run, _call, fn, args, kwargs)
+
+
+def _write(fn, args, kwargs):
+    global _pending_writes, _writes_done, _write_failures
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        print(f"[Repository] Background write {fn.__name__} failed: {e}")
+        with _lock:
+            _write_failures += 1
+    finally:
+        with _lock:
+            _pending_writes -= 1
+            _writes_done += 1
+
+
+def write_behind(fn, *args, **kwargs) -> Future:
+    """
+    Run a non-critical write in the background; failures are logged, not raised.
+    """
+    global _pending_writes
+    with _lock:
+        _pending_writes += 1
+    return _writes.submit(contextvars.copy_context().run, _write, fn, args, kwargs)
+
+
+def shutdown():
+    """
+    Finish queued background writes before the process exits.
+    """
+    _writes.shutdown(wait=True)
+    _calls.shutdown(wait=False)
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "pool_size": APPWRITE_POOL_SIZE,
+            "in_flight": _in_flight,
+            "calls": _calls_done,
+            "pending_writes": _pending_writes,
+            "writes": _writes_done,
+            "write_failures": _write_failures,
+        }
@@ -0,0 +1,121 @@
+# Whisper segments of a transcript, stored column by column in a storage file
+# whose id is the transcript id:
+#   header            magic "SSEG", format version, segment count n
+#   float32[n]        start time of each segment, seconds
+#   float32[n]        end time of each segment, seconds
+#   uint32[n]         end offset of each segment's text in the text blob
+#   utf-8             the segment texts, concatenated
+# Time lookups are binary searches over the time columns, and a time slice
+# decodes only its own text, so a long recording never has to be parsed whole.
+
+import os
+import struct
+import tempfile
+
+import numpy as np
+from appwrite.exception import AppwriteException
+from appwrite.input_file import InputFile
+
+from app import disk_cache
+from app.appwrite_client import storage
+
+# Local copies of downloaded segment files
+SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smartscribe_segments"))
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHI")
+MAGIC = b"SSEG"
+
+
+def segments_bucket() -> str:
+    return os.getenv("APPWRITE_SEGMENTS_BUCKET_ID") or os.getenv("APPWRITE_BUCKET_ID")
+
+
+def encode_segments(segments: list[dict]) -> bytes:
+    texts = [seg["text"].encode("utf-8") for seg in segments]
+    starts = np.array([seg["start"] for seg in segments], dtype="<f4")
+    ends = np.array([seg["end"] for seg in segments], dtype="<f4")
+    offsets = np.cumsum([len(t) for t in texts], dtype="<u4") if texts else np.zeros(0, dtype="<u4")
+    return b"".join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, len(segments)),
+        starts.tobytes(),
+        ends.tobytes(),
+        offsets.astype("<u4").tobytes(),
+        b"".join(texts),
+    ])
+
+
+class SegmentColumns:
+    """
+    Read-only view of encoded segments; the columns are numpy views of the bytes.
+    """
+
+    def __init__(self, data: bytes):
+        magic, version, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported segments file (magic {magic!r}, version {version})")
+        pos = HEADER.size
+        self.starts = np.frombuffer(data, dtype="<f4", count=count, offset=pos)
+        self.ends = np.frombuffer(data, dtype="<f4", count=count, offset=pos + 4 * count)
+        self.offsets = np.frombuffer(data, dtype="<u4", count=count, offset=pos + 8 * count)
+        self._text = memoryview(data)[pos + 12 * count:]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _segment(self, i: int) -> dict:
+        begin = int(self.offsets[i - 1]) if i else 0
+        return {
+            "start": round(float(self.starts[i]), 2),
+            "end": round(float(self.ends[i]), 2),
+            "text": bytes(self._text[begin:int(self.offsets[i])]).decode("utf-8"),
+        }
+
+    def between(self, start_time: float | None = None, end_time: float | None = None) -> list[dict]:
+        """
+        Segments overlapping [start_time, end_time]; open ends mean the start or end of the recording.
+        """
+        first = 0 if start_time is None else int(np.searchsorted(self.ends, start_time, side="right"))
+        last = len(self) if end_time is None else int(np.searchsorted(self.starts, end_time, side="left"))
+        return [self._segment(i) for i in range(first, max(first, last))]
+
+    def to_list(self) -> list[dict]:
+        return self.between()
+
+
+def _cache_path(transcript_id: str) -> str:
+    return os.path.join(SEGMENT_CACHE_DIR, f"{transcript_id}.sseg")
+
+
+def _put_cached(transcript_id: str, data: bytes) -> str:
+    path = disk_cache.write(SEGMENT_CACHE_DIR, f"{transcript_id}.sseg", data)
+    disk_cache.evict(SEGMENT_CACHE_DIR, ".sseg", SEGMENT_CACHE_MAX_BYTES, keep=path)
+    return path
+
+
+def save_segments(transcript_id: str, segments: list[dict]):
+    data = encode_segments(segments)
+    storage.create_file(
+        bucket_id=segments_bucket(),
+        file_id=transcript_id,
+        file=InputFile.from_bytes(data, filename="segments.sseg")
+    )
+    _put_cached(transcript_id, data)
+
+
+def load_segments(transcript_id: str) -> SegmentColumns | None:
+    """
+    Segments of a transcript, or None if it has none (typed text, or saved before segments were kept).
+    """
+    path = _cache_path(transcript_id)
+    if not disk_cache.touch(path):
+        try:
+            data = storage.get_file_download(bucket_id=segments_bucket(), file_id=transcript_id)
+        except AppwriteException as e:
+            if e.code == 404:
+                return None
+            raise
+        path = _put_cached(transcript_id, data)
+    with open(path, "rb") as f:
+        return SegmentColumns(f.read())
@@ -0,0 +1,28 @@
+# Rolling latency percentiles over the most recent requests
+
+import threading
+from collections import deque
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, ms: float):
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+
+        return {"count": count, "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
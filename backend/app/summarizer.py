@@ -1,10 +1,40 @@
-import whisper
 import tempfile
 import yt_dlp
 import os
+import subprocess
+import threading
+import numpy as np
 
-# Load Whisper model once at startup
-model = whisper.load_model("base")  # You can use "tiny", "medium", "large" as needed
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")  # You can use "tiny", "medium", "large" as needed
+SAMPLE_RATE = 16000  # Whisper's input rate (whisper.audio.SAMPLE_RATE)
+_model = None
+_model_lock = threading.Lock()
+
+# Long recordings are cut at quiet points into spans of SPAN_SECONDS to MAX_SPAN_SECONDS.
+# Spans are transcribed independently (in parallel by the worker pool) and stitched in order.
+# Each span is decoded with OVERLAP_SECONDS of its neighbours on both sides, so a word a cut
+# lands in is heard whole, and is prompted with the end of the previous span's text when
+# that is already known.
+SPAN_SECONDS = float(os.getenv("TRANSCRIBE_SPAN_SECONDS", "60"))
+MAX_SPAN_SECONDS = float(os.getenv("TRANSCRIBE_MAX_SPAN_SECONDS", "90"))
+OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", "2"))
+PROMPT_CHARS = 200  # Previous text passed to Whisper as context for the next span
+FRAME_SAMPLES = 480  # 30 ms energy frames at 16 kHz
+SMOOTH_FRAMES = 10  # Average energy over 300 ms so a cut lands in a pause, not between syllables
+
+
+def get_model():
+    """
+    The Whisper model, loaded once per process on first use.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            # Imported here: whisper pulls in torch, and span finding does not need it
+            import whisper
+
+            _model = whisper.load_model(WHISPER_MODEL)
+        return _model
 
 
 def transcribe_file(file_bytes: bytes, filename: str) -> str:
@@ -17,36 +47,186 @@ def transcribe_file(file_bytes: bytes, filename: str) -> str:
         tmp_path = tmp.name
 
     try:
-        result = model.transcribe(tmp_path)
-        return result["text"]
+        return transcribe_path(tmp_path)
     finally:
         os.remove(tmp_path)
 
 
+def transcribe_path(path: str) -> str:
+    """
+    Transcribe an audio/video file already on disk using Whisper.
+    """
+    return "".join(segment["text"] for segment in transcribe_segments(path))
+
+
+def transcribe_segments(path: str):
+    """
+    Yield Whisper segments (start, end, text) span by span, in this process.
+    """
+    prompt = ""
+    for start, end in iter_speech_spans(path):
+        segments = transcribe_span(path, start, end, prompt)
+        prompt = next_prompt(prompt, segments)
+        yield from segments
+
+
+def _ffmpeg_pcm(path: str, start: float = 0.0, duration: float | None = None) -> list[str]:
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-ss", str(start)]
+    if duration is not None:
+        cmd += ["-t", str(duration)]
+    return cmd + [
+        "-i", path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "-",
+    ]
+
+
+def load_audio_window(path: str, start: float, duration: float) -> np.ndarray:
+    """
+    Decode only [start, start + duration) of a media file to 16 kHz mono float32.
+    """
+    try:
+        out = subprocess.run(_ffmpeg_pcm(path, start, duration), capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def iter_frame_energies(path: str):
+    """
+    Yield the RMS energy of every 30 ms frame, one block per 30 s of audio,
+    while ffmpeg streams the decoded audio.
+    """
+    proc = subprocess.Popen(_ffmpeg_pcm(path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    block_bytes = FRAME_SAMPLES * 2 * 1000  # 30 s of audio per read
+    leftover = b""
+    try:
+        while True:
+            block = proc.stdout.read(block_bytes)
+            if not block:
+                break
+            block = leftover + block
+            usable = len(block) - len(block) % (FRAME_SAMPLES * 2)
+            leftover = block[usable:]
+            samples = np.frombuffer(block[:usable], np.int16).astype(np.float32) / 32768.0
+            frames = samples.reshape(-1, FRAME_SAMPLES)
+            yield np.sqrt((frames ** 2).mean(axis=1))
+        if proc.wait() != 0:
+            raise RuntimeError(f"Failed to load audio: {path}")
+    finally:
+        # Stopped early: don't leave ffmpeg decoding the rest of the file
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+
+def _smoothed(energies: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    # Same values as smoothing the whole recording: each frame only averages its SMOOTH_FRAMES neighbours
+    a = max(0, lo - SMOOTH_FRAMES)
+    window = energies[a:hi + SMOOTH_FRAMES]
+    return np.convolve(window, np.ones(SMOOTH_FRAMES) / SMOOTH_FRAMES, mode="same")[lo - a:hi - a]
+
+
+def iter_speech_spans(path: str):
+    """
+    Split a recording into spans of SPAN_SECONDS to MAX_SPAN_SECONDS,
+    cutting each at the quietest point of that range. A cut only needs
+    MAX_SPAN_SECONDS of audio after the previous one, so spans are yielded
+    while the rest of the recording is still being decoded.
+    """
+    frame_seconds = FRAME_SAMPLES / SAMPLE_RATE
+    min_frames = int(SPAN_SECONDS / frame_seconds)
+    max_frames = int(MAX_SPAN_SECONDS / frame_seconds)
+
+    def cut_after(energies: np.ndarray, cut: int) -> int:
+        lo, hi = cut + min_frames, cut + max_frames
+        return lo + int(np.argmin(_smoothed(energies, lo, hi)))
+
+    def span(a: int, b: int) -> tuple[float, float]:
+        return round(a * frame_seconds, 2), round(b * frame_seconds, 2)
+
+    energies = np.zeros(0, dtype=np.float32)
+    base = 0  # Frame number of energies[0]; frames long before the last cut are dropped
+    cut = 0
+    for block in iter_frame_energies(path):
+        drop = max(0, cut - SMOOTH_FRAMES - base)
+        energies = np.concatenate([energies[drop:], block])
+        base += drop
+        # Cut once the whole search range and its smoothing window are decoded
+        while base + len(energies) - cut > max_frames + SMOOTH_FRAMES:
+            next_cut = base + cut_after(energies, cut - base)
+            yield span(cut, next_cut)
+            cut = next_cut
+
+    total = base + len(energies)
+    while total - cut > max_frames:
+        next_cut = base + cut_after(energies, cut - base)
+        yield span(cut, next_cut)
+        cut = next_cut
+    if total > cut:
+        yield span(cut, total)
+
+
+def transcribe_span(path: str, start: float, end: float, prompt: str = "") -> list[dict]:
+    """
+    Transcribe [start, end) of a recording; segment timestamps are absolute.
+    The overlap on either side is transcribed too, and a segment is kept by the
+    span its midpoint falls in, so neighbouring spans don't repeat it.
+    prompt is the text just before the span, if known.
+    """
+    offset = max(0.0, start - OVERLAP_SECONDS)
+    audio = load_audio_window(path, offset, end + OVERLAP_SECONDS - offset)
+    if len(audio) == 0:
+        return []
+
+    result = get_model().transcribe(audio, initial_prompt=prompt or None)
+    segments = []
+    for seg in result["segments"]:
+        seg_start, seg_end = offset + seg["start"], offset + seg["end"]
+        if start <= (seg_start + seg_end) / 2 < end:
+            segments.append({
+                "start": round(seg_start, 2),
+                "end": round(seg_end, 2),
+                "text": seg["text"],
+            })
+    return segments
+
+
+def next_prompt(prompt: str, segments: list[dict]) -> str:
+    return (prompt + "".join(seg["text"] for seg in segments))[-PROMPT_CHARS:]
+
+
+def download_youtube_audio(youtube_url: str, tmpdir: str) -> str:
+    """
+    Download best audio from YouTube as mp3 into tmpdir and return its path.
+    """
+    output_path = os.path.join(tmpdir, "audio.%(ext)s")
+    ydl_opts = {
+        "format": "bestaudio/best",
+        "outtmpl": output_path,
+        "quiet": True,
+        "postprocessors": [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "mp3",
+            "preferredquality": "192",
+        }],
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(youtube_url, download=True)
+        # FFmpeg postprocessor converts to .mp3
+        downloaded_audio_path = os.path.join(tmpdir, "audio.mp3")
+
+        if not os.path.exists(downloaded_audio_path):
+            raise FileNotFoundError("Audio download failed or file missing")
+
+    return downloaded_audio_path
+
+
 def transcribe_youtube(youtube_url: str) -> str:
     """
     Download best audio from YouTube and transcribe using Whisper.
     """
     with tempfile.TemporaryDirectory() as tmpdir:
-        output_path = os.path.join(tmpdir, "audio.%(ext)s")
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": output_path,
-            "quiet": True,
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }],
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_url, download=True)
-            # FFmpeg postprocessor converts to .mp3
-            downloaded_audio_path = os.path.join(tmpdir, "audio.mp3")
-
-            if not os.path.exists(downloaded_audio_path):
-                raise FileNotFoundError("Audio download failed or file missing")
-
-        result = model.transcribe(downloaded_audio_path)
-        return result["text"]
+        return transcribe_path(download_youtube_audio(youtube_url, tmpdir))
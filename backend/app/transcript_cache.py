@@ -0,0 +1,82 @@
+# Transcription result cache keyed by media identity and the Whisper settings used
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import yt_dlp
+
+from app import disk_cache
+
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smartscribe_transcripts"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+# Bump when the transcription output changes for the same settings
+CACHE_VERSION = 2  # 2: spans transcribed with overlap and the previous span as prompt
+# Settings that change Whisper's output; unset values mean the summarizer defaults
+OPTION_VARS = ("WHISPER_MODEL", "TRANSCRIBE_SPAN_SECONDS", "TRANSCRIBE_MAX_SPAN_SECONDS", "TRANSCRIBE_OVERLAP_SECONDS")
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+
+def cache_key(media_id: str) -> str:
+    options = {name: os.getenv(name) for name in OPTION_VARS}
+    raw = json.dumps([CACHE_VERSION, media_id, options], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def youtube_video_id(youtube_url: str) -> str:
+    """
+    Canonical id of a video, so different URLs of the same video share a cache entry.
+    """
+    from yt_dlp.extractor.youtube import YoutubeIE
+
+    if YoutubeIE.suitable(youtube_url):
+        return f"Youtube:{YoutubeIE._match_id(youtube_url)}"  # Parsed locally, no network
+
+    with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+        info = ydl.extract_info(youtube_url, download=False, process=False)
+    return f"{info.get('extractor_key', '')}:{info['id']}"
+
+
+def _path(key: str) -> str:
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.json")
+
+
+def contains(key: str) -> bool:
+    return os.path.exists(_path(key))
+
+
+def get(key: str) -> dict | None:
+    try:
+        with open(_path(key), encoding="utf-8") as f:
+            value = json.load(f)
+        os.utime(_path(key))  # Mark as recently used for eviction
+    except (FileNotFoundError, json.JSONDecodeError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return value
+
+
+def put(key: str, value: dict):
+    path = disk_cache.write(TRANSCRIPT_CACHE_DIR, f"{key}.json", json.dumps(value).encode("utf-8"))
+    evicted = disk_cache.evict(TRANSCRIPT_CACHE_DIR, ".json", TRANSCRIPT_CACHE_MAX_BYTES, keep=path)
+    with _lock:
+        _stats["evictions"] += evicted
+
+
+def record_coalesced():
+    with _lock:
+        _stats["coalesced"] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {**_stats, "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0}
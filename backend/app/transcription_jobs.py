@@ -0,0 +1,523 @@
+# Transcription job queue: Whisper runs in a bounded pool of worker processes
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Callable
+from uuid import uuid4
+
+from fastapi import UploadFile
+
+from app import transcript_cache
+
+# Number of Whisper worker processes, each holding its own model
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "1"))
+# Transcriptions allowed to wait for a free worker before new ones are rejected
+TRANSCRIBE_MAX_QUEUE = int(os.getenv("TRANSCRIBE_MAX_QUEUE", "8"))
+# Seconds a finished job stays pollable
+JOB_TTL = int(os.getenv("TRANSCRIBE_JOB_TTL", "3600"))
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the transcription queue is at its depth limit."""
+
+
+_executor: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+_active = 0  # transcriptions admitted and not finished yet
+_jobs: dict[str, dict] = {}
+# cache key -> running transcription: its task, the segments it has so far and the callers waiting on it
+_inflight: dict[str, dict] = {}
+_tasks: set[asyncio.Task] = set()  # running jobs; the event loop only keeps weak references
+
+
+def _init_worker():
+    # Load the Whisper model once per worker process, before its first span
+    from app import summarizer
+
+    summarizer.get_model()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _transcribe_span(path: str, start: float, end: float, prompt: str):
+    from app import summarizer
+
+    return summarizer.transcribe_span(path, start, end, prompt)
+
+
+def _download_youtube(youtube_url: str) -> str:
+    from app import summarizer
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        return summarizer.download_youtube_audio(youtube_url, tmpdir)
+    except Exception:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=TRANSCRIBE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    """
+    Drop a pool that broke (a worker was killed, e.g. out of memory, or failed to
+    load Whisper). A broken pool refuses all further work, so the next submit
+    starts a new one.
+    """
+    global _executor
+    with _lock:
+        if _executor is not broken:
+            return  # Already replaced
+        _executor = None
+    print("[Transcription] Worker pool broke, starting a new one")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(func, *args) -> Future:
+    """
+    Submit to the pool. Only the work in flight when the pool breaks fails with
+    BrokenProcessPool; the pool is replaced for later submits.
+    """
+    executor = _get_executor()
+    try:
+        future = executor.submit(func, *args)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        executor = _get_executor()
+        future = executor.submit(func, *args)
+
+    def check(f: Future):
+        if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+            _reset_executor(executor)
+
+    future.add_done_callback(check)
+    return future
+
+
+def warm_up():
+    """
+    Start every worker process now (each loads Whisper) instead of on the first transcription.
+    """
+    for future in [_submit(_ping) for _ in range(TRANSCRIBE_WORKERS)]:
+        future.result()
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def spool_upload(file: UploadFile) -> tuple[str, str]:
+    """
+    Copy an upload to a temp file the worker processes can read, one block at a
+    time so the whole recording is never held in memory.
+    Returns the file path and the SHA-256 of its bytes.
+    """
+    ext = os.path.splitext(file.filename or "")[-1]
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
+        while block := await file.read(SPOOL_BLOCK_SIZE):
+            digest.update(block)
+            tmp.write(block)
+        return tmp.name, digest.hexdigest()
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _acquire(cleanup: str | None = None):
+    """
+    Admit one transcription. cleanup is a spooled file removed if the queue is full.
+    """
+    global _active
+    with _lock:
+        full = _active >= TRANSCRIBE_WORKERS + TRANSCRIBE_MAX_QUEUE
+        if not full:
+            _active += 1
+    if full:
+        if cleanup:
+            _remove(cleanup)
+        raise QueueFullError("Transcription queue is full, try again later")
+
+
+def _release():
+    global _active
+    with _lock:
+        _active -= 1
+
+
+async def _run(func, *args):
+    return await asyncio.wrap_future(_submit(func, *args))
+
+
+async def _find_spans(path: str):
+    """
+    Yield the spans of a file as they are found. Span finding runs in a thread
+    (ffmpeg does the decoding), so the first span is ready after about
+    MAX_SPAN_SECONDS of audio is decoded instead of the whole file.
+    """
+    from app import summarizer
+
+    loop = asyncio.get_running_loop()
+    found: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def find():
+        spans = summarizer.iter_speech_spans(path)
+        try:
+            for span in spans:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(found.put_nowait, span)
+            loop.call_soon_threadsafe(found.put_nowait, None)
+        except Exception as e:
+            loop.call_soon_threadsafe(found.put_nowait, e)
+        finally:
+            spans.close()  # Stops ffmpeg if the caller went away
+
+    threading.Thread(target=find, name="span-finder", daemon=True).start()
+    try:
+        while (item := await found.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+async def _stream_spans(path: str, progress: dict | None = None):
+    """
+    Transcribe the spans of a file in parallel across the pool and yield their
+    segments in order, starting while later spans are still being found.
+    At most one span per worker is in flight for each file, so concurrent
+    files share the pool instead of queueing behind each other. A span is
+    prompted with the text before it when every earlier span is done (always
+    with one worker); otherwise it starts without waiting for them.
+    """
+    from app import summarizer
+
+    spans = _find_spans(path)
+    pending = deque()
+    if progress is not None:
+        progress.update(spans_total=0, spans_done=0)  # spans_total grows as spans are found
+        progress["_spans"] = pending  # For get_job to see when a worker has picked up a span; not reported
+    prompt = ""
+
+    async def submit_next() -> bool:
+        span = await anext(spans, None)
+        if span is None:
+            return False
+        pending.append(_submit(_transcribe_span, path, *span, "" if pending else prompt))
+        if progress is not None:
+            progress["spans_total"] += 1
+        return True
+
+    try:
+        while len(pending) < TRANSCRIBE_WORKERS and await submit_next():
+            pass
+
+        while pending:
+            segments = await asyncio.wrap_future(pending[0])
+            pending.popleft()
+            prompt = summarizer.next_prompt(prompt, segments)
+            await submit_next()
+            if progress is not None:
+                progress["spans_done"] += 1
+            for segment in segments:
+                yield segment
+    finally:
+        for future in pending:
+            future.cancel()
+        await spans.aclose()
+
+
+async def _media_segments(kind: str, source: str, progress: dict | None = None):
+    if kind == "file":
+        try:
+            async for segment in _stream_spans(source, progress):
+                yield segment
+        finally:
+            _remove(source)
+        return
+
+    path = await _run(_download_youtube, source)
+    try:
+        async for segment in _stream_spans(path, progress):
+            yield segment
+    finally:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+async def media_key(kind: str, source: str, digest: str | None = None) -> str:
+    """
+    Cache key of a spooled file (by the SHA-256 of its bytes) or a YouTube URL
+    (by its canonical video id).
+    """
+    if kind == "file":
+        return transcript_cache.cache_key(f"sha256:{digest}")
+    video_id = await asyncio.to_thread(transcript_cache.youtube_video_id, source)
+    return transcript_cache.cache_key(video_id)
+
+
+def _notify(entry: dict):
+    entry["changed"].set()
+    entry["changed"] = asyncio.Event()
+
+
+async def _produce(entry: dict, kind: str, source: str, key: str, progress: dict | None):
+    async for segment in _media_segments(kind, source, progress):
+        entry["segments"].append(segment)
+        _notify(entry)
+    await asyncio.to_thread(transcript_cache.put, key, {"segments": entry["segments"]})
+    return entry["segments"]
+
+
+def _start(kind: str, source: str, key: str, progress: dict | None = None) -> dict:
+    """
+    Run a transcription in its own task, shared by every caller asking for the
+    same media until it finishes. The caller's queue slot is handed over to it.
+    """
+    entry = {"task": None, "segments": [], "changed": asyncio.Event(), "waiters": 0}
+
+    def done(task: asyncio.Task):
+        if _inflight.get(key) is entry:
+            del _inflight[key]
+        if kind == "file":
+            _remove(source)  # Already removed unless the task was cancelled before it started
+        _release()
+        _notify(entry)
+
+    entry["task"] = asyncio.get_running_loop().create_task(_produce(entry, kind, source, key, progress))
+    entry["task"].add_done_callback(done)
+    _inflight[key] = entry
+    return entry
+
+
+async def _follow(entry: dict):
+    """
+    Yield the segments of a shared transcription as they are transcribed, from
+    the first one. The transcription is cancelled only when its last caller
+    goes away, so one caller disconnecting doesn't fail the others.
+    """
+    entry["waiters"] += 1
+    try:
+        sent = 0
+        while True:
+            changed = entry["changed"]
+            while sent < len(entry["segments"]):
+                yield entry["segments"][sent]
+                sent += 1
+            if entry["task"].done():
+                entry["task"].result()  # Re-raises its error
+                return
+            await changed.wait()
+    finally:
+        entry["waiters"] -= 1
+        if entry["waiters"] == 0 and not entry["task"].done():
+            entry["task"].cancel()
+
+
+def _join(kind: str, source: str, key: str, admitted: bool = False, progress: dict | None = None) -> list[dict] | dict:
+    """
+    Cached segments of a media source, or the running transcription of it to
+    follow (an identical one already running, or a new one). admitted means a
+    queue slot was already taken for this call; otherwise one is taken only if
+    Whisper has to run.
+    """
+    cleanup = source if kind == "file" else None
+    try:
+        cached = transcript_cache.get(key)
+        if cached is not None:
+            if cleanup:
+                _remove(cleanup)
+            return cached["segments"]
+
+        entry = _inflight.get(key)
+        if entry is not None:
+            if cleanup:
+                _remove(cleanup)
+            transcript_cache.record_coalesced()
+            return entry
+
+        if not admitted:
+            _acquire(cleanup=cleanup)
+        admitted = False  # The transcription releases the slot when it finishes
+        return _start(kind, source, key, progress)
+    finally:
+        if admitted:
+            _release()
+
+
+async def _transcribe_cached(kind: str, source: str, key: str, admitted: bool = False, progress: dict | None = None) -> list[dict]:
+    """
+    Segments of a media source from the cache, from an identical transcription
+    already running, or from a new one.
+    """
+    found = _join(kind, source, key, admitted, progress)
+    if isinstance(found, list):
+        return found
+    async with aclosing(_follow(found)) as segments:
+        return [segment async for segment in segments]
+
+
+async def transcribe_segments(kind: str, source: str, digest: str | None = None) -> list[dict]:
+    """
+    Transcribe a spooled file ("file") or a YouTube URL ("youtube") in the
+    worker pool without blocking the event loop, as Whisper segments
+    (start, end, text). Identical media is served from the transcript cache.
+    """
+    try:
+        key = await media_key(kind, source, digest)
+    except Exception:
+        if kind == "file":
+            _remove(source)
+        raise
+    return await _transcribe_cached(kind, source, key)
+
+
+async def transcribe(kind: str, source: str, digest: str | None = None) -> str:
+    """
+    Like transcribe_segments, but returns the transcript text.
+    """
+    segments = await transcribe_segments(kind, source, digest)
+    return "".join(seg["text"] for seg in segments)
+
+
+async def transcribe_stream(path: str, digest: str):
+    """
+    Yield segments of a spooled file as each span finishes. Uses the same spans
+    as transcribe(), so the joined text matches the batch result, and shares a
+    running transcription of the same file with them.
+    The file is removed afterwards.
+    """
+    key = await media_key("file", path, digest)
+    found = _join("file", path, key)
+    if isinstance(found, list):
+        for segment in found:
+            yield segment
+        return
+
+    async with aclosing(_follow(found)) as segments:
+        async for segment in segments:
+            yield segment
+
+
+def _prune_jobs():
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job["finished"] and now - job["finished"] > JOB_TTL:
+            del _jobs[job_id]
+
+
+async def _finish(job: dict, kind: str, source: str, key: str, admitted: bool, on_done: Callable[[list[dict]], dict]):
+    try:
+        segments = await _transcribe_cached(kind, source, key, admitted, job["progress"])
+        job["result"] = await asyncio.to_thread(on_done, segments)
+        job["status"] = COMPLETED
+    except Exception as e:
+        print(f"[Transcription] Job {job['id']} failed: {e}")
+        job["error"] = str(e)
+        job["status"] = FAILED
+    finally:
+        job["finished"] = time.time()
+
+
+async def start_job(kind: str, source: str, on_done: Callable[[list[dict]], dict], digest: str | None = None) -> str:
+    """
+    Queue a transcription and return its job id right away.
+    on_done receives the Whisper segments and returns the job result.
+    """
+    _prune_jobs()
+    try:
+        key = await media_key(kind, source, digest)
+    except Exception:
+        if kind == "file":
+            _remove(source)
+        raise
+
+    # Take the queue slot now so an overloaded pool rejects the request, not the job
+    admitted = not transcript_cache.contains(key) and key not in _inflight
+    if admitted:
+        _acquire(cleanup=source if kind == "file" else None)
+
+    job = {
+        "id": str(uuid4()),
+        "status": QUEUED,
+        "created_at": datetime.utcnow().isoformat(),
+        "submitted": time.time(),
+        "finished": None,
+        "progress": {},
+        "result": None,
+        "error": None,
+    }
+    _jobs[job["id"]] = job
+    task = asyncio.get_running_loop().create_task(_finish(job, kind, source, key, admitted, on_done))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job["id"]
+
+
+def get_job(job_id: str) -> dict | None:
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+
+    status = job["status"]
+    progress = dict(job["progress"])
+    spans = progress.pop("_spans", ())
+    # A span future is running once the pool has handed it to a worker
+    if status == QUEUED and (progress.get("spans_done") or any(f.running() or f.done() for f in list(spans))):
+        status = RUNNING
+
+    return {
+        "job_id": job["id"],
+        "status": status,
+        "created_at": job["created_at"],
+        "elapsed_seconds": round((job["finished"] or time.time()) - job["submitted"], 1),
+        "progress": progress,
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+
+def pool_stats() -> dict:
+    with _lock:
+        return {
+            "workers": TRANSCRIBE_WORKERS,
+            "max_queue": TRANSCRIBE_MAX_QUEUE,
+            "active": _active,
+        }
@@ -0,0 +1,180 @@
+# Appwrite data access against the fake Appwrite server in this directory:
+#   connection_reuse  sequential SDK calls, a new connection per call (the SDK's
+#                     default) versus the kept-alive pool of app.appwrite_client
+#   event_loop        concurrent async handlers calling the SDK inline versus
+#                     through app.repository.run
+#   talk_fetch        what /talk reads from Appwrite for a session that is not in
+#                     memory: transcripts, then embedding record and store file,
+#                     one after the other versus concurrently (load_scope_store)
+#
+# Run from backend/:
+#   python benchmarks/bench_appwrite.py --latency-ms 20 --concurrency 64
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def median(samples: list[float]) -> float:
+    return round(sorted(samples)[len(samples) // 2], 1)
+
+
+def seed_session(server, session_id: str, transcripts: int, chunks_per_transcript: int = 20):
+    """
+    Transcripts of a session plus an up-to-date vector store for them, built from random vectors.
+    """
+    import numpy as np
+    from app.rag.embedder import EMBEDDING_DIM
+    from app.rag.persistence import serialize_store
+    from app.rag.vector_store import TranscriptVectorStore
+
+    rng = np.random.default_rng(0)
+    store = TranscriptVectorStore(dim=EMBEDDING_DIM)
+    for i in range(transcripts):
+        doc = server.add_document(os.environ["APPWRITE_COLLECTION_ID"], f"t{i:04d}", {
+            "title": f"Lecture {i}",
+            "original_text": "Gradient descent minimizes the loss. " * 200,
+            "session_id": session_id,
+            "user_id": "bench-user",
+        })
+        store.add_embeddings(
+            rng.standard_normal((chunks_per_transcript, EMBEDDING_DIM)),
+            [f"Chunk {j} of lecture {i}" for j in range(chunks_per_transcript)],
+            doc_id=doc["$id"],
+            version=doc["$updatedAt"],
+        )
+    server.files[(os.environ["APPWRITE_BUCKET_ID"], "store-1")] = serialize_store(store)
+    server.add_document(os.environ["APPWRITE_EMBEDDING_COLLECTION_ID"], "e1", {
+        "session_id": session_id,
+        "vector_file_id": "store-1",
+        "number_of_transcripts": transcripts,
+    })
+
+
+def connection_reuse(server, calls: int) -> dict:
+    import appwrite.client
+    import requests
+    from app.appwrite_client import databases
+
+    pooled = appwrite.client.requests
+    results = {}
+    for name, transport in [("new_connection_per_call", requests), ("pooled", pooled)]:
+        appwrite.client.requests = transport
+        connections = server.connections
+        start = time.perf_counter()
+        for _ in range(calls):
+            databases.get_document(
+                database_id=os.environ["APPWRITE_DATABASE_ID"],
+                collection_id=os.environ["APPWRITE_EMBEDDING_COLLECTION_ID"],
+                document_id="e1",
+            )
+        results[name] = {
+            "ms_per_call": round((time.perf_counter() - start) * 1000 / calls, 2),
+            "connections_opened": server.connections - connections,
+        }
+    appwrite.client.requests = pooled
+    return results
+
+
+async def event_loop(concurrency: int) -> dict:
+    from app import repository
+    from app.appwrite_client import databases
+
+    def write(i: int):
+        return databases.create_document(
+            database_id=os.environ["APPWRITE_DATABASE_ID"],
+            collection_id=os.environ["APPWRITE_MESSAGES_COLLECTION_ID"],
+            document_id=f"m{time.perf_counter_ns()}-{i}",
+            data={"session_id": "s-bench", "sender": "user", "text": "hi"},
+        )
+
+    async def inline(i):
+        return write(i)
+
+    async def pooled(i):
+        return await repository.run(write, i)
+
+    results = {}
+    for name, handler in [("inline", inline), ("repository", pooled)]:
+        start = time.perf_counter()
+        await asyncio.gather(*[handler(i) for i in range(concurrency)])
+        results[name] = {"wall_ms": round((time.perf_counter() - start) * 1000, 1)}
+    return results
+
+
+async def talk_fetch(session_id: str, runs: int) -> dict:
+    from app.main import load_scope_store, open_scope_store
+    from app.ingest import get_scope_transcripts
+    from app.rag.persistence import CACHE_DIR
+    from app.rag.store_cache import session_stores
+
+    def cold():
+        session_stores.invalidate(session_id)
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    sequential, concurrent = [], []
+    for _ in range(runs):
+        cold()
+        start = time.perf_counter()
+        get_scope_transcripts(session_id)
+        open_scope_store(session_id)
+        sequential.append((time.perf_counter() - start) * 1000)
+
+        cold()
+        start = time.perf_counter()
+        await load_scope_store(session_id)
+        concurrent.append((time.perf_counter() - start) * 1000)
+    return {"sequential_ms": median(sequential), "concurrent_ms": median(concurrent)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay of every fake Appwrite response")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--transcripts", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from fake_appwrite import serve
+
+    server = serve(latency=args.latency_ms / 1000)
+    os.environ.update({
+        "APPWRITE_ENDPOINT": f"http://127.0.0.1:{server.server_port}/v1",
+        "APPWRITE_PROJECT_ID": "bench",
+        "APPWRITE_API_KEY": "bench",
+        "APPWRITE_DATABASE_ID": "db",
+        "APPWRITE_COLLECTION_ID": "transcripts",
+        "APPWRITE_EMBEDDING_COLLECTION_ID": "embeddings",
+        "APPWRITE_SESSION_COLLECTION_ID": "sessions",
+        "APPWRITE_MESSAGES_COLLECTION_ID": "messages",
+        "APPWRITE_BUCKET_ID": "files",
+        "VECTOR_CACHE_DIR": tempfile.mkdtemp(prefix="bench_appwrite_"),
+        "APP_ROLE": "all",
+        "MODEL_WARMUP": "",
+    })
+
+    from app import repository
+
+    seed_session(server, "s1", args.transcripts)
+    results = {
+        "latency_ms": args.latency_ms,
+        "connection_reuse": connection_reuse(server, args.calls),
+        "event_loop": asyncio.run(event_loop(args.concurrency)),
+        "talk_fetch": asyncio.run(talk_fetch("s1", args.runs)),
+        "repository": repository.stats(),
+    }
+    results["event_loop"]["concurrency"] = args.concurrency
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Chunk count, wasted tokens and embedding time of the token-aware chunker
+# compared with the previous 500-char / 100-overlap character chunker.
+#
+# Run from backend/ with transcript text files (a synthetic lecture is used if none given):
+#   python benchmarks/bench_chunker.py transcripts/*.txt
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LECTURE = (
+    "Welcome back to the course. Today we're going to talk about gradient descent, "
+    "which is how most neural networks are trained. The idea is simple: we compute the "
+    "gradient of the loss with respect to every weight, and then we take a small step in "
+    "the opposite direction. The size of that step is the learning rate. If it's too "
+    "large we overshoot, and if it's too small training takes forever. "
+)
+
+
+def char_chunks(text: str, max_chunk_size: int = 500, overlap: int = 100) -> list[str]:
+    # The character chunker this replaced
+    chunks, start = [], 0
+    while start < len(text):
+        chunks.append(text[start:start + max_chunk_size].strip())
+        start += max_chunk_size - overlap
+    return chunks
+
+
+def measure(name: str, chunks: list[str], embedder) -> dict:
+    tokenizer = embedder.tokenizer
+    limit = embedder.max_seq_length - 2
+    lengths = [len(ids) for ids in tokenizer(chunks, add_special_tokens=False)["input_ids"]]
+
+    start = time.perf_counter()
+    embedder.encode(chunks, batch_size=64, show_progress_bar=False)
+    seconds = time.perf_counter() - start
+
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "tokens_embedded": sum(min(n, limit) for n in lengths),
+        "tokens_truncated": sum(max(0, n - limit) for n in lengths),
+        "embed_seconds": round(seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    from app.rag.chunker import chunk_transcripts
+    from app.rag.embedder import get_embedder
+
+    embedder = get_embedder()
+
+    if args.files:
+        texts = [open(path, encoding="utf-8").read() for path in args.files]
+    else:
+        texts = [LECTURE * 120 for _ in range(5)]  # ~5 one-hour lectures
+
+    embedder.encode(["warm up"], show_progress_bar=False)
+
+    old = [chunk for text in texts for chunk in char_chunks(text)]
+    start = time.perf_counter()
+    new = [chunk["text"] for doc in chunk_transcripts(texts) for chunk in doc]
+    chunk_seconds = time.perf_counter() - start
+
+    before = measure("char_500_overlap_100", old, embedder)
+    after = measure("token_sentence", new, embedder)
+    after["chunk_seconds"] = round(chunk_seconds, 3)
+
+    print(json.dumps({
+        "transcripts": len(texts),
+        "characters": sum(len(t) for t in texts),
+        "results": [before, after],
+        "chunk_reduction": round(1 - after["chunks"] / before["chunks"], 3),
+        "embed_time_reduction": round(1 - after["embed_seconds"] / before["embed_seconds"], 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
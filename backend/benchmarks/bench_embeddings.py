@@ -0,0 +1,58 @@
+# Embedding throughput (embeddings/sec) for batch sizes 1 to 256, plus the
+# shared EmbeddingService under concurrent single-question load.
+#
+# Run from backend/:
+#   python benchmarks/bench_embeddings.py --texts 1024 --concurrency 32
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENTENCE = (
+    "In this lecture we look at how gradient descent updates the weights of a "
+    "neural network using the gradient of the loss function, sample {}."
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    from app.rag.embedder import embedding_service, get_embedder
+
+    embedder = get_embedder()
+
+    texts = [SENTENCE.format(i) for i in range(args.texts)]
+    embedder.encode(texts[:8], show_progress_bar=False)  # Warm up
+
+    results = {"batch_sizes": {}}
+    for batch_size in [1, 2, 4, 8, 16, 32, 64, 128, 256]:
+        start = time.perf_counter()
+        embedder.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+        results["batch_sizes"][batch_size] = round(len(texts) / elapsed, 1)
+
+    # Many in-flight single questions, as concurrent /talk calls would send them
+    questions = texts[:args.texts // 4]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda q: embedding_service.encode([q]), questions))
+        elapsed = time.perf_counter() - start
+    results["service_concurrent_singles"] = {
+        "concurrency": args.concurrency,
+        "embeddings_per_sec": round(len(questions) / elapsed, 1),
+        **embedding_service.stats(),
+    }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
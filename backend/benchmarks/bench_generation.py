@@ -0,0 +1,92 @@
+# Answer generation latency (p50/p99) and throughput under concurrent load,
+# with one prompt per model call versus the batching GenerationService.
+#
+# Run from backend/:
+#   python benchmarks/bench_generation.py --requests 64 --concurrency 16 --max-batch 8
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONTEXT = (
+    "Gradient descent updates the weights of a neural network by stepping against "
+    "the gradient of the loss. The learning rate controls the size of each step. "
+) * 6
+QUESTIONS = [
+    "What is gradient descent?",
+    "What does the learning rate control?",
+    "How are the weights of a neural network updated?",
+    "Why do we compute the gradient of the loss?",
+]
+
+
+def percentile(samples: list[float], p: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+
+
+def run_load(service, prompts: list[str], concurrency: int) -> dict:
+    def timed(prompt):
+        start = time.perf_counter()
+        service.generate(prompt)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(timed, prompts))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "requests_per_sec": round(len(prompts) / elapsed, 2),
+        **service.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    from app.rag.responder import GenerationService, HFGeneratorBackend, generator_backend, load_hf_generator
+
+    if isinstance(generator_backend, HFGeneratorBackend):
+        generator = generator_backend.generator
+    else:
+        generator = load_hf_generator()
+
+    # Distinct prompts so deduplication does not flatter the batched run
+    prompts = [
+        f"Answer the question based on the context.\n\nContext:\n{CONTEXT}\n\n"
+        f"Question: {QUESTIONS[i % len(QUESTIONS)]} (request {i})"
+        for i in range(args.requests)
+    ]
+    generator(prompts[0], max_new_tokens=8)  # Warm up
+
+    results = {"requests": args.requests, "concurrency": args.concurrency}
+    for name, max_batch in [("unbatched", 1), ("batched", args.max_batch)]:
+        service = GenerationService(
+            generator.tokenizer,
+            generator.model,
+            max_batch=max_batch,
+            max_wait=args.max_wait_ms / 1000,
+            max_queue=args.requests,
+            max_new_tokens=args.max_new_tokens,
+        )
+        results[name] = {"max_batch": max_batch, **run_load(service, prompts, args.concurrency)}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Payload size and latency of GET /transcripts for a user with many long
+# transcripts: whole documents (what the endpoint returned before, ?fields=*)
+# versus the default projected list view, and a revalidation with If-None-Match.
+# Appwrite is replaced by an in-memory collection that charges transfer time
+# for every byte it returns.
+#
+# Run from backend/:
+#   python benchmarks/bench_listing.py --transcripts 200 --text-kb 200
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_appwrite import apply_queries
+
+
+class FakeDatabases:
+    """
+    list_documents over in-memory documents, honouring equal, limit, cursorAfter and select.
+    """
+
+    def __init__(self, documents: list[dict], bandwidth: float):
+        self.documents = documents
+        self.bandwidth = bandwidth  # bytes per second between the API and Appwrite
+
+    def list_documents(self, database_id, collection_id, queries):
+        total, docs = apply_queries(self.documents, queries)
+        response = {"total": total, "documents": docs}
+        time.sleep(len(json.dumps(response)) / self.bandwidth)
+        return response
+
+
+def timed_get(client, url: str, headers: dict | None = None, cached: bool = False, runs: int = 5) -> dict:
+    from app.listing import listing_cache
+
+    samples = []
+    for _ in range(runs):
+        if not cached:
+            listing_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "status": response.status_code,
+        "bytes": len(response.content),
+        "median_ms": round(sorted(samples)[len(samples) // 2], 1),
+        "etag": response.headers.get("etag"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transcripts", type=int, default=200)
+    parser.add_argument("--text-kb", type=int, default=200, help="Size of each transcript body")
+    parser.add_argument("--bandwidth-mbps", type=float, default=800, help="Simulated API <-> Appwrite bandwidth")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from app import listing
+    from app.main import app
+
+    body = ("Gradient descent minimizes the loss one step at a time. " * 4096)[:args.text_kb * 1024]
+    documents = [
+        {
+            "$id": f"t{i:05d}",
+            "$createdAt": "2025-01-01T00:00:00.000+00:00",
+            "$updatedAt": "2025-01-01T00:00:00.000+00:00",
+            "title": f"Lecture {i}",
+            "session_id": f"s{i % 20}",
+            "user_id": "bench-user",
+            "created_at": "2025-01-01T00:00:00",
+            "original_text": body,
+        }
+        for i in range(args.transcripts)
+    ]
+    listing.databases = FakeDatabases(documents, args.bandwidth_mbps * 1e6 / 8)
+    client = TestClient(app)
+
+    full = timed_get(client, f"/transcripts?user_id=bench-user&fields=*&limit={args.transcripts}")
+    projected = timed_get(client, f"/transcripts?user_id=bench-user&limit={args.transcripts}")
+    cached = timed_get(client, f"/transcripts?user_id=bench-user&limit={args.transcripts}", cached=True)
+    revalidated = timed_get(client, f"/transcripts?user_id=bench-user&limit={args.transcripts}", {"If-None-Match": projected["etag"]}, cached=True)
+
+    print(json.dumps({
+        "transcripts": args.transcripts,
+        "text_kb": args.text_kb,
+        "full_documents": full,
+        "projected": projected,
+        "projected_cached": cached,
+        "not_modified": revalidated,
+        "payload_reduction": round(1 - projected["bytes"] / full["bytes"], 4),
+        "latency_reduction": round(1 - projected["median_ms"] / full["median_ms"], 4),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Latency and throughput of calls to a local LLM server: a new connection per
+# question (as in Optional_Enhancement.md) versus the pooled HTTPGeneratorBackend,
+# against the stub server in this directory.
+#
+# Run from backend/:
+#   python benchmarks/bench_llm_client.py --requests 400 --concurrency 16 --delay-ms 20
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples: list[float], p: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))], 2)
+
+
+def run_load(call, prompts: list[str], concurrency: int, server) -> dict:
+    connections_before = server.connections
+
+    def timed(prompt):
+        start = time.perf_counter()
+        call(prompt)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(timed, prompts))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "requests_per_sec": round(len(prompts) / elapsed, 1),
+        "connections_opened": server.connections - connections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delay-ms", type=float, default=20, help="Simulated generation time of the stub")
+    parser.add_argument("--stream", action="store_true", help="Also time streamed answers on the pooled client")
+    args = parser.parse_args()
+
+    import httpx
+    from stub_llm_server import serve
+
+    # Importing the responder with the HTTP backend keeps flan-t5 out of this process
+    os.environ["GENERATOR_BACKEND"] = "http"
+    from app.rag.responder import HTTPGeneratorBackend
+
+    server = serve(delay=args.delay_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_port}"
+    prompts = [f"Question {i}: what is gradient descent?" for i in range(args.requests)]
+
+    def per_request(prompt):
+        response = httpx.post(f"{url}/generate", json={"prompt": prompt, "max_tokens": 256}, timeout=60)
+        response.raise_for_status()
+        return response.json()["response"]
+
+    backend = HTTPGeneratorBackend(url=url, max_connections=args.concurrency)
+    results = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "server_delay_ms": args.delay_ms,
+        "connection_per_request": run_load(per_request, prompts, args.concurrency, server),
+        "pooled": run_load(lambda p: backend.submit(p).result(), prompts, args.concurrency, server),
+    }
+    if args.stream:
+        results["pooled_stream"] = run_load(lambda p: list(backend.stream(p)), prompts, args.concurrency, server)
+    results["pooled"].update(backend.stats())
+    backend.close()
+    server.shutdown()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# Latency, memory and output quality of the inference runtimes of the embedder
+# (EMBED_RUNTIME) and the hf answer generator (GENERATE_RUNTIME): torch fp32,
+# int8 and onnx, on the suite's fixtures. Each runtime is loaded in a fresh
+# process so its memory is measured on its own. Quality is relative to torch fp32:
+#   embedder   cosine similarity of every embedding to fp32, and the share of
+#              fp32's top-3 chunks per question the runtime retrieves.
+#              within_tolerance tells whether its vectors can be searched against
+#              indexes built with fp32, which is what EMBEDDING_SPACES assumes
+#              for runtimes sharing fp32's space.
+#   generator  share of answers identical to fp32's, and their token F1
+#
+# Run from backend/:
+#   python benchmarks/bench_runtimes.py --runtimes torch int8 onnx
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import fixtures
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+def latency(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 2),
+        "p99_ms": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))], 2),
+    }
+
+
+def fixture_chunks(args) -> list[str]:
+    sentences = [s for text in fixtures.make_transcripts(args.transcripts, 1000, args.seed) for s in re.split(r"(?<=\.) ", text)]
+    return [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+
+
+def run_embedder(runtime: str, args) -> dict:
+    import sentence_transformers  # noqa: F401 - imported before the baseline so only the model is counted
+    from app.rag.embedder import load_embedder
+
+    chunks = fixture_chunks(args)
+    questions = fixtures.make_questions(args.questions, args.seed)
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    model = load_embedder(runtime)
+    load_seconds = time.perf_counter() - start
+    model.encode(chunks[:8], show_progress_bar=False)
+
+    single = []
+    question_vectors = []
+    for question in questions:
+        start = time.perf_counter()
+        question_vectors.append(model.encode([question], show_progress_bar=False)[0])
+        single.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    chunk_vectors = model.encode(chunks, batch_size=64, show_progress_bar=False)
+    batch_seconds = time.perf_counter() - start
+
+    np.save(os.path.join(args.workdir, f"embedder-{runtime}-chunks.npy"), np.asarray(chunk_vectors, dtype="float32"))
+    np.save(os.path.join(args.workdir, f"embedder-{runtime}-questions.npy"), np.asarray(question_vectors, dtype="float32"))
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "model_rss_mb": round(rss_mb() - baseline, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "single_query": latency(single),
+        "batch_texts_per_sec": round(len(chunks) / batch_seconds, 1),
+    }
+
+
+def run_generator(runtime: str, args) -> dict:
+    import torch
+    import transformers  # noqa: F401 - imported before the baseline so only the model is counted
+    from app.rag.responder import load_hf_generator, prompt_from_hits
+
+    chunks = fixture_chunks(args)
+    questions = fixtures.make_questions(args.prompts, args.seed)
+    prompts = [
+        prompt_from_hits(question, [{"chunk": chunk} for chunk in chunks[3 * i:3 * i + 3]])
+        for i, question in enumerate(questions)
+    ]
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    generator = load_hf_generator(runtime)
+    load_seconds = time.perf_counter() - start
+    tokenizer, model = generator.tokenizer, generator.model
+
+    def generate(prompt: str) -> tuple[str, int]:
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        with torch.inference_mode():
+            output = model.generate(**inputs, max_new_tokens=args.max_new_tokens)
+        return tokenizer.decode(output[0], skip_special_tokens=True), len(output[0])
+
+    generate(prompts[0])  # Warm up
+
+    samples, answers, tokens = [], [], 0
+    for prompt in prompts:
+        start = time.perf_counter()
+        answer, length = generate(prompt)
+        samples.append((time.perf_counter() - start) * 1000)
+        answers.append(answer)
+        tokens += length
+
+    with open(os.path.join(args.workdir, f"generator-{runtime}-answers.json"), "w") as f:
+        json.dump(answers, f)
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "model_rss_mb": round(rss_mb() - baseline, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "answer": latency(samples),
+        "tokens_per_sec": round(tokens / (sum(samples) / 1000), 1),
+    }
+
+
+def embedder_quality(runtime: str, workdir: str, tolerance: float) -> dict:
+    from app.rag.embedder import EMBEDDING_SPACES
+
+    def load(name, part):
+        vectors = np.load(os.path.join(workdir, f"embedder-{name}-{part}.npy"))
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    reference, vectors = load("torch", "chunks"), load(runtime, "chunks")
+    cosines = (reference * vectors).sum(axis=1)
+    ref_top = np.argsort(-load("torch", "questions") @ reference.T, axis=1)[:, :3]
+    top = np.argsort(-load(runtime, "questions") @ vectors.T, axis=1)[:, :3]
+    overlap = np.mean([len(set(a) & set(b)) / 3 for a, b in zip(ref_top, top)])
+
+    within = bool(cosines.min() >= tolerance)
+    shares_index = EMBEDDING_SPACES[runtime] == EMBEDDING_SPACES["torch"]
+    return {
+        "min_cosine_to_fp32": round(float(cosines.min()), 6),
+        "mean_cosine_to_fp32": round(float(cosines.mean()), 6),
+        "top3_agreement_with_fp32": round(float(overlap), 4),
+        "within_tolerance": within,
+        "shares_index_with_fp32": shares_index,
+        "consistent": within or not shares_index,  # Sharing fp32's indexes requires being within tolerance
+    }
+
+
+def generator_quality(runtime: str, workdir: str) -> dict:
+    def load(name):
+        with open(os.path.join(workdir, f"generator-{name}-answers.json")) as f:
+            return json.load(f)
+
+    def f1(a: str, b: str) -> float:
+        a, b = a.lower().split(), b.lower().split()
+        common = sum(min(a.count(t), b.count(t)) for t in set(a))
+        if not a or not b or not common:
+            return float(a == b)
+        precision, recall = common / len(b), common / len(a)
+        return 2 * precision * recall / (precision + recall)
+
+    reference, answers = load("torch"), load(runtime)
+    return {
+        "exact_match_with_fp32": round(sum(a == b for a, b in zip(reference, answers)) / len(answers), 4),
+        "token_f1_with_fp32": round(sum(f1(a, b) for a, b in zip(reference, answers)) / len(answers), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runtimes", nargs="+", default=["torch", "int8", "onnx"])
+    parser.add_argument("--only", choices=["embedder", "generator"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--transcripts", type=int, default=20, help="Fixture transcripts the chunks are cut from")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--prompts", type=int, default=20, help="Answers generated per runtime")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--tolerance", type=float, default=0.999, help="Lowest cosine to fp32 for sharing its indexes")
+    parser.add_argument("--child", nargs=2, metavar=("KIND", "RUNTIME"), help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, runtime = args.child
+        result = (run_embedder if kind == "embedder" else run_generator)(runtime, args)
+        with open(os.path.join(args.workdir, f"{kind}-{runtime}.json"), "w") as f:
+            json.dump(result, f)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_runtimes_")
+    forwarded = [
+        "--seed", str(args.seed), "--transcripts", str(args.transcripts), "--questions", str(args.questions),
+        "--prompts", str(args.prompts), "--max-new-tokens", str(args.max_new_tokens), "--workdir", workdir,
+    ]
+    results = {}
+    for kind in ["embedder", "generator"]:
+        if args.only and kind != args.only:
+            continue
+        results[kind] = {}
+        for runtime in args.runtimes:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", kind, runtime, *forwarded],
+                capture_output=True, text=True,
+            )
+            if child.returncode != 0:
+                results[kind][runtime] = {"error": child.stderr.strip().splitlines()[-1] if child.stderr.strip() else "failed"}
+                continue
+            with open(os.path.join(workdir, f"{kind}-{runtime}.json")) as f:
+                results[kind][runtime] = json.load(f)
+
+        # Quality relative to torch fp32, for the runtimes that ran alongside it
+        if "error" in results[kind].get("torch", {"error": ""}):
+            continue
+        for runtime, result in results[kind].items():
+            if runtime != "torch" and "error" not in result:
+                result["quality"] = (
+                    embedder_quality(runtime, workdir, args.tolerance) if kind == "embedder"
+                    else generator_quality(runtime, workdir)
+                )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
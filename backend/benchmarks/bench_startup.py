@@ -0,0 +1,60 @@
+# Import time and memory of an API worker: importing app.main as-is (models load
+# lazily) versus importing it and loading every model, which is what importing
+# it cost before models were loaded on first use.
+#
+# Run from backend/:
+#   python benchmarks/bench_startup.py --runs 3
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter() - started
+if {load_models}:
+    from app.models import models
+    models.warm_up(list(models.status()))
+print(json.dumps({{
+    "import_seconds": round(imported, 2),
+    "ready_seconds": round(time.perf_counter() - started, 2),
+    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}}))
+"""
+
+
+def run(load_models: bool, role: str) -> dict:
+    env = {**os.environ, "APP_ROLE": role}
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(load_models=load_models)],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def best_of(runs: int, load_models: bool, role: str) -> dict:
+    samples = [run(load_models, role) for _ in range(runs)]
+    return {key: min(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {
+        "lazy_import": best_of(args.runs, False, "all"),
+        "eager_models": best_of(args.runs, True, "all"),
+        "api_role": best_of(args.runs, False, "api"),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Compare wall-clock time of the single model.transcribe() call against the
+# parallel span engine used by the API.
+#
+# Run from backend/:
+#   python benchmarks/bench_transcription.py lecture.mp3 --workers 4 --model base
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio", help="Audio/video file to transcribe")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--model", default="base", help='Whisper model size ("tiny", "base", ...)')
+    args = parser.parse_args()
+
+    # The engine reads its settings at import time
+    os.environ["WHISPER_MODEL"] = args.model
+    os.environ["TRANSCRIBE_WORKERS"] = str(args.workers)
+    os.environ["TRANSCRIPT_CACHE_DIR"] = tempfile.mkdtemp()  # Always measure a cold transcription
+    from app import transcription_jobs
+    import whisper
+
+    model = whisper.load_model(args.model)
+    start = time.perf_counter()
+    single_text = model.transcribe(args.audio)["text"]
+    single_seconds = time.perf_counter() - start
+
+    # Start every worker (and load its model) before timing
+    executor = transcription_jobs._get_executor()
+    for future in [executor.submit(os.getpid) for _ in range(args.workers)]:
+        future.result()
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(args.audio)[-1])
+    tmp.close()
+    shutil.copy(args.audio, tmp.name)  # transcribe() removes the file it is given
+
+    start = time.perf_counter()
+    parallel_text = asyncio.run(transcription_jobs.transcribe("file", tmp.name, digest="benchmark"))
+    parallel_seconds = time.perf_counter() - start
+    transcription_jobs.shutdown()
+
+    print(json.dumps({
+        "audio": args.audio,
+        "model": args.model,
+        "workers": args.workers,
+        "single_call_seconds": round(single_seconds, 2),
+        "parallel_seconds": round(parallel_seconds, 2),
+        "speedup": round(single_seconds / parallel_seconds, 2),
+        "single_call_chars": len(single_text),
+        "parallel_chars": len(parallel_text),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
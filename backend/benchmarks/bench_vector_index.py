@@ -0,0 +1,76 @@
+# Recall@k and query latency of each TranscriptVectorStore index type against
+# exact flat search, on synthetic clustered 384-d vectors.
+#
+# Run from backend/:
+#   python benchmarks/bench_vector_index.py --sizes 20000 100000 --k 10
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag.vector_store import TranscriptVectorStore  # noqa: E402
+
+DIM = 384
+
+
+def synthetic_vectors(n: int, clusters: int, rng) -> np.ndarray:
+    # Sentence embeddings of one corpus cluster around topics, so uniform noise would flatter IVF
+    centers = rng.normal(size=(clusters, DIM)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(n, DIM)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    results = []
+    for n in args.sizes:
+        vectors = synthetic_vectors(n + args.queries, clusters=max(10, n // 500), rng=rng)
+        base, queries = vectors[:n], vectors[n:]
+        _, truth = faiss.knn(queries, base, args.k, metric=faiss.METRIC_INNER_PRODUCT)
+        chunks = [str(i) for i in range(n)]
+
+        for index_type in ["flat", "ivf", "ivfpq"]:
+            store = TranscriptVectorStore(dim=DIM, index_type=index_type)
+            start = time.perf_counter()
+            store.add_embeddings(base, chunks)
+            build_seconds = time.perf_counter() - start
+
+            latencies, recalls = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                found = store.search(query, top_k=args.k)
+                latencies.append(time.perf_counter() - start)
+                found_ids = {int(chunk) for chunk, _ in found}
+                recalls.append(len(found_ids.intersection(expected.tolist())) / args.k)
+
+            results.append({
+                "vectors": n,
+                "index": store.kind,
+                "nprobe": getattr(store.index, "nprobe", None),
+                "build_seconds": round(build_seconds, 2),
+                f"recall@{args.k}": round(float(np.mean(recalls)), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+                "index_mb": round((store.nbytes() - sum(len(c) for c in chunks)) / 1024 ** 2, 1),
+            })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Stand-in for an Appwrite server: the parts of the REST API this backend uses
+# (documents: list/get/create/update, files: upload/download), kept in memory,
+# answering every request after a fixed delay and counting the TCP connections
+# it accepts. Point the app at it with APPWRITE_ENDPOINT=http://127.0.0.1:<port>/v1.
+#
+# Run from backend/:
+#   python benchmarks/fake_appwrite.py --port 8090 --latency-ms 20
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+DOCUMENTS = re.compile(r"^/v1/databases/([^/]+)/collections/([^/]+)/documents(?:/([^/]+))?$")
+FILES = re.compile(r"^/v1/storage/buckets/([^/]+)/files(?:/([^/]+)(/download)?)?$")
+
+
+def apply_queries(documents: list[dict], queries: list[str]) -> tuple[int, list[dict]]:
+    """
+    (total, page) of documents for Appwrite JSON queries; honours equal, orderAsc,
+    orderDesc, limit, cursorAfter and select.
+    """
+    queries = [json.loads(q) for q in queries]
+    docs, limit, select = documents, 25, None
+    for q in queries:
+        if q["method"] == "equal":
+            docs = [d for d in docs if d.get(q["attribute"]) in q["values"]]
+    total = len(docs)
+    for q in queries:
+        if q["method"] in ("orderAsc", "orderDesc"):
+            docs = sorted(docs, key=lambda d: d.get(q["attribute"]) or "", reverse=q["method"] == "orderDesc")
+    for q in queries:
+        if q["method"] == "cursorAfter":
+            ids = [d["$id"] for d in docs]
+            docs = docs[ids.index(q["values"][0]) + 1:]
+        elif q["method"] == "limit":
+            limit = q["values"][0]
+        elif q["method"] == "select":
+            select = q["values"]
+    docs = docs[:limit]
+    if select:
+        docs = [{k: v for k, v in d.items() if k in select} for d in docs]
+    return total, docs
+
+
+class FakeAppwrite(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float):
+        super().__init__(address, FakeAppwriteHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.collections: dict[str, list[dict]] = {}  # collection id -> documents in insertion order
+        self.files: dict[tuple[str, str], bytes] = {}  # (bucket id, file id) -> content
+        self.connections = 0
+        self.requests = 0
+
+    def add_document(self, collection_id: str, document_id: str, data: dict) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        doc = {"$id": document_id, "$collectionId": collection_id, "$createdAt": now, "$updatedAt": now, "$permissions": [], **data}
+        with self.lock:
+            self.collections.setdefault(collection_id, []).append(doc)
+        return doc
+
+    def find_document(self, collection_id: str, document_id: str) -> dict | None:
+        with self.lock:
+            return next((d for d in self.collections.get(collection_id, []) if d["$id"] == document_id), None)
+
+
+class FakeAppwriteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't hold the body back
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send(404, {"message": "Not found", "code": 404, "type": "document_not_found"})
+
+    def _begin(self) -> tuple[str, list[tuple[str, str]], bytes]:
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        return url.path, parse_qsl(url.query), body
+
+    def do_GET(self):
+        path, params, _ = self._begin()
+        if m := DOCUMENTS.match(path):
+            _, collection_id, document_id = m.groups()
+            if document_id:
+                doc = self.server.find_document(collection_id, document_id)
+                return self._send(200, doc) if doc else self._not_found()
+            with self.server.lock:
+                documents = list(self.server.collections.get(collection_id, []))
+            total, docs = apply_queries(documents, [v for k, v in params if k.startswith("queries[")])
+            return self._send(200, {"total": total, "documents": docs})
+        if (m := FILES.match(path)) and m.group(3):
+            data = self.server.files.get((m.group(1), m.group(2)))
+            return self._send(200, data, "application/octet-stream") if data is not None else self._not_found()
+        self._not_found()
+
+    def do_POST(self):
+        path, _, body = self._begin()
+        if (m := DOCUMENTS.match(path)) and not m.group(3):
+            payload = json.loads(body)
+            return self._send(201, self.server.add_document(m.group(2), payload["documentId"], payload["data"]))
+        if (m := FILES.match(path)) and not m.group(2):
+            form = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+            )
+            parts = {part.get_param("name", header="content-disposition"): part for part in form.iter_parts()}
+            file_id = parts["fileId"].get_content().strip()
+            data = parts["file"].get_payload(decode=True)
+            with self.server.lock:
+                self.server.files[(m.group(1), file_id)] = data
+            return self._send(201, {"$id": file_id, "bucketId": m.group(1), "sizeOriginal": len(data)})
+        self._not_found()
+
+    def do_PATCH(self):
+        path, _, body = self._begin()
+        if (m := DOCUMENTS.match(path)) and m.group(3):
+            doc = self.server.find_document(m.group(2), m.group(3))
+            if doc is None:
+                return self._not_found()
+            with self.server.lock:
+                doc.update(json.loads(body).get("data", {}))
+                doc["$updatedAt"] = datetime.now(timezone.utc).isoformat()
+            return self._send(200, doc)
+        self._not_found()
+
+
+def serve(port: int = 0, latency: float = 0.02) -> FakeAppwrite:
+    """
+    Start the fake on a background thread; port 0 picks a free port (see server.server_port).
+    """
+    server = FakeAppwrite(("127.0.0.1", port), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    server = FakeAppwrite(("127.0.0.1", args.port), args.latency_ms / 1000)
+    print(f"Fake Appwrite on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
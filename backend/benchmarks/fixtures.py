@@ -0,0 +1,89 @@
+# Synthetic, seeded inputs for the benchmark suite: lecture-like transcripts and
+# questions, a speech-like recording, and random embedding vectors. The same seed
+# always produces the same fixtures.
+
+import random
+import wave
+
+import numpy as np
+
+TOPICS = [
+    "gradient descent", "the loss function", "backpropagation", "the learning rate",
+    "overfitting", "regularization", "the validation set", "convolutional layers",
+    "attention", "the softmax function", "batch normalization", "dropout",
+    "decision trees", "k-means clustering", "principal component analysis", "the bias term",
+]
+TEMPLATES = [
+    "In this part of the lecture we look at {a} and how it relates to {b}.",
+    "Remember that {a} only works well when {b} is chosen carefully.",
+    "A common mistake is to confuse {a} with {b}, so let's compare them.",
+    "If you change {a}, you will notice the effect on {b} almost immediately.",
+    "We can think of {a} as a way to control {b} during training.",
+    "Here is an example: first we compute {a}, then we update {b}.",
+    "Most practical systems combine {a} with {b} to get stable results.",
+]
+QUESTIONS = [
+    "How does {a} affect {b}?",
+    "What is the difference between {a} and {b}?",
+    "Why do we need {a} when training with {b}?",
+    "Can you explain {a} in simple terms?",
+]
+
+
+def make_transcripts(count: int, words: int, seed: int = 0) -> list[str]:
+    """
+    count transcripts of about `words` words each, made of sentences about TOPICS.
+    """
+    rng = random.Random(seed)
+    transcripts = []
+    for _ in range(count):
+        sentences, length = [], 0
+        while length < words:
+            a, b = rng.sample(TOPICS, 2)
+            sentence = rng.choice(TEMPLATES).format(a=a, b=b)
+            sentences.append(sentence)
+            length += len(sentence.split())
+        transcripts.append(" ".join(sentences))
+    return transcripts
+
+
+def make_questions(count: int, seed: int = 0) -> list[str]:
+    """
+    count distinct questions (numbered, so no two are answered from the answer cache).
+    """
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        a, b = rng.sample(TOPICS, 2)
+        questions.append(f"{rng.choice(QUESTIONS).format(a=a, b=b)} ({i})")
+    return questions
+
+
+def write_speech_wav(path: str, seconds: float, seed: int = 0, sample_rate: int = 16000):
+    """
+    A 16-bit mono WAV of voiced bursts (0.5 to 6 s) separated by near-silent pauses,
+    so span finding has quiet points to cut at.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = rng.normal(0, 0.003, total).astype("float32")  # Background noise
+    pos = 0
+    while pos < total:
+        burst = min(total - pos, int(rng.uniform(0.5, 6.0) * sample_rate))
+        t = np.arange(burst) / sample_rate
+        pitch = rng.uniform(100, 220)
+        voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)  # Syllable rate
+        audio[pos:pos + burst] += (0.15 * voice * envelope).astype("float32")
+        pos += burst + int(rng.uniform(0.2, 1.0) * sample_rate)
+
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def make_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype("float32")
@@ -0,0 +1,355 @@
+# Offline benchmark suite: throughput and p50/p99 latency of every stage of the
+# pipeline on synthetic fixtures (fixtures.py), plus a /talk load test through
+# the whole app against the fake Appwrite server. Unless --real-models is given,
+# the models are replaced by the stubs in stubs.py and the stub LLM server, so
+# runs are reproducible on any machine and measure the code around the models.
+#
+# Results are printed (and written with --output) as JSON. --thresholds checks
+# them against fixed limits and --baseline against an earlier run; a failed
+# check makes the exit status 1.
+#
+# Run from backend/:
+#   python benchmarks/run_suite.py --output baseline.json
+#   python benchmarks/run_suite.py --baseline baseline.json --thresholds benchmarks/thresholds.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures
+
+SESSION_ID = "suite-session"
+
+
+def summarize(latencies: list[float], elapsed: float, units: tuple[str, float] | None = None) -> dict:
+    samples = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+    result = {
+        "calls": len(samples),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "calls_per_sec": round(len(samples) / elapsed, 1),
+    }
+    if units:
+        result[f"{units[0]}_per_sec"] = round(units[1] / elapsed, 1)
+    return result
+
+
+def measure(fn, inputs: list, concurrency: int = 1, units: tuple[str, float] | None = None) -> dict:
+    """
+    Latency of fn on each input, and calls (and units) per second, with
+    `concurrency` calls in flight.
+    """
+    def timed(x):
+        start = time.perf_counter()
+        fn(x)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(x) for x in inputs]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, inputs))
+    return summarize(latencies, time.perf_counter() - start, units)
+
+
+def bench_transcribe_file(args) -> dict:
+    if shutil.which("ffmpeg") is None:
+        return {"skipped": "ffmpeg not found"}
+    from app import summarizer
+    from stubs import StubWhisper
+
+    if not args.real_models:
+        summarizer._model = StubWhisper(summarizer.SAMPLE_RATE)  # Taken instead of loading Whisper
+    path = os.path.join(tempfile.mkdtemp(), "fixture.wav")
+    fixtures.write_speech_wav(path, args.audio_seconds, args.seed)
+    with open(path, "rb") as f:
+        data = f.read()
+    return measure(lambda _: summarizer.transcribe_file(data, "fixture.wav"), range(args.audio_runs),
+                   units=("audio_seconds", args.audio_seconds * args.audio_runs))
+
+
+def bench_chunk_transcript(transcripts: list[str]) -> dict:
+    from app.rag.chunker import chunk_transcript
+
+    chunk_transcript(transcripts[0])  # Load the tokenizer outside the timing
+    return measure(chunk_transcript, transcripts, units=("words", sum(len(t.split()) for t in transcripts)))
+
+
+def bench_get_embeddings(batches: list[list[str]]) -> dict:
+    from app.rag.embedder import get_embeddings
+
+    get_embeddings(["warm up"])
+    chunks = sum(len(batch) for batch in batches)
+    return {
+        "cold": measure(get_embeddings, batches, units=("chunks", chunks)),
+        "cached": measure(get_embeddings, batches, units=("chunks", chunks)),  # Same chunks again
+    }
+
+
+def bench_search(args) -> dict:
+    from app.rag.embedder import EMBEDDING_DIM
+    from app.rag.vector_store import TranscriptVectorStore
+
+    store = TranscriptVectorStore(dim=EMBEDDING_DIM)
+    vectors = fixtures.make_vectors(args.index_chunks, EMBEDDING_DIM, args.seed)
+    store.add_embeddings(vectors, [f"Chunk {i}" for i in range(len(vectors))], doc_id="fixture")
+    queries = list(fixtures.make_vectors(args.queries, EMBEDDING_DIM, args.seed + 1))
+    result = measure(lambda q: store.search(q, top_k=3), queries)
+    result["index_chunks"] = args.index_chunks
+    result["index_kind"] = store.kind
+    return result
+
+
+def build_store(transcripts: list[dict]):
+    from app.ingest import transcript_segments
+    from app.rag.embedder import EMBEDDING_DIM
+    from app.rag.indexer import sync_vector_store
+    from app.rag.vector_store import TranscriptVectorStore
+
+    store = TranscriptVectorStore(dim=EMBEDDING_DIM)
+    sync_vector_store(store, transcripts, transcript_segments)
+    return store
+
+
+def bench_answer_question(store, questions: list[str], concurrency: int) -> dict:
+    from app.rag.responder import answer_question
+
+    half = len(questions) // 2
+    return {
+        "sequential": measure(lambda q: answer_question(q, store), questions[:half]),
+        "concurrent": {
+            **measure(lambda q: answer_question(q, store), questions[half:], concurrency),
+            "concurrency": concurrency,
+        },
+    }
+
+
+async def bench_talk(questions: list[str], concurrency: int) -> dict:
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://suite", timeout=300) as client:
+        async def talk(question: str) -> tuple[float, int]:
+            start = time.perf_counter()
+            response = await client.post("/talk", json={"session_id": SESSION_ID, "prompt": question})
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        # The first question loads the session's store from Appwrite
+        cold_ms, _ = await talk(questions[0])
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(question: str):
+            async with semaphore:
+                return await talk(question)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[limited(q) for q in questions[1:]])
+        elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for _, status in results)
+    return {
+        **summarize([ms for ms, _ in results], elapsed),
+        "cold_ms": round(cold_ms, 3),
+        "concurrency": concurrency,
+        "errors": sum(count for status, count in statuses.items() if status != 200),
+        "statuses": {str(status): count for status, count in statuses.items()},
+    }
+
+
+def seed_appwrite(server, transcripts: list[str]) -> list[dict]:
+    """
+    A session of transcripts in the fake Appwrite, indexed and stored the way the ingest worker does it.
+    """
+    from app.ingest import get_embedding_record, save_vector_store
+
+    docs = [
+        server.add_document(os.environ["APPWRITE_COLLECTION_ID"], f"suite-t{i:04d}", {
+            "title": f"Lecture {i}",
+            "original_text": text,
+            "session_id": SESSION_ID,
+            "user_id": "suite-user",
+        })
+        for i, text in enumerate(transcripts)
+    ]
+    store = build_store(docs)
+    save_vector_store(SESSION_ID, get_embedding_record(SESSION_ID), store)
+    return docs
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def check_thresholds(flat: dict, limits: dict) -> list[str]:
+    failures = []
+    for name, limit in limits.items():
+        if name not in flat:
+            continue
+        if "max" in limit and flat[name] > limit["max"]:
+            failures.append(f"{name} = {flat[name]} is above the limit of {limit['max']}")
+        if "min" in limit and flat[name] < limit["min"]:
+            failures.append(f"{name} = {flat[name]} is below the limit of {limit['min']}")
+    return failures
+
+
+def compare_baseline(flat: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Latencies (*_ms) that grew, or throughputs (*_per_sec) that fell, by more than tolerance.
+    """
+    failures = []
+    for name, value in flat.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if name.endswith("_ms") and value > before * (1 + tolerance):
+            failures.append(f"{name} rose from {before} to {value}")
+        elif name.endswith("_per_sec") and value < before * (1 - tolerance):
+            failures.append(f"{name} fell from {before} to {value}")
+    return failures
+
+
+def environment(args) -> dict:
+    import faiss
+    import numpy as np
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": faiss.__version__,
+        "models": "real" if args.real_models else "stub",
+        "commit": commit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-models", action="store_true", help="Use Whisper, MiniLM and the configured generator")
+    parser.add_argument("--transcripts", type=int, default=40)
+    parser.add_argument("--words", type=int, default=2000, help="Words per fixture transcript")
+    parser.add_argument("--audio-seconds", type=float, default=300)
+    parser.add_argument("--audio-runs", type=int, default=3)
+    parser.add_argument("--index-chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--talk-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-delay-ms", type=float, default=20, help="Generation time of the stub LLM server")
+    parser.add_argument("--appwrite-latency-ms", type=float, default=5, help="Delay of every fake Appwrite response")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--thresholds", help="JSON file of limits, see benchmarks/thresholds.json")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression against the baseline")
+    args = parser.parse_args()
+
+    from fake_appwrite import serve as serve_appwrite
+    from stub_llm_server import serve as serve_llm
+
+    # Everything is read from the environment when the app is imported
+    appwrite = serve_appwrite(latency=args.appwrite_latency_ms / 1000)
+    os.environ.update({
+        "APPWRITE_ENDPOINT": f"http://127.0.0.1:{appwrite.server_port}/v1",
+        "APPWRITE_PROJECT_ID": "suite",
+        "APPWRITE_API_KEY": "suite",
+        "APPWRITE_DATABASE_ID": "db",
+        "APPWRITE_COLLECTION_ID": "transcripts",
+        "APPWRITE_EMBEDDING_COLLECTION_ID": "embeddings",
+        "APPWRITE_SESSION_COLLECTION_ID": "sessions",
+        "APPWRITE_MESSAGES_COLLECTION_ID": "messages",
+        "APPWRITE_BUCKET_ID": "files",
+        "EMBED_CACHE_DIR": tempfile.mkdtemp(prefix="suite_embeddings_"),
+        "VECTOR_CACHE_DIR": tempfile.mkdtemp(prefix="suite_vectors_"),
+        "SEGMENT_CACHE_DIR": tempfile.mkdtemp(prefix="suite_segments_"),
+        "TRANSCRIPT_CACHE_DIR": tempfile.mkdtemp(prefix="suite_transcripts_"),
+        "APP_ROLE": "all",
+        "MODEL_WARMUP": "",
+    })
+    if not args.real_models:
+        llm = serve_llm(delay=args.llm_delay_ms / 1000)
+        os.environ.update({"GENERATOR_BACKEND": "http", "LLM_SERVER_URL": f"http://127.0.0.1:{llm.server_port}"})
+
+        from app.models import models
+        from app.rag import embedder  # Registers the real embedder first
+        from stubs import StubEmbedder
+
+        models.register("embedder", lambda: StubEmbedder(embedder.EMBEDDING_DIM))
+
+    from app.rag.chunker import chunk_transcript
+
+    texts = fixtures.make_transcripts(args.transcripts, args.words, args.seed)
+    questions = fixtures.make_questions(args.questions + args.talk_requests, args.seed)
+    benchmarks = {}
+
+    def run(name, fn, *fn_args):
+        print(f"[Suite] {name}", file=sys.stderr)
+        try:
+            benchmarks[name] = fn(*fn_args)
+        except Exception as e:
+            benchmarks[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    run("transcribe_file", bench_transcribe_file, args)
+    run("chunk_transcript", bench_chunk_transcript, texts)
+    run("get_embeddings", bench_get_embeddings, [chunk_transcript(text) for text in texts])
+    run("search", bench_search, args)
+    run("answer_question", lambda: bench_answer_question(
+        build_store(seed_appwrite(appwrite, texts)), questions[:args.questions], args.concurrency
+    ))
+    run("talk", lambda: asyncio.run(bench_talk(questions[args.questions:], args.concurrency)))
+
+    flat = flatten(benchmarks)
+    failures = [f"{name}: {result['error']}" for name, result in benchmarks.items() if "error" in result]
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            failures += check_thresholds(flat, json.load(f)["limits"])
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare_baseline(flat, flatten(json.load(f)["benchmarks"]), args.tolerance)
+
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "thresholds", "baseline")},
+        "environment": environment(args),
+        "benchmarks": benchmarks,
+        "failures": failures,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Stand-in for the local LLM server: answers POST /generate after a fixed delay,
+# as JSON or (with "stream": true) as one JSON object per line, and counts the
+# TCP connections it accepts. Point the app at it with GENERATOR_BACKEND=http.
+#
+# Run from backend/:
+#   python benchmarks/stub_llm_server.py --port 8888 --delay-ms 50
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay: float, fail_every: int = 0):
+        super().__init__(address, StubHandler)
+        self.delay = delay
+        self.fail_every = fail_every  # Answer every Nth request with a 503 to exercise retries
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't hold the body back
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send(404, b"{}")
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.fail_every and self.server.requests % self.server.fail_every == 0
+        if fail:
+            self._send(503, b'{"error": "busy"}')
+            return
+
+        time.sleep(self.server.delay)
+        words = f"Stub answer to: {payload['prompt'][-40:]}".split()
+        if payload.get("stream"):
+            lines = [json.dumps({"response": word + " ", "done": False}) for word in words]
+            lines.append(json.dumps({"response": "", "done": True}))
+            self._send(200, ("\n".join(lines) + "\n").encode(), "application/x-ndjson")
+        else:
+            self._send(200, json.dumps({"response": " ".join(words)}).encode())
+
+
+def serve(port: int = 0, delay: float = 0.05, fail_every: int = 0) -> StubLLMServer:
+    """
+    Start the stub on a background thread; port 0 picks a free port (see server.server_port).
+    """
+    server = StubLLMServer(("127.0.0.1", port), delay, fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--delay-ms", type=float, default=50)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubLLMServer(("127.0.0.1", args.port), args.delay_ms / 1000, args.fail_every)
+    print(f"Stub LLM server on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
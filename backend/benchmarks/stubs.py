@@ -0,0 +1,54 @@
+# Deterministic stand-ins for the embedding and Whisper models, so benchmarks
+# measure the code around the models on any machine. They are cheap compared to
+# the real models, and their outputs have the real shapes:
+#   StubEmbedder  384-d hashed bag-of-words vectors (texts sharing words are
+#                 similar, so retrieval still finds related chunks), with a
+#                 tokenizer that reports character offsets like a fast HF one
+#   StubWhisper   one segment of fixture text per SEGMENT_SECONDS of audio
+# Generation is stubbed by stub_llm_server.py with GENERATOR_BACKEND=http.
+
+import re
+import zlib
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD = re.compile(r"\w+")
+
+
+class StubTokenizer:
+    def __call__(self, texts: list[str], add_special_tokens: bool = False, return_offsets_mapping: bool = True) -> dict:
+        return {"offset_mapping": [[m.span() for m in _TOKEN.finditer(text)] for text in texts]}
+
+
+class StubEmbedder:
+    max_seq_length = 256
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.tokenizer = StubTokenizer()
+
+    def encode(self, texts: list[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                vectors[i, zlib.crc32(word.encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class StubWhisper:
+    SEGMENT_SECONDS = 5.0
+
+    def __init__(self, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+
+    def transcribe(self, audio: np.ndarray, initial_prompt: str | None = None) -> dict:
+        seconds = len(audio) / self.sample_rate
+        segments, start = [], 0.0
+        while start < seconds:
+            end = min(seconds, start + self.SEGMENT_SECONDS)
+            segments.append({"start": start, "end": end, "text": f" Speech from {start:.1f} to {end:.1f} seconds."})
+            start = end
+        return {"text": "".join(seg["text"] for seg in segments), "segments": segments}
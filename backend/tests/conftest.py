@@ -0,0 +1,55 @@
+# Tests run against the in-memory fake Appwrite server from benchmarks/ and
+# temporary cache directories. The app reads both from the environment when it
+# is imported, so they are set up here, before any test module imports it.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from fake_appwrite import serve  # noqa: E402
+
+_appwrite = serve(latency=0)
+os.environ.update({
+    "APPWRITE_ENDPOINT": f"http://127.0.0.1:{_appwrite.server_port}/v1",
+    "APPWRITE_PROJECT_ID": "tests",
+    "APPWRITE_API_KEY": "tests",
+    "APPWRITE_DATABASE_ID": "db",
+    "APPWRITE_COLLECTION_ID": "transcripts",
+    "APPWRITE_EMBEDDING_COLLECTION_ID": "embeddings",
+    "APPWRITE_SESSION_COLLECTION_ID": "sessions",
+    "APPWRITE_MESSAGES_COLLECTION_ID": "messages",
+    "APPWRITE_BUCKET_ID": "files",
+    "EMBED_CACHE_DIR": tempfile.mkdtemp(prefix="tests_embeddings_"),
+    "VECTOR_CACHE_DIR": tempfile.mkdtemp(prefix="tests_vectors_"),
+    "SEGMENT_CACHE_DIR": tempfile.mkdtemp(prefix="tests_segments_"),
+    "TRANSCRIPT_CACHE_DIR": tempfile.mkdtemp(prefix="tests_transcripts_"),
+    "APP_ROLE": "all",
+    "MODEL_WARMUP": "",
+})
+
+
+@pytest.fixture
+def appwrite():
+    """
+    The fake Appwrite server, emptied before each test.
+    """
+    with _appwrite.lock:
+        _appwrite.collections.clear()
+        _appwrite.files.clear()
+    return _appwrite
+
+
+@pytest.fixture(scope="session")
+def stub_embedder():
+    """
+    Index with the hashed bag-of-words stub instead of MiniLM (for the rest of the run).
+    """
+    from app.models import models
+    from app.rag import embedder
+    from stubs import StubEmbedder
+
+    models.register("embedder", lambda: StubEmbedder(embedder.EMBEDDING_DIM))
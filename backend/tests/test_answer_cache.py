@@ -0,0 +1,57 @@
+# Semantic answer cache: exact and similar question hits, and invalidation by scope and version
+
+import numpy as np
+
+from app.rag.answer_cache import AnswerCache
+
+
+def _vector(*values) -> np.ndarray:
+    return np.array(values, dtype="float32")
+
+
+def test_same_and_similar_questions_hit_above_the_threshold():
+    cache = AnswerCache(threshold=0.95)
+    cache.store("s1", "v1", "What is dropout?", _vector(1, 0, 0), {"response": "A regularizer."}, cost_ms=50)
+
+    assert cache.lookup("s1", "v1", "  what is DROPOUT ", _vector(0, 1, 0)) == {"response": "A regularizer."}
+    assert cache.lookup("s1", "v1", "Explain dropout", _vector(1, 0.2, 0)) is not None  # cosine 0.98
+    assert cache.lookup("s1", "v1", "What is a dropout layer?", _vector(1, 0.5, 0)) is None  # cosine 0.89
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["similar_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["saved_ms"] == 100.0
+
+
+def test_answers_are_kept_per_scope():
+    cache = AnswerCache()
+    cache.store("s1", "v1", "What is dropout?", _vector(1, 0), {"response": "s1"}, cost_ms=1)
+
+    assert cache.lookup("s2", "v1", "What is dropout?", _vector(1, 0)) is None
+    assert cache.lookup("s1", "v1", "What is dropout?", _vector(1, 0)) == {"response": "s1"}
+
+
+def test_new_index_version_drops_the_scopes_answers():
+    cache = AnswerCache()
+    cache.store("s1", "v1", "What is dropout?", _vector(1, 0), {"response": "old"}, cost_ms=1)
+    cache.store("s2", "v1", "What is dropout?", _vector(1, 0), {"response": "other scope"}, cost_ms=1)
+
+    assert cache.lookup("s1", "v2", "What is dropout?", _vector(1, 0)) is None
+    assert cache.lookup("s1", "v1", "What is dropout?", _vector(1, 0)) is None  # Not brought back by the old version
+    assert cache.lookup("s2", "v1", "What is dropout?", _vector(1, 0)) == {"response": "other scope"}
+
+    cache.invalidate("s2")
+    assert cache.lookup("s2", "v1", "What is dropout?", _vector(1, 0)) is None
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_expired_and_least_recently_used_answers_go():
+    cache = AnswerCache(ttl=-1)
+    cache.store("s1", "v1", "First?", _vector(1, 0), {"response": "1"}, cost_ms=1)
+    assert cache.lookup("s1", "v1", "First?", _vector(1, 0)) is None  # Expired
+
+    cache = AnswerCache(max_entries=2)
+    for i, question in enumerate(["First?", "Second?", "Third?"]):
+        cache.store("s1", "v1", question, _vector(1, i), {"response": question}, cost_ms=1)
+    assert cache.lookup("s1", "v1", "Third?", _vector(0, 1)) is not None
+    assert cache.lookup("s1", "v1", "First?", _vector(0, 1)) is None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,47 @@
+# Token-aware chunking, with the stub embedder's word-and-punctuation tokenizer
+
+import re
+
+from app.rag.chunker import chunk_transcript, chunk_transcripts
+
+TEXT = " ".join(f"Sentence number {i} is about topic {i}." for i in range(40))  # 8 tokens per sentence
+
+
+def test_chunks_fit_the_budget_and_end_on_sentences(stub_embedder):
+    chunks = chunk_transcripts([TEXT], max_tokens=40, overlap_tokens=16)[0]
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["tokens"] <= 40
+        assert chunk["text"].startswith("Sentence") and chunk["text"].endswith(".")
+        assert TEXT[chunk["start"]:chunk["end"]].strip() == chunk["text"]
+    # Each chunk starts with the last two sentences (16 tokens) of the one before
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert re.split(r"(?<=\.) ", previous["text"])[-2:] == re.split(r"(?<=\.) ", chunk["text"])[:2]
+    assert chunks[-1]["text"].endswith("topic 39.")
+
+
+def test_sentence_over_the_budget_is_split_at_tokens(stub_embedder):
+    text = " ".join(["word"] * 25) + "."
+    chunks = chunk_transcripts([text], max_tokens=10, overlap_tokens=0)[0]
+
+    assert [chunk["tokens"] for chunk in chunks] == [10, 10, 6]
+    assert " ".join(chunk["text"] for chunk in chunks) == text
+
+
+def test_whisper_segments_give_chunks_their_times(stub_embedder):
+    segments = [{"start": 5.0 * i, "end": 5.0 * (i + 1), "text": f" Segment {i} of the lecture."} for i in range(10)]
+    text = "".join(seg["text"] for seg in segments)
+
+    chunks = chunk_transcripts([text], [segments], max_tokens=14, overlap_tokens=0)[0]
+
+    assert [(c["start_time"], c["end_time"]) for c in chunks] == [(10.0 * i, 10.0 * (i + 1)) for i in range(5)]
+
+
+def test_batch_matches_one_transcript_at_a_time(stub_embedder):
+    texts = [TEXT, "", "Short one. Another short one!", TEXT[:300]]
+
+    batch = chunk_transcripts(texts, max_tokens=40)
+
+    assert batch == [chunk_transcripts([text], max_tokens=40)[0] for text in texts]
+    assert [chunk["text"] for chunk in batch[2]] == chunk_transcript(texts[2], max_tokens=40)
@@ -0,0 +1,18 @@
+# Size-capped cache directories
+
+import os
+
+from app import disk_cache
+
+
+def test_evicts_least_recently_used_files_of_its_kind(tmp_path):
+    directory = str(tmp_path)
+    paths = [disk_cache.write(directory, f"{name}.ssvs", b"x" * 10) for name in ("a", "b", "c")]
+    for i, path in enumerate(paths):
+        os.utime(path, (i, i))
+    other = disk_cache.write(directory, "a.sseg", b"x" * 100)
+    disk_cache.touch(paths[0])  # a is now the most recently used
+
+    assert disk_cache.evict(directory, ".ssvs", 20, keep=paths[0]) == 1
+    assert sorted(os.listdir(directory)) == ["a.sseg", "a.ssvs", "c.ssvs"]
+    assert os.path.exists(other)
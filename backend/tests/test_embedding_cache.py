@@ -0,0 +1,18 @@
+# Embedding cache files shared between workers
+
+import numpy as np
+
+from app.rag.embedding_cache import EmbeddingCache
+
+
+def test_resized_cache_is_rebuilt_without_cutting_off_open_workers(tmp_path):
+    old = EmbeddingCache("model", 4, str(tmp_path), capacity=8)
+    old.store(["Gradient descent"], np.ones((1, 4), dtype="float32"))
+
+    resized = EmbeddingCache("model", 4, str(tmp_path), capacity=16)
+
+    assert (tmp_path / "model.vectors").stat().st_size == 16 * 4 * 4
+    assert resized.lookup(["Gradient descent"])[1] == [0]  # Starts empty
+    vectors, missing = old.lookup(["Gradient descent"])  # Still reads the file it mapped
+    assert missing == [] and vectors[0].tolist() == [1.0] * 4
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["model.keys", "model.lock", "model.ticks", "model.vectors"]
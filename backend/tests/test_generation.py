@@ -0,0 +1,93 @@
+# Batched answer generation, with torch and flan-t5 replaced by fakes
+
+import contextlib
+import sys
+import threading
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.rag import responder
+from app.rag.vector_store import TranscriptVectorStore
+
+
+class Inputs(dict):
+    def to(self, device):
+        return self
+
+
+class FakeTokenizer:
+    def __call__(self, prompts, padding=False, return_tensors=None):
+        return Inputs(prompts=prompts)
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return [f"answer to {prompt}" for prompt in outputs]
+
+
+class FakeModel:
+    """
+    Records each generate call's prompts; the first call blocks until release is set.
+    """
+    device = "cpu"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.batches = []
+
+    def generate(self, prompts, max_new_tokens):
+        self.batches.append(list(prompts))
+        self.started.set()
+        self.release.wait(5)
+        return prompts
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(inference_mode=contextlib.nullcontext))
+    model = FakeModel()
+    yield model
+    model.release.set()
+
+
+def test_waiting_prompts_are_generated_in_deduplicated_batches(model):
+    service = responder.GenerationService(FakeTokenizer(), model, max_batch=4, max_wait=0.01, max_queue=16)
+    first = service.submit("p0")
+    assert model.started.wait(5)  # The worker is busy with p0 while the rest queue up
+
+    futures = [service.submit(prompt) for prompt in ["p1", "p1", "p2", "p3", "p4", "p5"]]
+    model.release.set()
+
+    assert first.result(5) == "answer to p0"
+    assert [f.result(5) for f in futures] == [f"answer to {p}" for p in ["p1", "p1", "p2", "p3", "p4", "p5"]]
+    assert model.batches == [["p0"], ["p1", "p2", "p3"], ["p4", "p5"]]
+    stats = service.stats()
+    assert (stats["requests"], stats["generated"], stats["batches"]) == (7, 6, 3)
+
+
+def test_full_generation_queue_answers_talk_with_429(model, monkeypatch):
+    service = responder.GenerationService(FakeTokenizer(), model, max_batch=1, max_wait=0, max_queue=2)
+    service.submit("busy")
+    assert model.started.wait(5)
+    service.submit("waiting 1")
+    service.submit("waiting 2")
+    with pytest.raises(responder.GenerationQueueFullError):
+        service.submit("one too many")
+    assert service.stats()["rejected"] == 1
+
+    async def talk_scope(data):
+        return data.session_id
+
+    async def load_talk_store(data, scope):
+        return TranscriptVectorStore(dim=4), None, None
+
+    monkeypatch.setattr(responder, "generator_backend", service)
+    monkeypatch.setattr(responder, "embed_query", lambda question: [1.0, 0.0, 0.0, 0.0])
+    monkeypatch.setattr(main, "talk_scope", talk_scope)
+    monkeypatch.setattr(main, "load_talk_store", load_talk_store)
+    response = TestClient(main.app).post("/talk", json={"session_id": "s1", "prompt": "What is dropout?"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,65 @@
+# Listing endpoints: cursor pages, ?fields= projections, ETags and 304s
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+
+@pytest.fixture
+def client(appwrite):
+    main.listing_cache.clear()
+    return TestClient(main.app)
+
+
+def _add_sessions(appwrite, user_id: str, n: int):
+    for i in range(n):
+        appwrite.add_document("sessions", f"{user_id}-s{i}", {"title": f"Session {i}", "user_id": user_id, "created_at": "2026-01-01"})
+
+
+def test_cursor_pages_through_every_document_once(client, appwrite):
+    _add_sessions(appwrite, "u1", 5)
+    _add_sessions(appwrite, "u2", 1)
+
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"user_id": "u1", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/sessions", params=params).json()
+        ids += [doc["$id"] for doc in page["sessions"]]
+        pages += 1
+        assert page["total"] == 5
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert ids == [f"u1-s{i}" for i in range(5)]
+
+
+def test_fields_select_the_attributes_returned(client, appwrite):
+    appwrite.add_document("transcripts", "t1", {"title": "Lecture", "user_id": "u1", "session_id": "s1", "original_text": "Long text."})
+
+    default = client.get("/transcripts", params={"user_id": "u1"}).json()["transcripts"][0]
+    everything = client.get("/transcripts", params={"user_id": "u1", "fields": "*"}).json()["transcripts"][0]
+    titles = client.get("/transcripts", params={"user_id": "u1", "fields": "title"}).json()["transcripts"][0]
+
+    assert "original_text" not in default and default["title"] == "Lecture"
+    assert everything["original_text"] == "Long text."
+    assert set(titles) == {"$id", "title"}
+
+
+def test_unchanged_page_is_not_modified_until_a_write(client, appwrite):
+    _add_sessions(appwrite, "u1", 2)
+
+    first = client.get("/sessions", params={"user_id": "u1"})
+    etag = first.headers["ETag"]
+    again = client.get("/sessions", params={"user_id": "u1"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert main.listing_cache.stats()["hits"] == 1
+
+    client.post("/sessions", json={"title": "New session", "user_id": "u1"})
+    changed = client.get("/sessions", params={"user_id": "u1"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["total"] == 3
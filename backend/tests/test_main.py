@@ -0,0 +1,113 @@
+# API endpoints against the fake Appwrite server (see conftest.py), with the models stubbed or patched out
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_upload_to_api_role_is_refused_with_503(client, monkeypatch):
+    monkeypatch.setattr(main, "APP_ROLE", "api")
+    response = client.post(
+        "/transcripts",
+        data={"title": "Lecture", "user_id": "u1"},
+        files={"file": ("lecture.wav", b"RIFF0000WAVE", "audio/wav")},
+    )
+    assert response.status_code == 503
+
+
+def test_talk_while_indexing_returns_409(client, monkeypatch):
+    async def talk_scope(data):
+        return data.session_id
+
+    async def load_scope_store(scope):
+        raise main.HTTPException(status_code=409, detail="Transcripts are still being indexed.")
+
+    monkeypatch.setattr(main, "talk_scope", talk_scope)
+    monkeypatch.setattr(main, "load_scope_store", load_scope_store)
+    response = client.post("/talk", json={"session_id": "s1", "prompt": "What is dropout?"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Transcripts are still being indexed."
+
+
+def test_talk_stream_with_full_generation_queue_returns_429(client, monkeypatch):
+    async def talk_scope(data):
+        return data.session_id
+
+    async def load_scope_store(scope):
+        return None
+
+    def stream_prepared(prepared):
+        raise main.GenerationQueueFullError("Answer generation queue is full, try again later")
+
+    monkeypatch.setattr(main, "talk_scope", talk_scope)
+    monkeypatch.setattr(main, "load_scope_store", load_scope_store)
+    monkeypatch.setattr(main, "prepare_answer", lambda question, vector_store, scope, session_id: {"sources": []})
+    monkeypatch.setattr(main, "stream_prepared", stream_prepared)
+    response = client.post("/talk/stream", json={"session_id": "s1", "prompt": "What is dropout?"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_upload_through_api_worker_reaches_talk_on_inference_worker(client, appwrite, stub_embedder, monkeypatch):
+    from app import ingest
+    from app.rag.store_cache import VectorStoreCache
+
+    searched = []
+
+    async def answer_question_async(question, vector_store, scope, session_id=None):
+        searched.append(vector_store)
+        return {"response": "ok", "sources": []}
+
+    monkeypatch.setattr(main, "answer_question_async", answer_question_async)
+    lecture = {"title": "Lecture 1", "user_id": "u1", "session_id": "s1", "original_text": "Gradient descent minimizes the loss."}
+    first = client.post("/transcripts", json=lecture).json()["id"]
+    ingest._jobs.join()
+    assert client.post("/talk", json={"session_id": "s1", "prompt": "What is gradient descent?"}).status_code == 200
+    assert searched[-1].has_document(first, main.transcript_version(appwrite.find_document("transcripts", first)))
+
+    # An API-only worker saves the next transcript; it can't reach this worker's cached stores
+    with monkeypatch.context() as api_worker:
+        api_worker.setattr(main, "APP_ROLE", "api")
+        api_worker.setattr(main, "session_stores", VectorStoreCache())
+        second = client.post("/transcripts", json={**lecture, "title": "Lecture 2", "original_text": "Dropout prevents overfitting."}).json()["id"]
+
+    client.post("/talk", json={"session_id": "s1", "prompt": "What is dropout?"})  # Finds the new transcript and indexes it
+    ingest._jobs.join()
+    client.post("/talk", json={"session_id": "s1", "prompt": "What is dropout?"})
+    assert searched[-1].has_document(second, main.transcript_version(appwrite.find_document("transcripts", second)))
+
+
+def test_session_answers_from_user_and_session_stores_are_cached_apart(client, appwrite, stub_embedder, monkeypatch):
+    from concurrent.futures import Future
+
+    from app import ingest
+    from app.rag import responder
+
+    prompts = []
+
+    class Generator:
+        def submit(self, prompt):
+            prompts.append(prompt)
+            future = Future()
+            future.set_result("Gradient descent follows the negative gradient.")
+            return future
+
+    monkeypatch.setattr(responder, "generator_backend", Generator())
+    lecture = {"title": "Lecture", "user_id": "u9", "session_id": "s9", "original_text": "Gradient descent minimizes the loss."}
+    client.post("/transcripts", json=lecture)
+    client.post("/transcripts", json={**lecture, "session_id": "s10", "original_text": "Dropout prevents overfitting."})
+    ingest._jobs.join()
+    from_user_store = {"session_id": "s9", "user_id": "u9", "prompt": "What is gradient descent?"}
+
+    main.session_stores.invalidate("s9")
+    client.post("/talk", json=from_user_store)  # Session store cold: answered from the user's store
+    client.post("/talk", json={"session_id": "s9", "prompt": "What is gradient descent?"})  # From the session's own store
+    main.session_stores.invalidate("s9")
+    client.post("/talk", json=from_user_store)
+    assert len(prompts) == 2
@@ -0,0 +1,62 @@
+# Round trips of vector stores through the SSVS file format
+
+import numpy as np
+import pytest
+
+from app.rag import persistence
+from app.rag.vector_store import TranscriptVectorStore
+
+
+def _store(index_type: str, n: int, dim: int = 32) -> tuple[TranscriptVectorStore, np.ndarray]:
+    vectors = np.random.default_rng(0).standard_normal((n, dim)).astype("float32")
+    store = TranscriptVectorStore(dim=dim, index_type=index_type)
+    half = n // 2
+    store.add_embeddings(vectors[:half], [f"chunk {i} é" for i in range(half)], doc_id="t1", version="v1",
+                         metadata=[{"session_id": "s1"}] * half)
+    store.add_embeddings(vectors[half:], [f"chunk {i} é" for i in range(half, n)], doc_id="t2", version="v1",
+                         metadata=[{"session_id": "s2"}] * (n - half))
+    return store, vectors
+
+
+@pytest.mark.parametrize("index_type, n", [("flat", 50), ("ivf", 1200)])
+def test_store_round_trip_searches_the_same(tmp_path, index_type, n):
+    store, vectors = _store(index_type, n)
+    path = tmp_path / "store.ssvs"
+    path.write_bytes(persistence.serialize_store(store))
+
+    opened = persistence.open_store(str(path))
+
+    assert opened.kind == store.kind == index_type
+    assert opened.content_version() == store.content_version()
+    assert list(opened.chunks) == list(store.chunks)
+    assert opened.has_session("s2")
+    for query in vectors[:5]:
+        assert opened.search_hits(query, top_k=5) == store.search_hits(query, top_k=5)
+        assert opened.search_hits(query, session_id="s2") == store.search_hits(query, session_id="s2")
+
+    # Chunks added after opening go to a writable copy of the mapped chunks
+    opened.add_embeddings(vectors[:1], ["new chunk"], doc_id="t3", version="v1")
+    assert opened.chunks[-1] == "new chunk"
+
+
+def test_other_format_version_is_stale(tmp_path):
+    store, _ = _store("flat", 10)
+    data = bytearray(persistence.serialize_store(store))
+    data[4:8] = (persistence.FORMAT_VERSION + 1).to_bytes(4, "little")
+    path = tmp_path / "store.ssvs"
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(persistence.StaleIndexError):
+        persistence.open_store(str(path))
+
+
+def test_other_embedding_space_is_stale(tmp_path, monkeypatch):
+    store, _ = _store("flat", 10)
+    monkeypatch.setattr(persistence, "EMBEDDING_SPACE", "another-model")
+    data = persistence.serialize_store(store)
+    monkeypatch.undo()
+    path = tmp_path / "store.ssvs"
+    path.write_bytes(data)
+
+    with pytest.raises(persistence.StaleIndexError):
+        persistence.open_store(str(path))
@@ -0,0 +1,41 @@
+# Span transcription with Whisper and ffmpeg replaced by fakes
+
+import numpy as np
+
+from app import summarizer
+
+
+class OneSecondWhisper:
+    """
+    One segment per second of audio, named after its absolute start time.
+    """
+
+    def __init__(self):
+        self.prompts = []
+        self.offsets = []
+
+    def transcribe(self, audio, initial_prompt=None):
+        self.prompts.append(initial_prompt)
+        offset = self.offsets.pop(0)
+        seconds = len(audio) // summarizer.SAMPLE_RATE
+        return {"segments": [{"start": s, "end": s + 1, "text": f" {offset + s}."} for s in range(seconds)]}
+
+
+def test_overlapping_spans_keep_each_segment_once_and_prompt_the_next(monkeypatch):
+    model = OneSecondWhisper()
+    total = 25.0
+
+    def load_audio_window(path, start, duration):
+        model.offsets.append(int(start))
+        return np.zeros(int(min(duration, total - start) * summarizer.SAMPLE_RATE), dtype=np.float32)
+
+    monkeypatch.setattr(summarizer, "_model", model)
+    monkeypatch.setattr(summarizer, "load_audio_window", load_audio_window)
+    monkeypatch.setattr(summarizer, "iter_speech_spans", lambda path: iter([(0.0, 10.0), (10.0, 20.0), (20.0, total)]))
+
+    segments = list(summarizer.transcribe_segments("lecture.wav"))
+
+    assert [seg["start"] for seg in segments] == [float(s) for s in range(25)]
+    assert model.prompts[0] is None
+    assert model.prompts[1].endswith(" 9.")
+    assert model.prompts[2].endswith(" 19.")
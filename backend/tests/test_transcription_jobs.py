@@ -0,0 +1,128 @@
+# Sharing of running transcriptions between callers, with Whisper replaced by a fake span stream
+
+import asyncio
+
+import pytest
+
+from app import transcription_jobs
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    """
+    Replace span transcription with two segments, each released by release.set().
+    Returns the event and the paths transcriptions were started for.
+    """
+    release = asyncio.Event()
+    started = []
+
+    async def stream_spans(path, progress=None):
+        started.append(path)
+        for i in range(2):
+            await release.wait()
+            release.clear()
+            yield {"start": float(i), "end": float(i + 1), "text": f" part {i}."}
+
+    monkeypatch.setattr(transcription_jobs, "_stream_spans", stream_spans)
+    monkeypatch.setattr(transcription_jobs.transcript_cache, "get", lambda key: None)
+    monkeypatch.setattr(transcription_jobs.transcript_cache, "put", lambda key, value: None)
+    return release, started
+
+
+async def _transcribe_all(release, started):
+    while not started:
+        await asyncio.sleep(0)
+    for _ in range(2):
+        release.set()
+        while release.is_set():
+            await asyncio.sleep(0)
+
+
+def test_cancelled_caller_does_not_fail_callers_sharing_its_transcription(spans):
+    release, started = spans
+
+    async def run():
+        owner = asyncio.create_task(transcription_jobs._transcribe_cached("file", "/nonexistent/a.wav", "k1"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(transcription_jobs._transcribe_cached("file", "/nonexistent/b.wav", "k1"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await _transcribe_all(release, started)
+        return await waiter
+
+    assert [s["text"] for s in asyncio.run(run())] == [" part 0.", " part 1."]
+    assert started == ["/nonexistent/a.wav"]
+    assert transcription_jobs._inflight == {}
+    assert transcription_jobs.pool_stats()["active"] == 0
+
+
+def test_transcription_is_cancelled_with_its_last_caller(spans):
+    release, started = spans
+
+    async def run():
+        caller = asyncio.create_task(transcription_jobs._transcribe_cached("file", "/nonexistent/a.wav", "k2"))
+        while not started:
+            await asyncio.sleep(0)
+        task = transcription_jobs._inflight["k2"]["task"]
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        return task
+
+    assert asyncio.run(run()).cancelled()
+    assert transcription_jobs._inflight == {}
+    assert transcription_jobs.pool_stats()["active"] == 0
+
+
+def test_stream_shares_a_running_transcription(spans):
+    release, started = spans
+
+    async def run():
+        batch = asyncio.create_task(transcription_jobs._transcribe_cached("file", "/nonexistent/a.wav", transcription_jobs.transcript_cache.cache_key("sha256:abc")))
+        await asyncio.sleep(0)
+
+        async def stream():
+            return [s async for s in transcription_jobs.transcribe_stream("/nonexistent/b.wav", "abc")]
+
+        streamed = asyncio.create_task(stream())
+        await _transcribe_all(release, started)
+        return await batch, await streamed
+
+    batch, streamed = asyncio.run(run())
+    assert batch == streamed
+    assert started == ["/nonexistent/a.wav"]
+
+
+def test_job_is_running_once_a_worker_picks_up_its_first_span(monkeypatch):
+    from concurrent.futures import Future
+
+    submitted = []
+
+    async def find_spans(path):
+        yield (0.0, 60.0)
+
+    def submit(func, *args):
+        submitted.append(Future())
+        return submitted[-1]
+
+    monkeypatch.setattr(transcription_jobs, "_find_spans", find_spans)
+    monkeypatch.setattr(transcription_jobs, "_submit", submit)
+    monkeypatch.setattr(transcription_jobs.transcript_cache, "get", lambda key: None)
+    monkeypatch.setattr(transcription_jobs.transcript_cache, "put", lambda key, value: None)
+
+    async def run():
+        job_id = await transcription_jobs.start_job("file", "/nonexistent/a.wav", lambda segments: {"segments": len(segments)}, digest="running")
+        while not submitted:
+            await asyncio.sleep(0)
+        statuses = [transcription_jobs.get_job(job_id)["status"]]
+        submitted[0].set_running_or_notify_cancel()  # What the pool does when it hands the span to a worker
+        statuses.append(transcription_jobs.get_job(job_id)["status"])
+        submitted[0].set_result([{"start": 0.0, "end": 1.0, "text": " Hello."}])
+        while transcription_jobs.get_job(job_id)["status"] not in (transcription_jobs.COMPLETED, transcription_jobs.FAILED):
+            await asyncio.sleep(0)
+        return statuses, transcription_jobs.get_job(job_id)
+
+    statuses, job = asyncio.run(run())
+    assert statuses == [transcription_jobs.QUEUED, transcription_jobs.RUNNING]
+    assert job["status"] == transcription_jobs.COMPLETED
+    assert job["progress"] == {"spans_total": 1, "spans_done": 1}